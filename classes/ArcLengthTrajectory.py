@@ -0,0 +1,125 @@
+import numpy as np
+from utils.geometry import polyline_arc_length
+
+class ArcLengthTrajectory:
+    """Class to describe a trajectory polyline parameterized by arc length.
+    Positions and headings can be looked up at any arc length, and the polyline can be resampled
+    adaptively to curvature, keeping the fewest points within a chord error tolerance.
+    """
+
+    def __init__(self, points: np.ndarray):
+        """Initialize arc length trajectory
+        @param points: (N,3) array of trajectory points, N >= 2"""
+
+        self.points = np.asarray(points, dtype=np.float64)
+        self.arc_length = polyline_arc_length(self.points[:,:2])
+
+    @property
+    def length(self) -> float:
+        return float(self.arc_length[-1])
+
+    def _locate(self, s: np.ndarray):
+        """Segment index and parameter along segment of arc lengths"""
+
+        s = np.clip(np.asarray(s, dtype=np.float64), 0.0, self.length)
+        segment = np.clip(np.searchsorted(self.arc_length, s, side='right') - 1, 0, len(self.points) - 2)
+        segment_lengths = np.maximum(self.arc_length[segment+1] - self.arc_length[segment], 1e-12)
+        t = np.clip((s - self.arc_length[segment])/segment_lengths, 0.0, 1.0)
+
+        return segment, t
+
+    def position(self, s) -> np.ndarray:
+        """Position at arc lengths
+        @param s: Arc length or array of arc lengths (m), clamped to the trajectory
+        @return: (3,) or (M,3) array of positions
+        """
+
+        segment, t = self._locate(s)
+        start = self.points[segment]
+        end = self.points[segment+1]
+
+        return start + t[...,None]*(end - start)
+
+    def heading(self, s) -> np.ndarray:
+        """Heading of travel direction at arc lengths
+        @param s: Arc length or array of arc lengths (m), clamped to the trajectory
+        @return: Heading or array of headings (rad), counterclockwise from the x axis
+        """
+
+        segment, _ = self._locate(s)
+        delta = self.points[segment+1] - self.points[segment]
+
+        return np.arctan2(delta[...,1], delta[...,0])
+
+    def sample(self, spacing: float) -> np.ndarray:
+        """Positions at equal arc length spacing, including both ends
+        @param spacing: Arc length between positions (m)
+        @return: (M,3) array of positions
+        """
+
+        num_samples = max(int(np.ceil(self.length/spacing)), 1) + 1
+
+        return self.position(np.linspace(0.0, self.length, num_samples))
+
+    def split(self, chunk_length: float) -> list:
+        """Split the trajectory into consecutive pieces of equal arc length, sharing their end points
+        @param chunk_length: Maximum arc length of a piece (m)
+        @return: List of (M,3) arrays of trajectory points of each piece
+        """
+
+        num_chunks = max(int(np.ceil(self.length/chunk_length - 1e-9)), 1)
+        bounds = np.linspace(0.0, self.length, num_chunks + 1)
+
+        chunks = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            inner = (self.arc_length > start) & (self.arc_length < end)
+            chunks.append(np.vstack((self.position(start), self.points[inner], self.position(end))))
+
+        return chunks
+
+    def resample(self, chord_tolerance: float, max_spacing: float = None) -> "ArcLengthTrajectory":
+        """Adaptive resampling with the fewest points keeping the chord error within a tolerance (Douglas-Peucker).
+        Straight segments collapse to their end points, bends keep more points with increasing curvature.
+        The tolerance bounds the distance to the original points only, a smooth curve using the resampled points as
+        control points (e.g. the NURBS sensor path) can deviate further where they are sparse.
+        @param chord_tolerance: Maximum distance of dropped points from the resampled polyline (m)
+        @param max_spacing: Maximum arc length between resampled points (m), None = unbounded
+        @return: Resampled trajectory
+        """
+
+        keep = np.zeros(len(self.points), dtype=bool)
+        keep[[0, -1]] = True
+
+        stack = [(0, len(self.points) - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+
+            #Distance of inner points to chord between first and last point
+            chord = self.points[last] - self.points[first]
+            rel = self.points[first+1:last] - self.points[first]
+            chord_length_sq = float(chord @ chord)
+            if chord_length_sq > 1e-12:
+                t = np.clip(rel @ chord/chord_length_sq, 0.0, 1.0)
+                rel = rel - t[:,None]*chord
+            distance = np.linalg.norm(rel, axis=1)
+
+            farthest = int(np.argmax(distance))
+            if distance[farthest] > chord_tolerance:
+                split = first + 1 + farthest
+                keep[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+
+        indices = np.flatnonzero(keep)
+
+        #Subdivide long segments by arc length
+        if max_spacing is not None:
+            arc_lengths = [np.linspace(self.arc_length[begin], self.arc_length[end], max(int(np.ceil((self.arc_length[end] - self.arc_length[begin])/max_spacing)), 1) + 1)[:-1]
+                           for begin, end in zip(indices[:-1], indices[1:])]
+            points = np.concatenate((self.position(np.concatenate(arc_lengths)), self.points[-1:]))
+        else:
+            points = self.points[indices]
+
+        return ArcLengthTrajectory(points)
@@ -0,0 +1,208 @@
+import time
+import traceback
+import bpy
+import blf
+
+#Seconds between pipeline stages, gives the UI time to process events and redraw
+STAGE_INTERVAL = 0.01
+#Seconds between checks while paused
+PAUSE_INTERVAL = 0.2
+
+class ContinuousPlay:
+    """Class to run the scene generation in the GUI without blocking it.
+    The pipeline is advanced one stage at a time from an application timer, so the viewport is redrawn and
+    UI events are processed between stages. Progress and throughput are drawn into the 3D viewport, and a modal
+    operator handles pause/resume (P) and cancel (ESC).
+    """
+
+    #Instance currently running, used by the control operator
+    active = None
+
+    def __init__(self, jobs, generate_scene, finish_iteration, total: int, finish_play=None):
+        """Initialize continuous play
+        @param jobs: Iterator of (job ID, iteration number) tuples
+        @param generate_scene: Function of job ID and iteration returning a generator over the stages of one scene
+        @param finish_iteration: Function of iteration called after each scene
+        @param total: Number of iterations, for progress display
+        @param finish_play: Function called once when play ends (finished, cancelled or failed), with the job ID and
+                            iteration of the unfinished scene, or None and None if no scene was in progress"""
+
+        self.jobs = jobs
+        self.generate_scene = generate_scene
+        self.finish_iteration = finish_iteration
+        self.finish_play = finish_play
+        self.total = total
+
+        self.job_id = None
+        self.iteration = None
+        self.stages = None
+        self.stage = "starting"
+        self.completed = 0
+        self.paused = False
+        self.cancelled = False
+        self.start_time = None
+        self.scene_start_time = None
+        self.last_scene_seconds = None
+        self.draw_handler = None
+
+    def start(self):
+        """Register timer, viewport overlay and control operator"""
+
+        if ContinuousPlay.active is not None:
+            ContinuousPlay.active.stop()
+        ContinuousPlay.active = self
+
+        #Replace operator registered by a previous run of the script
+        registered = getattr(bpy.types, "BLENDGAENGER_OT_continuous_play_control", None)
+        if registered is not None:
+            bpy.utils.unregister_class(registered)
+        bpy.utils.register_class(ContinuousPlayControl)
+
+        self.start_time = time.time()
+        self.draw_handler = bpy.types.SpaceView3D.draw_handler_add(self.draw, (), 'WINDOW', 'POST_PIXEL')
+        bpy.app.timers.register(self.step, first_interval=PAUSE_INTERVAL)
+
+        print("Continuous play started: [P] pause/resume, [ESC] cancel (mouse over 3D viewport)")
+
+    def stop(self):
+        """Close the scene in progress and the job iterator, remove viewport overlay, the timer ends with its next call"""
+
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self.stages is not None:
+            self.stages.close()
+            self.stages = None
+        if hasattr(self.jobs, "close"):
+            self.jobs.close()
+        if self.finish_play is not None:
+            self.finish_play(self.job_id, self.iteration)
+        if self.draw_handler is not None:
+            bpy.types.SpaceView3D.draw_handler_remove(self.draw_handler, 'WINDOW')
+            self.draw_handler = None
+        if ContinuousPlay.active is self:
+            ContinuousPlay.active = None
+        self.redraw()
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        print("Continuous play paused" if self.paused else "Continuous play resumed")
+        self.redraw()
+
+    def _invoke_control(self):
+        """Start the control operator in the first window, once the window manager is available"""
+
+        window_manager = bpy.context.window_manager
+        if window_manager is None or not window_manager.windows:
+            return
+        with bpy.context.temp_override(window=window_manager.windows[0]):
+            bpy.ops.blendgaenger.continuous_play_control('INVOKE_DEFAULT')
+
+    def step(self):
+        """Timer callback running the next pipeline stage
+        @return: Seconds until the next call, None to unregister the timer"""
+
+        if self.cancelled:
+            print(f"Continuous play cancelled after {self.completed} scenes")
+            return None
+
+        if self.stages is None and self.iteration is None and self.completed == 0:
+            self._invoke_control()
+
+        if self.paused:
+            return PAUSE_INTERVAL
+
+        try:
+            if self.stages is None:
+                self.job_id, self.iteration = next(self.jobs)
+                self.stages = self.generate_scene(self.job_id, self.iteration)
+                self.scene_start_time = time.time()
+
+            try:
+                self.stage = next(self.stages)
+            except StopIteration:
+                self.finish_iteration(self.iteration)
+                self.stages = None
+                self.job_id = None
+                self.iteration = None
+                self.completed += 1
+                self.last_scene_seconds = time.time() - self.scene_start_time
+                self.stage = "scene complete"
+
+        except StopIteration:
+            print(f"Continuous play finished {self.completed} scenes")
+            self.stop()
+            return None
+        except Exception:
+            traceback.print_exc()
+            print("Continuous play stopped due to error")
+            self.stop()
+            return None
+
+        self.redraw()
+        return STAGE_INTERVAL
+
+    def status(self) -> str:
+        """Progress and throughput text"""
+
+        elapsed = time.time() - self.start_time if self.start_time else 0.0
+        text = f"Scene {self.completed + (self.stages is not None)}/{self.total}  |  {self.stage}"
+        if self.completed > 0:
+            text += f"  |  last {self.last_scene_seconds:.1f} s  |  {60*self.completed/max(elapsed, 1e-9):.2f} scenes/min"
+        text += "  |  PAUSED [P] resume" if self.paused else "  |  [P] pause  [ESC] cancel"
+
+        return text
+
+    def draw(self):
+        font_id = 0
+        blf.size(font_id, 14)
+        blf.color(font_id, 1.0, 1.0, 1.0, 0.9)
+        blf.position(font_id, 20, 40, 0)
+        blf.draw(font_id, self.status())
+
+    @staticmethod
+    def redraw():
+        window_manager = bpy.context.window_manager
+        if window_manager is None:
+            return
+        for window in window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+class ContinuousPlayControl(bpy.types.Operator):
+    """Pause/resume (P) or cancel (ESC) continuous play"""
+
+    bl_idname = "blendgaenger.continuous_play_control"
+    bl_label = "Continuous Play Control"
+
+    def invoke(self, context, event):
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    @staticmethod
+    def over_viewport(context, event) -> bool:
+        """Whether the mouse is over a 3D viewport, keys pressed in other editors are passed on to them"""
+
+        for area in context.window.screen.areas:
+            if area.type == 'VIEW_3D' and area.x <= event.mouse_x < area.x + area.width and area.y <= event.mouse_y < area.y + area.height:
+                return True
+        return False
+
+    def modal(self, context, event):
+        play = ContinuousPlay.active
+        if play is None or play.cancelled:
+            return {'FINISHED'}
+
+        if event.type not in ('ESC', 'P') or event.value != 'PRESS' or not self.over_viewport(context, event):
+            return {'PASS_THROUGH'}
+
+        if event.type == 'ESC' and event.value == 'PRESS':
+            play.stop()
+            return {'FINISHED'}
+
+        if event.type == 'P' and event.value == 'PRESS':
+            play.toggle_pause()
+            return {'RUNNING_MODAL'}
+
+        return {'PASS_THROUGH'}
@@ -0,0 +1,130 @@
+import os
+import json
+import fcntl
+import hashlib
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+#Version of the cached landscape format, part of every cache key
+CACHE_VERSION = 2
+
+class LandscapeCache:
+    """Class to store generated landscape height grids on disk, addressed by the hash of their generator parameters.
+    Entries are written to a temporary file and renamed into place, so concurrent readers never see partial files.
+    Reading an entry updates its modification time, and the least recently used entries are evicted when the
+    cache exceeds its size limit. Eviction is serialized between processes with a lock file.
+    With a shared asset store, height grids loaded from the cache are also published to the store decompressed, so
+    that other workers of the machine map them instead of decompressing the entry again. Newly generated landscapes
+    are not published, as with random seeds no other worker asks for them.
+    """
+
+    def __init__(self, directory: str, max_size_mb: float = 1024, store=None):
+        """Initialize landscape cache
+        @param directory: Directory of cache entries, shared by all workers
+        @param max_size_mb: Maximum total size of cache entries (MB)
+        @param store: SharedAssetStore of the machine, None to decompress entries in every worker"""
+
+        self.directory = directory
+        self.max_size_mb = max_size_mb
+        self.store = store
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(params: dict) -> str:
+        """Cache key of landscape generator parameters
+        @param params: Dictionary of all parameters that determine the landscape, including the seed
+        """
+
+        serialized = json.dumps({"version": CACHE_VERSION, **params}, sort_keys=True)
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    @contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str):
+        """Load a landscape height grid
+        @param key: Cache key
+        @return: Tuple of (cols,) x coordinates, (rows,) y coordinates, (rows, cols) heights and (F,3) triangles, None if not cached
+        """
+
+        if self.store is not None:
+            shared = self.store.get(self.store.key("landscape", key))
+            if shared is not None:
+                try:
+                    os.utime(self.path(key))
+                except FileNotFoundError:
+                    pass
+                arrays, _ = shared
+                return arrays["x"], arrays["y"], arrays["z"], arrays["faces"]
+
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                x, y, z, faces = entry["x"], entry["y"], entry["z"], entry["faces"]
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            #Missing, evicted by another worker, or unreadable
+            return None
+
+        if self.store is not None:
+            arrays, _ = self.store.publish(self.store.key("landscape", key), {"x": x, "y": y, "z": z, "faces": faces})
+            return arrays["x"], arrays["y"], arrays["z"], arrays["faces"]
+
+        return x.astype(np.float64), y.astype(np.float64), z.astype(np.float64), faces
+
+    def put(self, key: str, grid: np.ndarray, faces: np.ndarray):
+        """Store a landscape height grid with its triangulation, and evict least recently used entries above the size limit.
+        The triangulation is stored, as the generator splits grid cells along varying diagonals.
+        @param key: Cache key
+        @param grid: (rows, cols, 3) array of regular grid vertex coordinates, rows along y and columns along x
+        @param faces: (F,3) array of triangles as row-major grid vertex indices
+        """
+
+        x, y, z = grid[0,:,0].astype(np.float32), grid[:,0,1].astype(np.float32), grid[:,:,2].astype(np.float32)
+        faces = faces.astype(np.int32)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, x=x, y=y, z=z, faces=faces)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache is within its size limit"""
+
+        with self._lock():
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith(".npz"):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_mb*1024**2:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
@@ -0,0 +1,132 @@
+import json
+import hashlib
+from random import seed
+from contextlib import nullcontext
+import bpy
+from utils.seeding import stage_seed
+
+class Layer:
+    """Class to describe one layer of a scene, built on top of its upstream layers.
+    """
+
+    def __init__(self, name: str, build, deps: tuple = (), config_sections: tuple = (), stage: str = None):
+        """Initialize layer
+        @param name: Name of the layer
+        @param build: Function of the dictionary of upstream layer results, building the layer and returning its result
+        @param deps: Names of upstream layers
+        @param config_sections: Names of configuration sections the layer depends on
+        @param stage: Name of the stage reported to the leak detector, default: layer name"""
+
+        self.name = name
+        self.build = build
+        self.deps = deps
+        self.config_sections = config_sections
+        self.stage = stage if stage else name
+
+class LayerPipeline:
+    """Class to build a scene as a sequence of dependency-tracked layers, and reuse unchanged layers between iterations.
+    Each layer gets its own seed, derived from the scene seed and, for varied layers, the variant index. The cache key
+    of a layer combines its seed, its configuration sections and the keys of its upstream layers, so a changed layer
+    invalidates everything downstream of it. Invalid layers are removed from the scene (objects created by them) and
+    rebuilt, valid layers are kept in the scene together with their results.
+    """
+
+    def __init__(self, config, layers: list, stage=None):
+        """Initialize layer pipeline
+        @param config: Configuration object
+        @param layers: List of Layer objects, upstream layers first
+        @param stage: Function of a stage name returning a context manager wrapping each build, e.g. LeakDetector.stage"""
+
+        self.config = config
+        self.layers = layers
+        self.stage = stage if stage else (lambda name: nullcontext())
+        self.keys = {}
+        self.objects = {}
+        self.results = {}
+        self.pending = []
+        self.pending_keys = {}
+        self.seeds = {}
+
+    def layer_seed(self, layer: Layer, scene_seed: int, variant: int, variant_layers: list) -> int:
+        """Seed of a layer, only varied layers differ between variants of a scene"""
+
+        return stage_seed(scene_seed, layer.name, variant if layer.name in variant_layers else 0)
+
+    def layer_keys(self, scene_seed: int, variant: int, variant_layers: list) -> dict:
+        """Cache keys of all layers for a scene variant"""
+
+        keys = {}
+        for layer in self.layers:
+            key_data = {"layer": layer.name,
+                        "seed": self.layer_seed(layer, scene_seed, variant, variant_layers),
+                        "config": [repr(getattr(self.config, section, None)) for section in layer.config_sections],
+                        "deps": [keys[dep] for dep in layer.deps]}
+            keys[layer.name] = hashlib.sha1(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+        return keys
+
+    def invalidate(self):
+        """Mark all layers as invalid, e.g. after the scene was cleared or modified destructively"""
+
+        self.keys = {}
+        self.objects = {}
+        self.results = {}
+
+    def remove_layer(self, name: str):
+        """Remove the objects created by a layer from the scene"""
+
+        for object_name in self.objects.pop(name, []):
+            obj = bpy.data.objects.get(object_name)
+            if obj is not None:
+                bpy.data.objects.remove(obj)
+        self.keys.pop(name, None)
+        self.results.pop(name, None)
+
+    def update(self, scene_seed: int, variant: int = 0, variant_layers: list = (), clear_scene=None) -> list:
+        """Remove the layers invalidated by a new scene variant, and everything downstream of them, from the scene
+        @param scene_seed: Seed of the scene, shared by all variants
+        @param variant: Index of the variant
+        @param variant_layers: Names of layers with a different seed for each variant
+        @param clear_scene: Function clearing the whole scene, used if no layer can be reused
+        @return: Names of the reused layers
+        """
+
+        keys = self.layer_keys(scene_seed, variant, variant_layers)
+        self.pending = []
+        for layer in self.layers:
+            if self.pending or self.keys.get(layer.name) != keys[layer.name]:
+                self.pending.append(layer)
+        reused = [layer.name for layer in self.layers if layer not in self.pending]
+
+        #Remove invalid layers, downstream layers first
+        if not reused and clear_scene is not None:
+            clear_scene()
+            self.invalidate()
+        else:
+            for layer in reversed(self.pending):
+                self.remove_layer(layer.name)
+            bpy.data.orphans_purge(do_recursive=True)
+
+        self.seeds = {layer.name: self.layer_seed(layer, scene_seed, variant, variant_layers) for layer in self.pending}
+        self.pending_keys = keys
+
+        if reused:
+            print(f"Reusing scene layers: {', '.join(reused)}")
+
+        return reused
+
+    def build(self):
+        """Build the layers removed by the last update, each with its own seed
+        @return: Generator yielding the name of each built layer
+        """
+
+        while self.pending:
+            layer = self.pending.pop(0)
+            seed(self.seeds[layer.name])
+
+            before = set(bpy.data.objects.keys())
+            with self.stage(layer.stage):
+                self.results[layer.name] = layer.build(self.results)
+            self.objects[layer.name] = [name for name in bpy.data.objects.keys() if name not in before]
+            self.keys[layer.name] = self.pending_keys[layer.name]
+
+            yield layer.name
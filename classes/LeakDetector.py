@@ -0,0 +1,125 @@
+import os
+import resource
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import bpy
+
+class LeakDetector:
+    """Class to detect datablocks and memory leaking across iterations.
+    After each scene clear, the number of remaining datablocks of each type is recorded. Types whose count
+    grows in every one of the last iterations are flagged as leaking, and attributed to the stages (plugins)
+    that created the datablocks of that type which are still present after clearing the scene.
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 5, memory_limit_mb: float = None):
+        """Initialize leak detector
+        @param enabled: Whether to record snapshots
+        @param window: Number of consecutive iterations a datablock count must grow to be flagged
+        @param memory_limit_mb: Resident memory (MB) above which the worker should be restarted, None = no limit"""
+
+        self.enabled = enabled
+        self.window = window
+        self.memory_limit_mb = memory_limit_mb
+        self.residual_counts = []
+        self.memory_mb = []
+        self.stage_blocks = defaultdict(lambda: defaultdict(set))
+
+    @staticmethod
+    def snapshot() -> dict:
+        """Count datablocks of each type in bpy.data"""
+
+        counts = {}
+        for name in dir(bpy.data):
+            collection = getattr(bpy.data, name, None)
+            if isinstance(collection, bpy.types.bpy_prop_collection):
+                counts[name] = len(collection)
+        return counts
+
+    @staticmethod
+    def snapshot_names() -> dict:
+        """Full names of the datablocks of each type in bpy.data"""
+
+        names = {}
+        for name in dir(bpy.data):
+            collection = getattr(bpy.data, name, None)
+            if isinstance(collection, bpy.types.bpy_prop_collection):
+                names[name] = {block.name_full for block in collection if isinstance(block, bpy.types.ID)}
+        return names
+
+    @staticmethod
+    def resident_memory_mb() -> float:
+        """Current resident memory of the process (MB), peak memory if not available"""
+
+        try:
+            with open("/proc/self/statm", "r") as f:
+                pages = int(f.read().split()[1])
+            return pages*os.sysconf("SC_PAGE_SIZE")/1024**2
+        except (OSError, ValueError, IndexError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+    @contextmanager
+    def _stage(self, name: str):
+        before = self.snapshot_names()
+        yield
+        after = self.snapshot_names()
+        for block_type, names in after.items():
+            created = names - before.get(block_type, set())
+            if created:
+                self.stage_blocks[block_type][name] |= created
+
+    def stage(self, name: str):
+        """Context manager recording datablocks created by a stage
+        @param name: Name of the stage, e.g. the plugin running in it"""
+
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(name)
+
+    def record_iteration(self):
+        """Record remaining datablocks and memory, to be called after the scene has been cleared"""
+
+        if not self.enabled:
+            return
+
+        self.residual_counts.append(self.snapshot())
+        self.memory_mb.append(self.resident_memory_mb())
+
+        #Keep only the created datablocks that survived the scene clear, these are the ones to blame
+        remaining = self.snapshot_names()
+        for block_type, stages in self.stage_blocks.items():
+            for stage, names in stages.items():
+                names &= remaining.get(block_type, set())
+
+    def leaked_types(self) -> dict:
+        """Datablock types whose remaining count grew in each of the last iterations
+        @return: Dictionary of datablock type to growth over the window"""
+
+        if len(self.residual_counts) <= self.window:
+            return {}
+
+        recent = self.residual_counts[-self.window-1:]
+        leaks = {}
+        for block_type in recent[-1]:
+            counts = [snapshot.get(block_type, 0) for snapshot in recent]
+            if all(later > earlier for earlier, later in zip(counts, counts[1:])):
+                leaks[block_type] = counts[-1] - counts[0]
+        return leaks
+
+    def report(self) -> str:
+        """Report of leaking datablock types and the stages that created their remaining datablocks"""
+
+        lines = []
+        if self.memory_mb:
+            lines.append(f"Resident memory: {self.memory_mb[-1]:.0f} MB (first iteration: {self.memory_mb[0]:.0f} MB)")
+        for block_type, growth in self.leaked_types().items():
+            creators = sorted(((name, len(names)) for name, names in self.stage_blocks[block_type].items() if names), key=lambda item: -item[1])
+            creator_list = ", ".join(f"{name} ({count})" for name, count in creators) or "unknown"
+            lines.append(f"Leaking {block_type}: +{growth} over {self.window} iterations, created by: {creator_list}")
+        return "\n".join(lines)
+
+    def memory_exceeded(self) -> bool:
+        """Whether the resident memory exceeds the configured limit"""
+
+        if self.memory_limit_mb is None:
+            return False
+        return self.resident_memory_mb() > self.memory_limit_mb
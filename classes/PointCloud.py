@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+#Order of labels applied to point clouds (index = numeric categoryID)
+LABELS = ["none", "ground", "boulder", "munition"]
+
+class PointCloud:
+    """Class to hold a scanned sonar point cloud, as exported to .csv by BlAInder.
+    Columns are kept as numpy arrays, keyed by their .csv header name.
+    """
+
+    def __init__(self, columns: dict, delimiter: str = ';'):
+        """Initialize point cloud from column arrays
+        @param columns: Dictionary of column name to numpy array, all of equal length
+        @param delimiter: Delimiter used when writing the point cloud back to .csv"""
+
+        self.columns = columns
+        self.delimiter = delimiter
+
+    @classmethod
+    def from_csv(cls, path: str):
+        """Read a point cloud from a BlAInder .csv file
+        @param path: Path to the .csv file"""
+
+        with open(path, "r") as f:
+            header = f.readline()
+        delimiter = ';' if ';' in header else ','
+
+        frame = pd.read_csv(path, sep=delimiter)
+        return cls({name: frame[name].to_numpy() for name in frame.columns}, delimiter)
+
+    def to_csv(self, path: str):
+        """Write the point cloud to a .csv file, using the delimiter it was read with
+        @param path: Path to the .csv file"""
+
+        pd.DataFrame(self.columns).to_csv(path, sep=self.delimiter, index=False)
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def xyz(self, noisy: bool = True) -> np.ndarray:
+        """Get point coordinates as (N,3) array
+        @param noisy: Use noisy coordinates if present, else noise-free coordinates"""
+
+        names = ["X_noise", "Y_noise", "Z_noise"] if noisy and "X_noise" in self.columns else ["X", "Y", "Z"]
+        return np.stack([self.columns[name].astype(np.float64) for name in names], axis=1)
+
+    def label_indices(self, column: str = "categoryID") -> np.ndarray:
+        """Get labels as indices into LABELS, regardless of whether they were exported as names or numbers
+        @param column: Label column to read"""
+
+        values = self.columns[column]
+        if np.issubdtype(values.dtype, np.number):
+            return values.astype(np.int64)
+
+        #Look up the distinct names only, unknown and missing names map to "none"
+        codes, names = pd.factorize(values)
+        lookup = {name: idx for idx, name in enumerate(LABELS)}
+        name_indices = np.array([lookup.get(str(name), 0) for name in names] + [0], dtype=np.int64)
+        return name_indices[codes]
+
+    def encode_label(self, label: str, column: str = "categoryID"):
+        """Encode a label name the same way as the existing label column
+        @param label: Label name from LABELS
+        @param column: Label column to match"""
+
+        if column in self.columns and not np.issubdtype(self.columns[column].dtype, np.number):
+            return label
+        return LABELS.index(label)
+
+    def append(self, columns: dict):
+        """Append points to the point cloud. Columns missing from the new points are filled with zeros
+        @param columns: Dictionary of column name to numpy array for the new points"""
+
+        count = len(next(iter(columns.values())))
+        for name, values in self.columns.items():
+            new_values = columns.get(name)
+            if new_values is None:
+                new_values = np.zeros(count, dtype=values.dtype)
+            elif np.isscalar(new_values):
+                new_values = np.full(count, new_values)
+            self.columns[name] = np.concatenate([values, np.asarray(new_values).astype(values.dtype, copy=False)])
+
+    def take(self, indices: np.ndarray):
+        """Get a new point cloud containing a subset of points
+        @param indices: Index or boolean mask array of points to keep"""
+
+        return PointCloud({name: values[indices] for name, values in self.columns.items()}, self.delimiter)
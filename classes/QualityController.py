@@ -0,0 +1,179 @@
+import os
+import json
+import time
+from config import load_config
+from plugins.sonar_plugin import PATH_FRAMES
+
+#Detail scale of named quality levels: spacings are multiplied and vertex counts divided by the scale
+QUALITY_LEVELS = {"preview": 3.0, "standard": 1.0, "final": 0.5}
+
+#Stages whose run time scales with the detail of the scene, other stages are assumed to take constant time
+SCALED_STAGES = ("terrain", "sonar pass")
+
+#Exponent of the run time of scaled stages over the detail scale (area density of vertices and sonar returns)
+SCALE_EXPONENT = -2.0
+
+#Smallest number of landscape vertices per side
+MIN_SUBDIVISIONS = 16
+
+class QualityController:
+    """Class to set the detail of generated scenes by a named quality level, or calibrate it to a time budget.
+    The detail is a single scale applied to the configured landscape resolution, trajectory resampling tolerance,
+    sonar beam resolution and ping spacing, with "standard" (scale 1) using the configured values unchanged.
+    Level "auto" times the stages of the first iterations, and chooses the scale for which the predicted time
+    per scene meets the target. The chosen settings are recorded in a manifest in the output directory.
+    """
+
+    def __init__(self, config: load_config.RootConfig, manifest_path: str = None):
+        """Initialize quality controller and apply the settings of the configured level
+        @param config: Configuration object, modified in place
+        @param manifest_path: Path of the quality manifest, None to not save it. An existing manifest of a completed
+        calibration is resumed."""
+
+        self.config = config
+        self.manifest_path = manifest_path
+        quality = config.quality
+
+        self.level = quality.level if quality is not None else "standard"
+        if self.level != "auto" and self.level not in QUALITY_LEVELS:
+            raise Exception(f"Invalid quality level: {self.level}")
+
+        #Configured values, which all levels are derived from
+        self.base = {"subdivisions": config.landscape.subdivisions,
+                     "gsd": config.landscape.gsd,
+                     "gsd_coarse": config.landscape.gsd_coarse,
+                     "chord_tolerance": config.sensor_trajectory.chord_tolerance,
+                     "resolution": config.sonar.resolution,
+                     "ping_spacing": config.sonar.ping_spacing}
+
+        self.calibration = []
+        self.calibrated = self.level != "auto"
+        self.scale = QUALITY_LEVELS.get(self.level, 1.0)
+
+        if self.level == "auto" and manifest_path is not None and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("level") == "auto" and manifest.get("calibrated"):
+                self.scale = manifest["scale"]
+                self.calibration = manifest["calibration"]
+                self.calibrated = True
+                print(f"Resuming calibrated quality scale {self.scale:.2f}")
+
+        self.apply(self.scale)
+
+    def base_ping_spacing(self) -> float:
+        """Along-track ping spacing of the configured settings (m)"""
+
+        sonar = self.config.sonar
+        if self.base["ping_spacing"] is not None:
+            return self.base["ping_spacing"]
+        if sonar.vessel_speed is not None and sonar.ping_rate is not None:
+            return sonar.vessel_speed/sonar.ping_rate
+        return self.config.sensor_trajectory.size/PATH_FRAMES
+
+    def apply(self, scale: float):
+        """Set the configuration to a detail scale
+        @param scale: Detail scale, 1 = configured settings, > 1 coarser, < 1 finer"""
+
+        self.scale = scale
+        config = self.config
+        base = self.base
+
+        config.landscape.subdivisions = max(MIN_SUBDIVISIONS, round(base["subdivisions"]/scale))
+        if base["gsd"] is not None:
+            config.landscape.gsd = base["gsd"]*scale
+            config.landscape.gsd_coarse = base["gsd_coarse"]*scale
+        if base["chord_tolerance"] is not None:
+            config.sensor_trajectory.chord_tolerance = base["chord_tolerance"]*scale
+        config.sonar.resolution = base["resolution"]*scale
+        config.sonar.ping_spacing = base["ping_spacing"] if scale == 1.0 else self.base_ping_spacing()*scale
+
+    def settings(self) -> dict:
+        """Current quality settings, for scene info and manifest"""
+
+        config = self.config
+        return {"level": self.level,
+                "scale": self.scale,
+                "subdivisions": config.landscape.subdivisions if config.landscape.gsd is None else None,
+                "gsd": config.landscape.gsd,
+                "gsd_coarse": config.landscape.gsd_coarse if config.landscape.adaptive else None,
+                "chord_tolerance": config.sensor_trajectory.chord_tolerance,
+                "sonar_resolution": config.sonar.resolution,
+                "ping_spacing": config.sonar.ping_spacing}
+
+    def timed(self, stages):
+        """Time the stages of a scene, and calibrate the detail scale when the scene is complete
+        @param stages: Generator over the stages of one scene
+        @return: Generator yielding the stages of the scene
+        """
+
+        timings = {}
+        start = time.perf_counter()
+        for stage in stages:
+            timings[stage] = time.perf_counter() - start
+            yield stage
+            start = time.perf_counter()
+        timings["other"] = time.perf_counter() - start
+
+        self.record(timings)
+
+    def record(self, timings: dict):
+        """Record the stage timings of a scene, and choose the detail scale of the next scenes while calibrating.
+        Layers reused from the previous variant of a scene are not built and have no timing, so each stage is
+        averaged over the scenes in which it ran.
+        @param timings: Dictionary of stage name to run time (s)"""
+
+        if self.calibrated:
+            return
+
+        #Stages of the scaled groups are summed per group, e.g. all sonar passes of the scene
+        stages = {}
+        for stage, seconds in timings.items():
+            group = next((prefix for prefix in SCALED_STAGES if stage.startswith(prefix)), stage)
+            stages[group] = stages.get(group, 0.0) + seconds
+
+        scaled = sum(seconds for stage, seconds in stages.items() if stage in SCALED_STAGES)
+        fixed = sum(stages.values()) - scaled
+        self.calibration.append({"scale": self.scale, "seconds": sum(stages.values()), "scaled_seconds": scaled, "fixed_seconds": fixed, "stages": stages})
+
+        #Average of each stage over the calibration scenes in which it ran, scaled stages normalized to scale 1
+        scaled_unit = 0.0
+        fixed_mean = 0.0
+        for stage in {stage for c in self.calibration for stage in c["stages"]}:
+            runs = [c for c in self.calibration if stage in c["stages"]]
+            if stage in SCALED_STAGES:
+                scaled_unit += sum(c["stages"][stage]/c["scale"]**SCALE_EXPONENT for c in runs)/len(runs)
+            else:
+                fixed_mean += sum(c["stages"][stage] for c in runs)/len(runs)
+
+        quality = self.config.quality
+        budget = quality.target_seconds - fixed_mean
+        if scaled_unit <= 0.0:
+            scale = quality.scale_min
+        elif budget <= 0.0:
+            scale = quality.scale_max
+        else:
+            scale = (budget/scaled_unit)**(1.0/SCALE_EXPONENT)
+        scale = min(max(scale, quality.scale_min), quality.scale_max)
+
+        self.calibrated = len(self.calibration) >= quality.calibration_iterations
+        print(f"Quality calibration: {sum(timings.values()):.1f} s per scene at scale {self.scale:.2f}, "
+              f"next scale {scale:.2f}{' (final)' if self.calibrated else ''}")
+        self.apply(scale)
+        self.save()
+
+    def save(self):
+        """Save the quality manifest"""
+
+        if self.manifest_path is None:
+            return
+
+        manifest = {"level": self.level,
+                    "target_seconds": self.config.quality.target_seconds if self.level == "auto" else None,
+                    "calibrated": self.calibrated,
+                    "scale": self.scale,
+                    "settings": self.settings(),
+                    "base": self.base,
+                    "calibration": self.calibration}
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
@@ -0,0 +1,118 @@
+import math
+import numpy as np
+from random import uniform, choice, choices, betavariate
+from utils.geometry import polyline_arc_length, project_to_polyline, interpolate_polyline
+
+#Beta distribution parameters of the across-track position, as fraction of the swath half width
+ACROSS_TRACK_DISTRIBUTIONS = {"uniform": (1.0, 1.0),  #Uniform in area
+                              "nadir": (1.0, 3.0),    #Close to the sensor track
+                              "mid": (3.0, 3.0),      #Middle of each side of the swath
+                              "outer": (3.0, 1.0)}    #Outer beams
+
+class SwathFootprint:
+    """Class to describe the footprint of the sonar swath on the seafloor along a sensor trajectory.
+    The swath extends to both sides of the trajectory, with a half width given by the sensor height
+    above the seafloor and the sonar field of view.
+    """
+
+    def __init__(self, trajectory: np.ndarray, seafloor_z: np.ndarray, fov: float):
+        """Initialize swath footprint
+        @param trajectory: (N,3) array of sensor trajectory points
+        @param seafloor_z: (N,) array of seafloor heights below the trajectory points
+        @param fov: Downwards field of view of the sonar (deg)"""
+
+        self.trajectory = np.asarray(trajectory, dtype=np.float64)
+        self.half_widths = np.maximum(self.trajectory[:,2] - seafloor_z, 0.0)*math.tan(math.radians(fov/2))
+        self.arc_length = polyline_arc_length(self.trajectory[:,:2])
+
+    @property
+    def length(self) -> float:
+        return float(self.arc_length[-1])
+
+    def normals(self) -> np.ndarray:
+        """Horizontal unit normals (pointing left of travel direction) at the trajectory points"""
+
+        xy = self.trajectory[:,:2]
+        tangents = np.gradient(xy, axis=0)
+        tangents /= np.maximum(np.linalg.norm(tangents, axis=1), 1e-12)[:,None]
+
+        return np.column_stack((-tangents[:,1], tangents[:,0]))
+
+    def polygon(self, margin: float = 0.0) -> np.ndarray:
+        """Outline of the swath footprint
+        @param margin: Distance added to the swath half width (m)
+        @return: (2N,2) array of polygon vertices, left edge followed by reversed right edge
+        """
+
+        offsets = self.normals()*(self.half_widths + margin)[:,None]
+        xy = self.trajectory[:,:2]
+
+        return np.concatenate((xy + offsets, (xy - offsets)[::-1]))
+
+    def contains(self, points: np.ndarray, margin: float = 0.0) -> np.ndarray:
+        """Test whether points lie within the swath footprint
+        @param points: (M,2) array of points
+        @param margin: Distance added to the swath half width (m)
+        @return: (M,) boolean array
+        """
+
+        points = np.asarray(points, dtype=np.float64)[:,:2]
+        segment, t, _, _ = project_to_polyline(points, self.trajectory[:,:2])
+        closest = interpolate_polyline(self.trajectory[:,:2], segment, t)
+        half_width = self.half_widths[segment] + t*(self.half_widths[segment+1] - self.half_widths[segment])
+
+        return np.linalg.norm(points - closest, axis=1) <= half_width + margin
+
+    def overlaps_polygons(self, vertices: np.ndarray, loops: np.ndarray, loop_starts: np.ndarray, margin: float = 0.0) -> np.ndarray:
+        """Test whether polygons overlap the swath footprint. Every point of a polygon lies within the diagonal of the
+        polygon's bounding box of each of its vertices, so a polygon is kept if any vertex lies within the footprint
+        grown by that diagonal. Polygons larger than the swath that cross it without a vertex inside are kept, at
+        the cost of keeping some polygons close to the footprint.
+        @param vertices: (N,2) array of vertices
+        @param loops: (L,) array of loop vertex indices, polygons in order
+        @param loop_starts: (F,) array of first loop of each polygon
+        @param margin: Distance added to the swath half width (m)
+        @return: (F,) boolean array
+        """
+
+        loop_xy = np.asarray(vertices, dtype=np.float64)[loops,:2]
+        loop_totals = np.diff(np.append(loop_starts, len(loops)))
+        extents = np.linalg.norm(np.maximum.reduceat(loop_xy, loop_starts) - np.minimum.reduceat(loop_xy, loop_starts), axis=1)
+
+        loop_inside = self.contains(loop_xy, margin + np.repeat(extents, loop_totals))
+
+        return np.logical_or.reduceat(loop_inside, loop_starts)
+
+    def area(self) -> float:
+        """Approximate area of the swath footprint (m^2)"""
+
+        segment_lengths = np.diff(self.arc_length)
+        return float(np.sum(segment_lengths*(self.half_widths[:-1] + self.half_widths[1:])))
+
+    def sample(self, distribution: str = "uniform", margin: float = 0.0) -> np.ndarray:
+        """Draw a random point inside the swath footprint. The along-track position is drawn proportional to the
+        swath width, the across-track position follows the given distribution on either side of the track.
+        @param distribution: Across-track distribution, one of ACROSS_TRACK_DISTRIBUTIONS
+        @param margin: Distance subtracted from the swath half width, e.g. to keep objects inside the swath (m)
+        @return: (2,) array of the point
+        """
+
+        if distribution not in ACROSS_TRACK_DISTRIBUTIONS:
+            raise Exception(f"Invalid across-track distribution: {distribution}")
+        alpha, beta = ACROSS_TRACK_DISTRIBUTIONS[distribution]
+
+        half_widths = np.maximum(self.half_widths - margin, 0.0)
+        segment_areas = np.diff(self.arc_length)*(half_widths[:-1] + half_widths[1:])
+        if segment_areas.sum() <= 0.0:
+            segment_areas = np.diff(self.arc_length) + 1e-12
+
+        segment = choices(range(len(segment_areas)), weights=segment_areas)[0]
+        t = uniform(0, 1)
+
+        start = self.trajectory[segment,:2]
+        delta = self.trajectory[segment+1,:2] - start
+        normal = np.array((-delta[1], delta[0]))/max(np.linalg.norm(delta), 1e-12)
+        half_width = half_widths[segment] + t*(half_widths[segment+1] - half_widths[segment])
+        across = choice((-1, 1))*betavariate(alpha, beta)*half_width
+
+        return start + t*delta + across*normal
@@ -0,0 +1,53 @@
+import numpy as np
+from classes.ArcLengthTrajectory import ArcLengthTrajectory
+
+class TileGrid:
+    """Class to describe the square tiles of a tiled world, indexed by (column, row).
+    Tile (i, j) covers x in [i*tile_size, (i+1)*tile_size) and y in [j*tile_size, (j+1)*tile_size).
+    """
+
+    def __init__(self, tile_size: float):
+        """Initialize tile grid
+        @param tile_size: Side length of a tile (m)"""
+
+        self.tile_size = tile_size
+
+    def tiles_of(self, points: np.ndarray) -> np.ndarray:
+        """Tiles containing points
+        @param points: (N,2) or (N,3) array of points
+        @return: (N,2) int array of tile indices
+        """
+
+        return np.floor(np.asarray(points)[:,:2]/self.tile_size).astype(np.int64)
+
+    def bounds(self, tile: tuple) -> tuple:
+        """Bounds of a tile
+        @return: Tuple of x_min, y_min, x_max, y_max
+        """
+
+        return tile[0]*self.tile_size, tile[1]*self.tile_size, (tile[0] + 1)*self.tile_size, (tile[1] + 1)*self.tile_size
+
+    def corridor_tiles(self, points: np.ndarray, half_width: float) -> set:
+        """Tiles intersecting a corridor around a trajectory, e.g. the sonar swath.
+        The trajectory is sampled at less than half the tile size, and every tile within the half width of a sample
+        in x or y is included, which covers the corridor with at most one extra ring of tiles.
+        @param points: (N,3) array of trajectory points
+        @param half_width: Half width of the corridor (m)
+        @return: Set of (column, row) tile indices
+        """
+
+        if len(points) > 1:
+            samples = ArcLengthTrajectory(points).sample(self.tile_size/2)[:,:2]
+        else:
+            samples = np.asarray(points)[:,:2]
+
+        low = np.floor((samples - half_width)/self.tile_size).astype(np.int64)
+        high = np.floor((samples + half_width)/self.tile_size).astype(np.int64)
+
+        #All tiles between low and high of each sample
+        span = int((high - low).max()) + 1
+        offsets = np.stack(np.meshgrid(np.arange(span), np.arange(span), indexing="ij"), axis=-1).reshape(-1, 2)
+        candidates = low[:,None,:] + offsets[None,:,:]
+        inside = np.all(candidates <= high[:,None,:], axis=2)
+
+        return set(map(tuple, np.unique(candidates[inside], axis=0).tolist()))
@@ -6,6 +6,16 @@ class GeneralConfig:
         self.iterations = raw['iterations']
         self.dae_output = raw['dae_output']
         self.continuous_play = raw['continuous_play']
+        self.seed = raw.get('seed')
+        self.variants = raw.get('variants', 1)
+        self.variant_layers = raw.get('variant_layers', ['munitions'])
+        self.leak_check = raw.get('leak_check', False)
+        self.leak_window = raw.get('leak_window', 5)
+        self.memory_limit_mb = raw.get('memory_limit_mb')
+        self.shared_assets = raw.get('shared_assets', False)
+        self.shared_assets_size_mb = raw.get('shared_assets_size_mb', 512)
+        self.stream = raw.get('stream')
+        self.stream_max_in_flight = raw.get('stream_max_in_flight', 2)
 
     def __repr__(self):
         return str(self.__dict__) + '\n'
@@ -27,6 +37,26 @@ class LandscapeConfig:
         self.boulder_chance = raw['boulder_chance']
         self.alpha_min = raw['alpha_min']
         self.alpha_max = raw['alpha_max']
+        self.subdivisions = raw.get('subdivisions', 128)
+        self.gsd = raw.get('gsd')
+        self.adaptive = raw.get('adaptive', False)
+        self.gsd_coarse = raw.get('gsd_coarse', 0.5)
+        self.corridor_margin = raw.get('corridor_margin', 1.0)
+        self.cache_dir = raw.get('cache_dir', None)
+        self.cache_size_mb = raw.get('cache_size_mb', 1024)
+        self.tiled = raw.get('tiled', False)
+        self.tile_size = raw.get('tile_size', 20.0)
+        self.chunk_length = raw.get('chunk_length', 40.0)
+
+    def __repr__(self):
+        return str(self.__dict__) + '\n'
+
+class MarineSnowConfig:
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.point_domain = raw['point_domain']
+        self.density = raw['density']
+        self.depth_min = raw['depth_min']
+        self.depth_max = raw['depth_max']
 
     def __repr__(self):
         return str(self.__dict__) + '\n'
@@ -41,19 +71,47 @@ class SensorTrajectoryConfig:
         self.bend_occ_min = raw['bend_occ_min']
         self.bend_occ_max = raw['bend_occ_max']
         self.trajectory_deviation_param = raw["trajectory_deviation_param"]
+        self.passes = raw.get('passes', 1)
+        self.pass_mode = raw.get('pass_mode', "random")
+        self.chord_tolerance = raw.get('chord_tolerance', None)
+        self.max_point_spacing = raw.get('max_point_spacing', None)
 
     def __repr__(self):
         return str(self.__dict__) + '\n'
 
+def parse_munition_weights(munition_type) -> Dict[str, float]:
+    """Parse munition type setting into weights of munition types.
+    Args:
+        munition_type: Single type name, list of equally weighted type names, or mapping of type name to weight
+
+    Returns:
+        Dictionary of munition type name to weight
+    """
+    if isinstance(munition_type, str):
+        return {munition_type: 1.0}
+    if isinstance(munition_type, list):
+        return {name: 1.0 for name in munition_type}
+    return {name: float(weight) for name, weight in munition_type.items()}
+
 class MunitionsConfig:
     def __init__(self, raw: Dict[str, Any]) -> None:
         self.generate = raw['generate']
         self.munition_type = raw['munition_type']
+        self.munition_weights = parse_munition_weights(raw['munition_type'])
         self.num_munitions = raw['num_instances']
         self.min_distance = raw['min_distance']
         self.alpha_min = raw['alpha_min']
         self.alpha_max = raw['alpha_max']
         self.save_bb_info = raw['save_bb_info']  # Save bounding box info of munitions
+        self.save_instance_labels = raw.get('save_instance_labels', False)
+        self.instance_margin = raw.get('instance_margin', 0.05)
+        self.placement = raw.get('placement', "trajectory")
+        self.across_track = raw.get('across_track', "uniform")
+        self.swath_margin = raw.get('swath_margin', 0.5)
+        self.visibility_policy = raw.get('visibility_policy', "none")
+        self.visibility_required = raw.get('visibility_required', "partial")
+        self.visibility_threshold = raw.get('visibility_threshold', 0.5)
+        self.visibility_attempts = raw.get('visibility_attempts', 5)
 
     def __repr__(self):
         return str(self.__dict__) + '\n'
@@ -70,11 +128,55 @@ class SonarConfig:
         self.interference_noise_min = raw['interference_noise_min']
         self.interference_noise_max = raw['interference_noise_max']
         self.interference_noise_chance_per_beam = raw['interference_noise_chance_per_beam']
+        self.noise_variants = raw.get('noise_variants', 0)
+        self.keep_clean_scan = raw.get('keep_clean_scan', True)
+        self.ping_spacing = raw.get('ping_spacing', None)
+        self.vessel_speed = raw.get('vessel_speed', None)
+        self.ping_rate = raw.get('ping_rate', None)
         self.save_csv = raw['save_csv']
 
     def __repr__(self):
         return str(self.__dict__) + '\n'
 
+class BathymetryConfig:
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.enabled = raw['enabled']
+        self.resolution = raw['resolution']
+        self.chunk_points = raw.get('chunk_points', 1048576)
+
+    def __repr__(self):
+        return str(self.__dict__) + '\n'
+
+class QualityConfig:
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.level = raw.get('level', "standard")
+        self.target_seconds = raw.get('target_seconds', 60)
+        self.calibration_iterations = raw.get('calibration_iterations', 3)
+        self.scale_min = raw.get('scale_min', 0.5)
+        self.scale_max = raw.get('scale_max', 4.0)
+
+    def __repr__(self):
+        return str(self.__dict__) + '\n'
+
+class CullingConfig:
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.enabled = raw['enabled']
+        self.margin = raw['margin']
+
+    def __repr__(self):
+        return str(self.__dict__) + '\n'
+
+class DemConfig:
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.enabled = raw['enabled']
+        self.resolution = raw['resolution']
+        self.objects = raw.get('objects', True)
+        self.crs = raw.get('crs')
+        self.origin = raw.get('origin')
+
+    def __repr__(self):
+        return str(self.__dict__) + '\n'
+
 class RootConfig:
     def __init__(self, raw: Dict[str, Any]) -> None:
         self.__base = ""
@@ -93,6 +195,11 @@ class RootConfig:
         else:
             self.landscape = None
 
+        if 'marine_snow' in raw:
+            self.marine_snow = MarineSnowConfig(raw['marine_snow'])
+        else:
+            self.marine_snow = None
+
         if 'sonar' in raw:
             self.sonar = SonarConfig(raw['sonar'])
         else:
@@ -103,6 +210,26 @@ class RootConfig:
         else:
             self.munitions = None
 
+        if 'culling' in raw:
+            self.culling = CullingConfig(raw['culling'])
+        else:
+            self.culling = None
+
+        if 'dem' in raw:
+            self.dem = DemConfig(raw['dem'])
+        else:
+            self.dem = None
+
+        if 'bathymetry' in raw:
+            self.bathymetry = BathymetryConfig(raw['bathymetry'])
+        else:
+            self.bathymetry = None
+
+        if 'quality' in raw:
+            self.quality = QualityConfig(raw['quality'])
+        else:
+            self.quality = None
+
         if 'sensor_trajectory' in raw:
             self.sensor_trajectory = SensorTrajectoryConfig(raw['sensor_trajectory'])
         else:
@@ -1,7 +1,10 @@
 import bpy
 import os
 import sys
+import json
+import shutil
 from datetime import datetime
+from random import seed, randint
 from shutil import copy
 import pathlib
 
@@ -12,9 +15,15 @@ else: #Running through GUI
     file_dir = str(os.path.dirname(bpy.context.space_data.text.filepath))
 sys.path.append(file_dir)
 
-from plugins import environment_plugin, sonar_plugin, munitions_plugin, sensor_plugin
+from plugins import environment_plugin, sonar_plugin, munitions_plugin, sensor_plugin, marine_snow_plugin, culling_plugin, dem_plugin, visibility_plugin, bathymetry_plugin, tiled_world_plugin, stream_plugin
 from config import load_config
 from utils.ArgumentParserForBlender import ArgumentParserForBlender
+from utils.geometry import polyline_arc_length
+from classes.ArcLengthTrajectory import ArcLengthTrajectory
+from classes.PointCloud import LABELS
+from classes import LeakDetector, ContinuousPlay, LayerPipeline, QualityController
+from utils.seeding import stage_seed
+from utils.work_queue import WorkQueue
 
 from mathutils import *
 D = bpy.data
@@ -27,6 +36,17 @@ importlib.reload(sonar_plugin)
 importlib.reload(munitions_plugin)
 importlib.reload(load_config)
 importlib.reload(sensor_plugin)
+importlib.reload(marine_snow_plugin)
+importlib.reload(culling_plugin)
+importlib.reload(dem_plugin)
+importlib.reload(visibility_plugin)
+importlib.reload(bathymetry_plugin)
+importlib.reload(tiled_world_plugin)
+importlib.reload(stream_plugin)
+importlib.reload(LeakDetector)
+importlib.reload(ContinuousPlay)
+importlib.reload(LayerPipeline)
+importlib.reload(QualityController)
 
 #function to clear the current Blender scene
 def clear_scene():
@@ -58,12 +78,347 @@ def clear_scene():
     for col in bpy.data.collections:
         bpy.data.collections.remove(col)
 
+    #delete node groups (geometry node templates)
+    for node_group in bpy.data.node_groups:
+        bpy.data.node_groups.remove(node_group)
+
+    #delete cameras (sonar sensor)
+    for camera in bpy.data.cameras:
+        bpy.data.cameras.remove(camera)
+
+    #delete actions (sensor path animation)
+    for action in bpy.data.actions:
+        bpy.data.actions.remove(action)
+
+    #delete images
+    for image in bpy.data.images:
+        bpy.data.images.remove(image)
+
     bpy.ops.outliner.orphans_purge()
 
-def Update3DViewPorts():
-    #should use modal operator? https://blender.stackexchange.com/questions/28673/update-viewport-while-running-script
-    if myconfig.general.continuous_play:
-        bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+def create_output_dirs(config: load_config.RootConfig, base_dir: str):
+    """Create the output directory structure of enabled outputs
+    @param config: Configuration object
+    @param base_dir: Output directory of the run, or staging directory of a queued job
+    @return: Tuple of dae, sonar, munitions box, instance label, DEM, bathymetry and scene info directories
+    """
+
+    dae_save_dir = base_dir + "/dae"
+    sonar_save_dir = base_dir + "/sonar"
+    munitions_save_dir = base_dir + "/munitions_bb_info"
+    instances_save_dir = base_dir + "/instances"
+    dem_save_dir = base_dir + "/dem"
+    bathymetry_save_dir = base_dir + "/bathymetry"
+    scene_info_save_dir = base_dir + "/scene_info"
+
+    if(config.general.dae_output):
+        os.makedirs(dae_save_dir, exist_ok=True)
+
+    if(config.sonar.save_csv):
+        os.makedirs(sonar_save_dir, exist_ok=True)
+
+    if(config.munitions.save_bb_info):
+        os.makedirs(munitions_save_dir, exist_ok=True)
+
+    if(config.munitions.save_instance_labels and config.sonar.save_csv):
+        os.makedirs(instances_save_dir, exist_ok=True)
+
+    if(config.dem is not None and config.dem.enabled):
+        os.makedirs(dem_save_dir, exist_ok=True)
+
+    if(config.bathymetry is not None and config.bathymetry.enabled and config.sonar.save_csv):
+        os.makedirs(bathymetry_save_dir, exist_ok=True)
+
+    os.makedirs(scene_info_save_dir, exist_ok=True)
+
+    return dae_save_dir, sonar_save_dir, munitions_save_dir, instances_save_dir, dem_save_dir, bathymetry_save_dir, scene_info_save_dir
+
+def restart_worker(config_file: str, output: str, resume_dir: str, start_iteration: int, queue_dir: str = None):
+    """Replace the running Blender process by a new one, continuing at the given iteration.
+    Completed iterations are already saved, and the new process writes into the same output directory.
+    @param config_file: Path to the configuration file
+    @param output: Output directory argument of the current process
+    @param resume_dir: Output directory of the current run
+    @param start_iteration: Iteration to continue with
+    @param queue_dir: Shared work queue directory, the new process continues claiming jobs
+    """
+
+    blender_args = sys.argv[1:sys.argv.index("--")] if "--" in sys.argv else sys.argv[1:]
+    script_args = ["-c", config_file, "--start-iteration", str(start_iteration)]
+    if output:
+        script_args += ["-o", output]
+    if resume_dir:
+        script_args += ["--resume-dir", resume_dir]
+    if queue_dir:
+        script_args += ["--queue", queue_dir]
+
+    print(f"Restarting worker at iteration {start_iteration}")
+    sys.stdout.flush()
+    os.execv(bpy.app.binary_path, [bpy.app.binary_path] + blender_args + ["--"] + script_args)
+
+def build_terrain(results: dict):
+    """Scene layer of sensor trajectory and landscape. The trajectory is projected onto the landscape, and adaptive
+    landscape meshing follows the trajectory, so both are built together. The tiles of a tiled world are only
+    created while the trajectory is scanned.
+    @return: Tuple of survey passes, their swath footprints (None if not needed) and the tiled world (None if not tiled)
+    """
+
+    print("--SENSOR TRAJECTORY GENERATION--")
+    survey_passes = sensor_plugin.gen_sensor_trajectory(myconfig)
+
+    if myconfig.landscape.tiled:
+        return survey_passes, None, tiled_world_plugin.TiledWorld(myconfig)
+
+    print("--ENVIRONMENT GENERATION--")
+    environment_plugin.generate_landscape_ant(myconfig, survey_passes)
+    environment_plugin.project_trajectory_to_landscape(myconfig)
+
+    #Sonar swath footprints, shared by munition placement and culling
+    footprints = None
+    if (myconfig.munitions.generate and myconfig.munitions.placement == "swath") or (myconfig.culling is not None and myconfig.culling.enabled):
+        footprints = sensor_plugin.swath_footprints(myconfig, survey_passes)
+
+    return survey_passes, footprints, None
+
+def build_boulders(results: dict):
+    if not myconfig.landscape.tiled:
+        environment_plugin.create_boulders(myconfig)
+
+def build_noise(results: dict):
+    if not myconfig.landscape.tiled:
+        environment_plugin.create_noise_particles(myconfig)
+
+def build_munitions(results: dict):
+    """Scene layer of munitions, checked for visibility before scanning
+    @return: Tuple of dictionary of munition name to visibility (None if not checked), and whether the scene is rejected
+    """
+
+    if not myconfig.munitions.generate:
+        return None, False
+
+    print("--MUNITIONS GENERATION--")
+    survey_passes, footprints, tiled_world = results["terrain"]
+    if tiled_world is not None:
+        tiled_world.plan_munitions(survey_passes)
+        return None, False
+
+    munitions_plugin.gen_munition(myconfig, footprints)
+
+    #Check munition visibility before scanning, relocate munitions or reject scene by policy
+    if myconfig.munitions.visibility_policy == "none":
+        return None, False
+
+    print("--MUNITION VISIBILITY CHECK--")
+    return visibility_plugin.check_munition_visibility(myconfig, survey_passes, footprints)
+
+#Layers of a scene, upstream layers first
+SCENE_LAYERS = [LayerPipeline.Layer("terrain", build_terrain, (), ("sensor_trajectory", "landscape", "sonar"), stage="environment_plugin"),
+                LayerPipeline.Layer("boulders", build_boulders, ("terrain",), ("landscape", "boulders"), stage="environment_plugin"),
+                LayerPipeline.Layer("noise", build_noise, ("terrain",), ("landscape", "marine_snow"), stage="environment_plugin"),
+                LayerPipeline.Layer("munitions", build_munitions, ("terrain", "boulders", "noise"), ("munitions", "sonar"), stage="munitions_plugin")]
+
+def generate_scene(job_id: str, i: int):
+    """Generate, scan and save one scene, one pipeline stage at a time
+    @param job_id: ID of the work queue job, None if not using a work queue
+    @param i: Iteration number
+    @return: Generator yielding the name of each completed stage
+    """
+
+    print("\n------ ITERATION: ", i, " --------")
+
+    #Results of queued jobs are staged, and committed to the output directory when complete
+    if work_queue is not None and save_dir is not None:
+        dae_save_dir, sonar_save_dir, munitions_save_dir, instances_save_dir, dem_save_dir, bathymetry_save_dir, scene_info_save_dir = create_output_dirs(myconfig, work_queue.staging_dir(job_id))
+    else:
+        dae_save_dir, sonar_save_dir, munitions_save_dir, instances_save_dir, dem_save_dir, bathymetry_save_dir, scene_info_save_dir = output_dirs
+
+    #Scans of streamed scenes are exported to shared memory, and deleted once they are published
+    if scene_stream is not None:
+        sonar_save_dir = stream_plugin.scan_dir()
+
+    #Iterations are grouped into variants of a scene, layers that do not vary between variants are reused
+    scene_index, variant = divmod(i, myconfig.general.variants)
+    if myconfig.general.seed is not None:
+        scene_seed = myconfig.general.seed + scene_index
+    else:
+        scene_seed = scene_seeds.setdefault(scene_index, randint(0, 2**31 - 1))
+    print(f"Scene seed: {scene_seed}, variant: {variant}")
+
+    print("--SCENE GENERATION START--")
+
+    scene_info = {"iteration": i, "seed": scene_seed, "variant": variant, "quality": quality_controller.settings(), "passes": []}
+    if(myconfig.munitions.generate and myconfig.munitions.save_bb_info and scene_stream is None):
+        scene_info["munitions_bb_info"] = f'{i:05d}' + ".txt"
+
+    scene_info["reused_layers"] = layer_pipeline.update(scene_seed, variant, myconfig.general.variant_layers, clear_scene)
+    leak_detector.record_iteration()
+
+    for layer in layer_pipeline.build():
+        yield layer
+    scene_info["layers"] = dict(layer_pipeline.keys)
+
+    survey_passes, footprints, tiled_world = layer_pipeline.results["terrain"]
+    visibility, rejected = layer_pipeline.results["munitions"]
+    if visibility is not None:
+        scene_info["visibility"] = visibility
+    if rejected:
+        scene_info["rejected"] = "munitions not visible"
+        #Rejected scenes are not scanned, their boxes are recorded in the scene info only
+        scene_info.pop("munitions_bb_info", None)
+
+    #Munitions of a tiled world only exist while their tile is materialized, their plan is saved with the world
+    if(myconfig.munitions.generate and tiled_world is None):
+        if scene_stream is None and not rejected:
+            munitions_plugin.save_munitions_info(myconfig, i, munitions_save_dir if myconfig.munitions.save_bb_info else None)
+        names, centers, axes, half_extents = munitions_plugin.munition_boxes()
+        scene_info["munitions"] = [{"name": name, "center": center.tolist(), "axes": box_axes.tolist(), "half_extents": half.tolist()}
+                                   for name, center, box_axes, half in zip(names, centers, axes, half_extents)]
+
+    if myconfig.dem is not None and myconfig.dem.enabled and not rejected and tiled_world is None and scene_stream is None:
+        print("--DEM EXPORT--")
+        with leak_detector.stage("dem_plugin"):
+            dem_plugin.export_dem(myconfig, i, dem_save_dir)
+        scene_info["dem"] = f'{i:05d}' + ".npz"
+        yield "DEM export"
+
+    if myconfig.culling is not None and myconfig.culling.enabled and not rejected and tiled_world is None:
+        print("--SWATH CULLING--")
+        with leak_detector.stage("culling_plugin"):
+            scene_info["culling"] = culling_plugin.cull_outside_swath(myconfig, footprints)
+        #Culling removes geometry of all layers, nothing can be reused for the next variant
+        layer_pipeline.invalidate()
+        yield "swath culling"
+
+    #Sonar noise and marine snow differ for each variant
+    sonar_seed = stage_seed(scene_seed, "sonar", variant)
+    seed(sonar_seed)
+
+    #First scan of each pass, gridded into the bathymetry product
+    bathymetry_csv_paths = []
+
+    for pass_idx, survey_pass in enumerate(survey_passes):
+
+        pass_info = {"height": float(survey_pass[0,2]),
+                     "length": float(polyline_arc_length(survey_pass[:,:2])[-1]),
+                     "trajectory": survey_pass[:,:2].round(3).tolist(),
+                     "sonar_files": []}
+        scene_info["passes"].append(pass_info)
+
+        if not myconfig.sonar.generate or rejected:
+            continue
+
+        #A tiled world is scanned in pieces, with the tiles around each piece materialized
+        if tiled_world is not None:
+            chunks = ArcLengthTrajectory(survey_pass).split(myconfig.landscape.chunk_length)
+            pass_info["chunks"] = []
+        else:
+            chunks = [survey_pass]
+
+        for chunk_idx, chunk in enumerate(chunks):
+
+            scan_chunk_idx = None
+            piece = ""
+            if tiled_world is not None:
+                scan_chunk_idx = chunk_idx
+                piece = f" piece {chunk_idx+1}/{len(chunks)}"
+                print(f"--TILED WORLD UPDATE (PIECE {chunk_idx+1}/{len(chunks)})--")
+                with leak_detector.stage("tiled_world_plugin"):
+                    tiles = tiled_world.update(chunk)
+                chunk_info = {"tiles": [list(tile) for tile in tiles], "munitions": munitions_plugin.munition_boxes()[0], "sonar_files": []}
+                pass_info["chunks"].append(chunk_info)
+
+            with leak_detector.stage("sonar_plugin"):
+                if len(survey_passes) > 1 or tiled_world is not None:
+                    print(f"--SONAR GENERATION (PASS {pass_idx+1}/{len(survey_passes)}{piece.upper()})--")
+                    sensor_plugin.set_sensor_trajectory(chunk)
+                    scan_pass_idx = pass_idx if len(survey_passes) > 1 else None
+                else:
+                    print("--SONAR GENERATION--")
+                    scan_pass_idx = None
+
+                if(myconfig.sonar.save_csv):
+                    sonar_csv_paths = sonar_plugin.generate_data(myconfig, i, sonar_save_dir, sonar_seed, scan_pass_idx, scan_chunk_idx)
+                    pass_info["sonar_files"] += [os.path.basename(csv_path) for csv_path in sonar_csv_paths]
+                    if tiled_world is not None:
+                        chunk_info["sonar_files"] = [os.path.basename(csv_path) for csv_path in sonar_csv_paths]
+                    bathymetry_csv_paths += sonar_csv_paths[:1]
+                else:
+                    sonar_plugin.generate_data(myconfig, i, pass_idx=scan_pass_idx, chunk_idx=scan_chunk_idx)
+            yield f"sonar pass {pass_idx+1}/{len(survey_passes)}{piece}"
+
+            if myconfig.sonar.save_csv and myconfig.marine_snow is not None and myconfig.marine_snow.point_domain:
+                print("--MARINE SNOW INJECTION--")
+                for variant_idx, csv_path in enumerate(sonar_csv_paths):
+                    marine_snow_plugin.inject_marine_snow(myconfig, sonar_seed, csv_path, (pass_idx*len(chunks) + chunk_idx)*len(sonar_csv_paths) + variant_idx)
+
+            if myconfig.sonar.save_csv and myconfig.munitions.generate and myconfig.munitions.save_instance_labels and scene_stream is None:
+                print("--INSTANCE LABELS--")
+                for csv_path in sonar_csv_paths:
+                    munitions_plugin.save_instance_labels(myconfig, csv_path, instances_save_dir)
+
+            if scene_stream is not None:
+                print("--SCAN STREAMING--")
+                with leak_detector.stage("stream_plugin"):
+                    stream_plugin.stream_scans(myconfig, scene_stream, sonar_csv_paths, {"iteration": i, "variant": variant, "pass": pass_idx, "piece": scan_chunk_idx})
+                yield f"scan streaming {pass_idx+1}/{len(survey_passes)}{piece}"
+
+    if tiled_world is not None:
+        scene_info["tiled_world"] = tiled_world.info()
+        tiled_world.clear()
+        print(f"    Tiled world: {scene_info['tiled_world']['tiles_created']} tiles created, at most {tiled_world.max_resident} resident")
+
+    if bathymetry_csv_paths and myconfig.bathymetry is not None and myconfig.bathymetry.enabled and tiled_world is None and scene_stream is None:
+        print("--BATHYMETRY GRIDDING--")
+        bathymetry_plugin.export_bathymetry(myconfig, bathymetry_csv_paths, i, bathymetry_save_dir)
+        scene_info["bathymetry"] = f'{i:05d}' + ".npz"
+        yield "bathymetry gridding"
+
+    if not myconfig.sonar.generate:
+        sonar_plugin.finish_scene()
+
+    print("--SCENE GENERATION COMPLETE--")
+
+    if(myconfig.general.dae_output and not rejected and tiled_world is None and scene_stream is None):
+        dae_filepath = dae_save_dir + "/" + f'{i:05d}' + "_blender_world.dae"
+        bpy.ops.wm.collada_export(filepath=dae_filepath, apply_modifiers=True)
+        print(f"    Exported .dae file to {dae_filepath}")
+        yield "dae export"
+
+    #Save scene information shared by all survey passes
+    if save_dir is not None:
+        with open(scene_info_save_dir + "/" + f'{i:05d}' + ".json", "w") as f:
+            json.dump(scene_info, f)
+
+    if scene_stream is not None:
+        stream_plugin.stream_scene(scene_stream, scene_info)
+        shutil.rmtree(sonar_save_dir, ignore_errors=True)
+
+    if work_queue is not None:
+        work_queue.complete(job_id, save_dir)
+
+def finish_iteration(i: int):
+    """Report leaking datablocks after an iteration, and restart the worker if the memory limit is exceeded
+    @param i: Iteration number
+    """
+
+    #Report leaking datablocks, and restart worker if memory limit is exceeded
+    leak_report = leak_detector.report()
+    if leak_detector.leaked_types():
+        print("--DATABLOCK LEAK DETECTED--")
+        print(leak_report)
+        if save_dir is not None:
+            with open(save_dir + "/leak_report.txt", "w") as f:
+                f.write(leak_report + "\n")
+
+    if leak_detector.memory_exceeded() and (i + 1 < iterations or work_queue is not None):
+        print(f"--MEMORY LIMIT OF {myconfig.general.memory_limit_mb} MB EXCEEDED--")
+        if bpy.app.background:
+            #The restarted worker reconnects to the scene stream consumer
+            if scene_stream is not None:
+                scene_stream.detach()
+            restart_worker(config_file, args.output, save_dir, i + 1, args.queue)
+        else:
+            print("Cannot restart worker when running through GUI")
 
 if __name__ == "__main__":
 
@@ -71,6 +426,9 @@ if __name__ == "__main__":
     parser = ArgumentParserForBlender(description='Generate an underwater scene')
     parser.add_argument("-c","--config", type=str, help='Path to the configuration file')
     parser.add_argument("-o","--output", type=str, help='Path to the output directory')
+    parser.add_argument("--resume-dir", type=str, help='Existing output directory of a run to continue')
+    parser.add_argument("--start-iteration", type=int, default=0, help='Iteration to start with')
+    parser.add_argument("--queue", type=str, help='Shared work queue directory, iterations are claimed from the queue (output goes to <queue>/output unless --resume-dir is set)')
     args = parser.parse_args()
 
     # Print Start Time
@@ -98,8 +456,14 @@ if __name__ == "__main__":
     myconfig = load_config.load_configuration(config_file)
     myconfig.set_base_path(base_path)
 
+    #Marine snow in the point domain is injected into saved scans, and replaces the particle geometry
+    if myconfig.marine_snow is not None and myconfig.marine_snow.point_domain and not myconfig.sonar.save_csv:
+        if myconfig.sonar.generate:
+            raise Exception("marine_snow.point_domain requires sonar.save_csv")
+        print("Warning: marine_snow.point_domain without saved sonar scans, no marine snow is generated")
+
     #Set order of labels to be applied to point clouds
-    bpy.context.scene["labels_list"] = ["none","ground","boulder","munition"]
+    bpy.context.scene["labels_list"] = LABELS
 
     for area in bpy.context.screen.areas:
         if area.type == 'VIEW_3D':
@@ -111,75 +475,79 @@ if __name__ == "__main__":
                 ( 0.0000,  0.0000,  0.0000,   1.0000)
             ))
 
-    Update3DViewPorts()
+    #Stream scenes to a consumer process instead of saving them
+    scene_stream = None
+    if myconfig.general.stream is not None:
+        scene_stream = stream_plugin.open_stream(myconfig)
 
     #Ensure output directory sructure if data saves are to occur
-    if(myconfig.general.dae_output or myconfig.sonar.save_csv or myconfig.munitions.save_bb_info):
+    save_dir = None
+    output_dirs = (None,)*7
+    if scene_stream is None and (myconfig.general.dae_output or myconfig.sonar.save_csv or myconfig.munitions.save_bb_info or (myconfig.dem is not None and myconfig.dem.enabled)):
         if args.output:
             save_dir_base = args.output + r"/"
         else:
             save_dir_base = myconfig.get_base_path() + r"/output/"
 
-        save_dir = save_dir_base + datetime.now().strftime("%Y_%m_%d-%H_%M_%S")
+        if args.resume_dir:
+            save_dir = args.resume_dir
+        elif args.queue:
+            save_dir = args.queue + "/output"
+        else:
+            save_dir = save_dir_base + datetime.now().strftime("%Y_%m_%d-%H_%M_%S")
 
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
 
-        if(myconfig.general.dae_output):
-            dae_save_dir = save_dir + "/dae"
-            if not os.path.exists(dae_save_dir):
-                os.makedirs(dae_save_dir)
-
-        if(myconfig.sonar.save_csv):
-            sonar_save_dir = save_dir + "/sonar"
-            if not os.path.exists(sonar_save_dir):
-                os.makedirs(sonar_save_dir)
-
-        if(myconfig.munitions.save_bb_info):
-            munitions_save_dir = save_dir + "/munitions_bb_info"
-            if not os.path.exists(munitions_save_dir):
-                os.makedirs(munitions_save_dir)
+        output_dirs = create_output_dirs(myconfig, save_dir)
 
         #Save copy of config file into output directory
-        copy(config_file,save_dir)
+        if not args.resume_dir and not os.path.exists(os.path.join(save_dir, os.path.basename(config_file))):
+            copy(config_file,save_dir)
 
     iterations = myconfig.general.iterations
 
-    for i in range(iterations):
-
-        print("\n------ ITERATION: ", i, " --------")
-
-        print("--SCENE GENERATION START--")
-
-        clear_scene()
-
-        print("--SENSOR TRAJECTORY GENERATION--")
-
-        sensor_plugin.gen_sensor_trajectory(myconfig)
-
-        print("--ENVIRONMENT GENERATION--")
-        environment_plugin.generate_environment(myconfig)
-
-        if(myconfig.munitions.generate):
-            print("--MUNITIONS GENERATION--")
-            munitions_plugin.gen_munition(myconfig, i, munitions_save_dir if myconfig.munitions.save_bb_info else None)
-
-        if(myconfig.sonar.generate):
-            print("--SONAR GENERATION--")
-            if(myconfig.sonar.save_csv):
-                sonar_plugin.generate_data(myconfig, i, sonar_save_dir)
-            else:
-                sonar_plugin.generate_data(myconfig, i)
-        else:
-            sonar_plugin.finish_scene()
-
-        Update3DViewPorts()
-
-        print("--SCENE GENERATION COMPLETE--")
-
-        if(myconfig.general.dae_output):
-            dae_filepath = dae_save_dir + "/" + f'{i:05d}' + "_blender_world.dae"
-            bpy.ops.wm.collada_export(filepath=dae_filepath, apply_modifiers=True)
-            print(f"    Exported .dae file to {dae_filepath}")
-
+    #Claim iterations from a shared work queue, every worker adds missing jobs
+    work_queue = None
+    if args.queue:
+        work_queue = WorkQueue(args.queue)
+        work_queue.create({f'{i:05d}': {"iteration": i} for i in range(iterations)})
+        jobs = ((job_id, work_queue.job(job_id)["iteration"]) for job_id in work_queue.jobs())
+        print(f"Worker {work_queue.worker_id} using work queue {args.queue}: {work_queue.status()}")
+    else:
+        jobs = ((None, i) for i in range(args.start_iteration, iterations))
+
+    leak_detector = LeakDetector.LeakDetector(myconfig.general.leak_check, myconfig.general.leak_window, myconfig.general.memory_limit_mb)
+    layer_pipeline = LayerPipeline.LayerPipeline(myconfig, SCENE_LAYERS, leak_detector.stage)
+    scene_seeds = {}
+
+    #Set detail of scenes by quality level, the settings of each worker are recorded in a manifest
+    quality_manifest = None
+    if save_dir is not None:
+        quality_manifest = os.path.join(save_dir, f"quality_{work_queue.worker_id}.json" if work_queue is not None else "quality.json")
+    quality_controller = QualityController.QualityController(myconfig, quality_manifest)
+    quality_controller.save()
+    print(f"Quality level: {quality_controller.level}, settings: {quality_controller.settings()}")
+
+    def scene_stages(job_id: str, i: int):
+        return quality_controller.timed(generate_scene(job_id, i))
+
+    def finish_play(job_id: str, i: int):
+        #Hand the job of a cancelled scene back to the queue, and finish the scene stream
+        if work_queue is not None and job_id is not None:
+            print(f"Releasing job {job_id} of cancelled iteration {i}")
+            work_queue.abandon(job_id)
+        if scene_stream is not None:
+            scene_stream.close()
+
+    #Run pipeline stage by stage from a timer in the GUI, so that it can be paused and cancelled
+    if myconfig.general.continuous_play and not bpy.app.background:
+        ContinuousPlay.ContinuousPlay(jobs, scene_stages, finish_iteration, len(work_queue.job_ids()) if work_queue is not None else iterations - args.start_iteration, finish_play).start()
+    else:
+        for job_id, i in jobs:
+            for stage in scene_stages(job_id, i):
+                pass
+            finish_iteration(i)
 
+        if scene_stream is not None:
+            scene_stream.close()
@@ -0,0 +1,46 @@
+import os
+import math
+import json
+import numpy as np
+from config import load_config
+from classes.PointCloud import LABELS
+from plugins.dem_plugin import georeference
+from utils.bathymetry import BathymetryGrid, grid_csv
+
+BAND_DESCRIPTIONS = {"mean": "mean height of sonar returns (m), nan where empty",
+                     "min": "min height of sonar returns (m), nan where empty",
+                     "max": "max height of sonar returns (m), nan where empty",
+                     "count": "number of sonar returns",
+                     "label": "majority label index of sonar returns, 0 where empty"}
+
+def export_bathymetry(config: load_config.RootConfig, csv_paths: list, iter_num: int, save_dir: str):
+    """Grid the sonar returns of a scene into a multi-band bathymetry product.
+    Bands are saved as arrays in a .npz file, with georeferencing metadata in a .json file.
+    @param config: Configuration object
+    @param csv_paths: Paths of the sonar .csv files of the scene, one scan per survey pass
+    @param iter_num: Current iteration number for naming
+    @param save_dir: Directory to save bathymetry files to
+    """
+
+    resolution = config.bathymetry.resolution
+    half_size = config.landscape.size/2
+    width = height = math.ceil(config.landscape.size/resolution)
+    x_min = -half_size
+    y_max = -half_size + height*resolution
+
+    grid = BathymetryGrid(x_min, y_max, resolution, width, height, len(LABELS))
+    for csv_path in csv_paths:
+        grid_csv(grid, csv_path, config.bathymetry.chunk_points)
+    bands = grid.bands()
+
+    bathymetry_path = os.path.join(save_dir, f'{iter_num:05d}.npz')
+    np.savez_compressed(bathymetry_path, **bands)
+
+    metadata = georeference(config, x_min, y_max, width, height, resolution)
+    metadata["bands"] = BAND_DESCRIPTIONS
+    metadata["labels"] = LABELS
+    metadata["sources"] = [os.path.basename(csv_path) for csv_path in csv_paths]
+    with open(os.path.join(save_dir, f'{iter_num:05d}.json'), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"    Bathymetry saved: {bathymetry_path} ({width}x{height} at {resolution} m, {int(bands['count'].sum())} returns)")
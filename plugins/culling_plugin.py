@@ -0,0 +1,48 @@
+import bpy
+import numpy as np
+from config import load_config
+from utils.mesh_utils import mesh_polygons, keep_mesh_polygons
+
+#Categories of scene objects that are culled outside of the sonar swath
+CULLED_CATEGORIES = ("ground", "boulder", "none")
+
+def cull_outside_swath(config: load_config.RootConfig, footprints: list) -> dict:
+    """Remove faces of scene geometry outside the sonar swath footprints (plus a margin), before scanning and export.
+    A face is kept if it may overlap the footprint of any survey pass, also if it is larger than the swath.
+    @param config: Configuration object
+    @param footprints: List of SwathFootprint objects of all survey passes
+    @return: Dictionary of object name to number of faces before and after culling
+    """
+
+    stats = {}
+
+    for obj in list(bpy.data.objects):
+        if obj.type != 'MESH' or obj.get("categoryID") not in CULLED_CATEGORIES:
+            continue
+
+        vertices, loops, loop_starts, loop_totals = mesh_polygons(obj.data)
+        if len(loop_starts) == 0:
+            continue
+
+        world_vertices = vertices @ np.array(obj.matrix_world.to_3x3()).T + np.array(obj.matrix_world.translation)
+        keep = np.zeros(len(loop_starts), dtype=bool)
+        for footprint in footprints:
+            keep |= footprint.overlaps_polygons(world_vertices[:,:2], loops, loop_starts, config.culling.margin)
+
+        stats[obj.name] = {"faces": len(keep), "kept_faces": int(np.count_nonzero(keep))}
+
+        if not keep.any():
+            mesh = obj.data
+            bpy.data.objects.remove(obj)
+            bpy.data.meshes.remove(mesh)
+        elif not keep.all():
+            keep_mesh_polygons(obj.data, keep)
+
+    total_faces = sum(obj_stats["faces"] for obj_stats in stats.values())
+    kept_faces = sum(obj_stats["kept_faces"] for obj_stats in stats.values())
+    for name, obj_stats in stats.items():
+        print(f"     {name}: culled {obj_stats['faces'] - obj_stats['kept_faces']} of {obj_stats['faces']} faces")
+    if total_faces > 0:
+        print(f"     --Culled {100*(total_faces - kept_faces)/total_faces:.1f}% of faces outside sonar swath--")
+
+    return stats
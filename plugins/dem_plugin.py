@@ -0,0 +1,101 @@
+import bpy
+import os
+import math
+import json
+import pyproj
+import numpy as np
+from config import load_config
+from utils.mesh_utils import mesh_loop_triangles
+from utils.rasterize import rasterize_triangles
+
+#Categories of scene objects rasterized into the objects layer
+OBJECT_CATEGORIES = ("boulder", "munition")
+
+LAYER_DESCRIPTIONS = {"ground": "seafloor height (m)",
+                      "objects": "top height of boulders and munitions (m), nan where no object"}
+
+def world_triangles(objects: list):
+    """Get the triangles of mesh objects in world coordinates
+    @param objects: List of mesh objects
+    @return: Tuple of (N,3) vertex array and (T,3) triangle array of all objects
+    """
+
+    all_vertices = []
+    all_triangles = []
+    offset = 0
+    for obj in objects:
+        vertices, triangles = mesh_loop_triangles(obj.data)
+        all_vertices.append(vertices @ np.array(obj.matrix_world.to_3x3()).T + np.array(obj.matrix_world.translation))
+        all_triangles.append(triangles + offset)
+        offset += len(vertices)
+
+    if not all_vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+
+    return np.concatenate(all_vertices), np.concatenate(all_triangles)
+
+def georeference(config: load_config.RootConfig, x_min: float, y_max: float, width: int, height: int, resolution: float = None) -> dict:
+    """Georeferencing metadata of a north-up raster in scene coordinates, optionally placed in the projected CRS
+    of the DEM configuration
+    @param config: Configuration object
+    @param x_min: x coordinate of the left raster edge in scene coordinates
+    @param y_max: y coordinate of the top raster edge in scene coordinates
+    @param width: Number of raster columns
+    @param height: Number of raster rows
+    @param resolution: Pixel size (m), default: DEM resolution
+    """
+
+    if resolution is None:
+        resolution = config.dem.resolution
+    crs = config.dem.crs if config.dem is not None else None
+    origin = config.dem.origin if config.dem is not None else None
+    easting, northing = origin if origin is not None else (0.0, 0.0)
+
+    metadata = {"width": width,
+                "height": height,
+                "resolution": resolution,
+                #GDAL-style affine transform: x = t0 + col*t1 + row*t2, y = t3 + col*t4 + row*t5 (pixel corners)
+                "geotransform": [easting + x_min, resolution, 0.0, northing + y_max, 0.0, -resolution],
+                "nodata": "nan",
+                "units": "m",
+                "crs": crs}
+
+    if crs is not None:
+        metadata["crs_wkt"] = pyproj.CRS.from_user_input(crs).to_wkt()
+
+    return metadata
+
+def export_dem(config: load_config.RootConfig, iter_num: int, save_dir: str):
+    """Rasterize the landscape, and optionally boulders and munitions, into a digital elevation model.
+    Layers are saved as float32 arrays in a .npz file, with georeferencing metadata in a .json file.
+    @param config: Configuration object
+    @param iter_num: Current iteration number for naming
+    @param save_dir: Directory to save DEM files to
+    """
+
+    resolution = config.dem.resolution
+    half_size = config.landscape.size/2
+    width = height = math.ceil(config.landscape.size/resolution)
+    x_min = -half_size
+    y_max = -half_size + height*resolution
+
+    layers = {}
+
+    landscape_obj = bpy.data.objects.get("Landscape")
+    vertices, triangles = world_triangles([landscape_obj] if landscape_obj is not None else [])
+    layers["ground"] = rasterize_triangles(vertices, triangles, x_min, y_max, resolution, width, height)
+
+    if config.dem.objects:
+        objects = [obj for obj in bpy.data.objects if obj.type == 'MESH' and obj.get("categoryID") in OBJECT_CATEGORIES]
+        vertices, triangles = world_triangles(objects)
+        layers["objects"] = rasterize_triangles(vertices, triangles, x_min, y_max, resolution, width, height)
+
+    dem_path = os.path.join(save_dir, f'{iter_num:05d}.npz')
+    np.savez_compressed(dem_path, **layers)
+
+    metadata = georeference(config, x_min, y_max, width, height)
+    metadata["layers"] = {name: LAYER_DESCRIPTIONS[name] for name in layers}
+    with open(os.path.join(save_dir, f'{iter_num:05d}.json'), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"    DEM saved: {dem_path} ({width}x{height} at {resolution} m)")
@@ -1,9 +1,21 @@
 import bpy
 import math
 import pyproj
+import numpy as np
 from mathutils import *
 from random import seed, randint, random, uniform
 from config import load_config
+from utils.adaptive_mesh import adaptive_grid_faces, grid_cell_faces
+from utils.mesh_utils import mesh_arrays, set_mesh_geometry, compact_mesh
+from utils.geometry import interpolate_grid
+from utils.rasterize import rasterize_triangles
+from classes.LandscapeCache import LandscapeCache
+from classes.SwathFootprint import SwathFootprint
+from utils.shared_assets import shared_asset_store
+
+#Mesh size and height of ANT landscapes, before scaling to the landscape size
+ANT_MESH_SIZE = 2
+ANT_HEIGHT = 0.08 #0.2
 
 D = bpy.data
 C = bpy.context
@@ -82,6 +94,10 @@ def create_noise_particles(config: load_config.RootConfig):
     @param config: Configuration object
     """
 
+    #Marine snow is injected into the scanned point cloud instead (see marine_snow_plugin)
+    if config.marine_snow is not None and config.marine_snow.point_domain:
+        return
+
     if(config.landscape.noise_chance>randint(0,100)):
         bpy.ops.mesh.primitive_uv_sphere_add(enter_editmode=False, align='WORLD', location=(0, 0, 0), scale=(1, 1, 1))
         noise_obj = bpy.context.object
@@ -131,29 +147,83 @@ def project_trajectory_to_landscape(config: load_config.RootConfig):
 
     print("     --Projected sensor trajectory onto seafloor--")
 
-def generate_landscape_ant(config: load_config.RootConfig):
-    """Generate landscape using ANT landscape addon
+def generate_landscape_ant(config: load_config.RootConfig, survey_passes: list = None):
+    """Generate landscape using ANT landscape addon, or load it from the landscape cache
     @param config: Configuration object
+    @param survey_passes: List of (N,3) arrays of trajectory points, required for adaptive resolution
     """
 
+    # randomize landscape
+    newSeed = randint(0, 99999)
+    subdivisions, block_size = landscape_subdivisions(config)
+    z_scale = randint(20, 100) / 5.0
+
+    cache = None
+    cached_grid = None
+    if config.landscape.cache_dir is not None:
+        cache = LandscapeCache(config.landscape.cache_dir, config.landscape.cache_size_mb, shared_asset_store(config))
+        cache_key = cache.key({"seed": newSeed, "size": config.landscape.size, "mesh_size": ANT_MESH_SIZE, "subdivisions": subdivisions, "height": ANT_HEIGHT, "z_scale": z_scale})
+        cached_grid = cache.get(cache_key)
+
+    if cached_grid is not None:
+        landscapeObject = create_landscape_from_grid(*cached_grid)
+        print("     Loaded seafloor from landscape cache")
+    else:
+        landscapeObject = ant_landscape(newSeed, config.landscape.size, subdivisions, z_scale)
+
+        if cache is not None:
+            cache.put(cache_key, landscape_height_grid(landscapeObject), landscape_grid_faces(landscapeObject))
+
+    mat = bpy.data.materials.new(name="LandscapeMaterial")
+    if config.sonar.generate:
+        landscape_mat_alpha = uniform(config.landscape.alpha_min,config.landscape.alpha_max)
+    else:
+        landscape_mat_alpha = 1.0
+    mat.diffuse_color = (0.896, 0.919, 0.653, landscape_mat_alpha)
+    landscapeObject.data.materials.append(mat)
+    landscapeObject.name = "Landscape"
+    landscapeObject.data.name = "LandscapeMesh"
+
+    landscapeObject["categoryID"] = "ground"
+    landscapeObject["partID"] = "ground"
+
+    bpy.context.view_layer.objects.active = bpy.data.objects["Landscape"]
+
+    if config.landscape.adaptive:
+        if survey_passes is None:
+            raise Exception("Adaptive landscape resolution requires the survey passes")
+        adapt_landscape_resolution(config, landscapeObject, block_size, survey_passes)
+
+    print("     --Created seafloor--")
+
+def ant_landscape(new_seed: int, size: float, subdivisions: int, z_scale: float, tile: tuple = None):
+    """Generate a square landscape mesh with the ANT landscape addon, with applied transforms
+    @param new_seed: Random seed of the landscape noise
+    @param size: Side length of the landscape (m)
+    @param subdivisions: Number of vertices per side
+    @param z_scale: Vertical scale of the landscape
+    @param tile: (column, row) index of a tile of a tiled world, None for a single landscape centered at the origin.
+    Tiles are placed side by side, and their noise is offset by the same distance, so that their edges match.
+    @return: Landscape object
+    """
+
+    sizeFactor = ANT_MESH_SIZE
+
     # add landscape
     bpy.ops.mesh.landscape_add(refresh=True)
     lscp = bpy.context.object.ant_landscape
 
-    # randomize landscape
-    newSeed = randint(0, 99999)
-    lscp.random_seed = newSeed
+    lscp.random_seed = new_seed
 
     # scale landscape
-    sizeFactor = 2
     lscp.mesh_size_x = sizeFactor
     lscp.mesh_size_y = sizeFactor
 
     # set number of squares in each direction
-    lscp.subdivision_x = 128
-    lscp.subdivision_y = 128
+    lscp.subdivision_x = subdivisions
+    lscp.subdivision_y = subdivisions
 
-    lscp.height = 0.08 #0.2
+    lscp.height = ANT_HEIGHT
     lscp.edge_falloff = '0'
 
     # triangulate faces
@@ -165,37 +235,177 @@ def generate_landscape_ant(config: load_config.RootConfig):
     obj = bpy.context.object
 
     # resize landscape object
-    scale = config.landscape.size / sizeFactor
+    scale = size / sizeFactor
 
     obj.scale[0] = scale
     obj.scale[1] = scale
-    obj.scale[2] = (randint(20, 100) / 5.0)
+    obj.scale[2] = z_scale
+
+    if tile is not None:
+        #Noise coordinates are mesh coordinates/(noise_size*noise_size_x) + offset, shift them by one mesh size per tile
+        lscp.noise_offset_x = tile[0]*sizeFactor/(lscp.noise_size*lscp.noise_size_x)
+        lscp.noise_offset_y = tile[1]*sizeFactor/(lscp.noise_size*lscp.noise_size_y)
+        obj.location[0] = (tile[0] + 0.5)*size
+        obj.location[1] = (tile[1] + 0.5)*size
 
     # update landscape
     bpy.ops.mesh.ant_landscape_regenerate()
 
     landscapeObject = bpy.context.object
 
-    # convert local vertex coordinates to world coordinates
-    # https://blender.stackexchange.com/a/1313/95167
-    coords = [(landscapeObject.matrix_world @ v.co) for v in landscapeObject.data.vertices]
+    bpy.context.view_layer.objects.active = landscapeObject
 
-    mat = bpy.data.materials.new(name="LandscapeMaterial")
-    if config.sonar.generate:
-        landscape_mat_alpha = uniform(config.landscape.alpha_min,config.landscape.alpha_max)
-    else:
-        landscape_mat_alpha = 1.0
-    mat.diffuse_color = (0.896, 0.919, 0.653, landscape_mat_alpha)
-    landscapeObject.data.materials.append(mat)
-    landscapeObject.name = "Landscape"
-    landscapeObject.data.name = "LandscapeMesh"
+    #Set scale, position, and rotation of landscape
+    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
 
-    landscapeObject["categoryID"] = "ground"
-    landscapeObject["partID"] = "ground"
+    return landscapeObject
 
-    bpy.context.view_layer.objects.active = bpy.data.objects["Landscape"]
+def create_landscape_from_grid(x: np.ndarray, y: np.ndarray, z: np.ndarray, faces: np.ndarray = None):
+    """Create a triangulated landscape object from a regular height grid
+    @param x: (cols,) array of x coordinates of grid columns
+    @param y: (rows,) array of y coordinates of grid rows
+    @param z: (rows, cols) array of heights
+    @param faces: (F,3) array of triangles as row-major grid vertex indices, e.g. the triangulation of the ANT landscape
+    the grid was taken from, None to split every cell along the same diagonal
+    @return: Landscape object
+    """
 
-    #Set scale, position, and rotation of landscape
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    rows, cols = z.shape
+    grid_x, grid_y = np.meshgrid(x, y)
+    vertices = np.stack((grid_x, grid_y, z), axis=2).reshape(-1, 3)
+    if faces is None:
+        cell_rows, cell_cols = np.divmod(np.arange((rows - 1)*(cols - 1)), cols - 1)
+        faces = grid_cell_faces(cols, cell_rows, cell_cols)
+
+    mesh = bpy.data.meshes.new("LandscapeMesh")
+    set_mesh_geometry(mesh, vertices, faces)
+    landscape_obj = bpy.data.objects.new("Landscape", mesh)
+    bpy.context.scene.collection.objects.link(landscape_obj)
+    bpy.context.view_layer.objects.active = landscape_obj
+
+    return landscape_obj
+
+def landscape_subdivisions(config: load_config.RootConfig):
+    """Determine the number of landscape grid vertices per side from the target ground sample distance
+    @param config: Configuration object
+    @return: Tuple of vertices per side, and number of fine cells per coarse block of the adaptive mesh
+    """
+
+    if config.landscape.gsd is None:
+        return config.landscape.subdivisions, 1
+
+    block_size = 1
+    if config.landscape.adaptive:
+        block_size = max(1, round(config.landscape.gsd_coarse/config.landscape.gsd))
+        block_size += block_size%2 if block_size > 1 else 0
+
+    cells = math.ceil(config.landscape.size/config.landscape.gsd/block_size)*block_size
+    return cells + 1, block_size
+
+def landscape_height_grid(landscape_obj):
+    """Get the regular vertex grid of a landscape mesh
+    @param landscape_obj: Landscape object, with applied transforms
+    @return: (rows, cols, 3) array of vertex coordinates, rows along y and columns along x
+    """
+
+    vertices, _ = mesh_arrays(landscape_obj.data)
+    cols = len(np.unique(vertices[:,0].round(5)))
+    order = np.lexsort((vertices[:,0], vertices[:,1]))
+
+    return vertices[order].reshape(-1, cols, 3)
+
+def landscape_grid_faces(landscape_obj) -> np.ndarray:
+    """Get the triangles of a landscape mesh as indices into its regular vertex grid (see landscape_height_grid)
+    @param landscape_obj: Landscape object with triangulated faces
+    @return: (F,3) array of row-major grid vertex indices
+    """
+
+    vertices, faces = mesh_arrays(landscape_obj.data)
+    order = np.lexsort((vertices[:,0], vertices[:,1]))
+    grid_index = np.empty(len(order), dtype=np.int64)
+    grid_index[order] = np.arange(len(order))
+
+    return grid_index[faces]
+
+def seafloor_height_grid(landscape_obj) -> tuple:
+    """Get the landscape surface as a regular height grid at the vertex spacing of the landscape mesh.
+    Adaptive meshes are rasterized onto the grid of their finest vertex spacing.
+    @param landscape_obj: Landscape object, with applied transforms
+    @return: Tuple of (cols,) x coordinates, (rows,) y coordinates and (rows, cols) heights, NaN where not covered
+    """
+
+    vertices, faces = mesh_arrays(landscape_obj.data)
+    x = np.unique(vertices[:,0].round(5))
+    y = np.unique(vertices[:,1].round(5))
+
+    if len(x)*len(y) == len(vertices):
+        grid = landscape_height_grid(landscape_obj)
+        return grid[0,:,0], grid[:,0,1], grid[:,:,2]
+
+    resolution = np.diff(x).min()
+    cols = round((x[-1] - x[0])/resolution) + 1
+    rows = round((y[-1] - y[0])/resolution) + 1
+    z = rasterize_triangles(vertices, faces, x[0] - resolution/2, y[0] + (rows - 0.5)*resolution, resolution, cols, rows)[::-1].astype(np.float64)
+
+    #Grid points on vertices and on the left and top landscape edges are not covered by the half-open pixel test
+    z[np.round((vertices[:,1] - y[0])/resolution).astype(np.int64), np.round((vertices[:,0] - x[0])/resolution).astype(np.int64)] = vertices[:,2]
+    for edge in (z[0,:], z[-1,:], z[:,0], z[:,-1]):
+        covered = ~np.isnan(edge)
+        if covered.any():
+            edge[~covered] = np.interp(np.flatnonzero(~covered), np.flatnonzero(covered), edge[covered])
+
+    return x[0] + resolution*np.arange(cols), y[0] + resolution*np.arange(rows), z
+
+def seafloor_heights(points: np.ndarray, height_grid: tuple = None) -> np.ndarray:
+    """Height of the landscape surface below points, interpolated from its height grid.
+    Points outside the landscape get the lowest landscape height.
+    @param points: (N,2) or (N,3) array of points
+    @param height_grid: Height grid from seafloor_height_grid, None to get it from the landscape
+    @return: (N,) array of seafloor heights
+    """
+
+    if height_grid is None:
+        height_grid = seafloor_height_grid(bpy.data.objects["Landscape"])
+    x, y, z = height_grid
+
+    heights = interpolate_grid(x, y, z, points)
+    heights[np.isnan(heights)] = np.nanmin(z)
+
+    return heights
+
+def adapt_landscape_resolution(config: load_config.RootConfig, landscape_obj, block_size: int, survey_passes: list):
+    """Re-mesh landscape adaptively: full resolution inside the sonar swath footprints of the survey passes (plus a
+    margin), one fan of triangles per coarse block elsewhere. The footprints are computed like those used for
+    munition placement and culling, from the sensor height above the full resolution seafloor. The landscape is still
+    generated at full resolution, so the re-meshing reduces the faces that are scanned and exported, not the
+    generation time or peak memory.
+    @param config: Configuration object
+    @param landscape_obj: Landscape object, with applied transforms
+    @param block_size: Number of fine cells per coarse block
+    @param survey_passes: List of (N,3) arrays of trajectory points
+    """
 
-    print("     --Created seafloor--")
\ No newline at end of file
+    if block_size == 1:
+        return
+
+    grid = landscape_height_grid(landscape_obj)
+    rows, cols = grid.shape[:2]
+    if (rows - 1)%block_size or (cols - 1)%block_size:
+        print("     Landscape grid does not match adaptive block size, keeping full resolution")
+        return
+
+    #Blocks within reach of the sonar swath are meshed at full resolution
+    height_grid = (grid[0,:,0], grid[:,0,1], grid[:,:,2])
+    block_centers = grid[block_size//2:-1:block_size, block_size//2:-1:block_size, :2].reshape(-1, 2)
+    block_radius = math.sqrt(2)*abs(grid[0,block_size,0] - grid[0,0,0])/2
+    fine_blocks = np.zeros(len(block_centers), dtype=bool)
+    for points in survey_passes:
+        footprint = SwathFootprint(points, seafloor_heights(points, height_grid), config.sonar.fov)
+        fine_blocks |= footprint.contains(block_centers, config.landscape.corridor_margin + block_radius)
+    fine_blocks = fine_blocks.reshape((rows - 1)//block_size, (cols - 1)//block_size)
+
+    faces = adaptive_grid_faces(rows, cols, block_size, fine_blocks)
+    vertices, faces = compact_mesh(grid.reshape(-1, 3), faces)
+    set_mesh_geometry(landscape_obj.data, vertices, faces)
+
+    print(f"     --Adaptive seafloor: {len(faces)} faces ({np.count_nonzero(fine_blocks)}/{fine_blocks.size} blocks at full resolution)--")
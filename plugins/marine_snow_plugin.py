@@ -0,0 +1,78 @@
+import numpy as np
+from config import load_config
+from classes.PointCloud import PointCloud
+from utils.seeding import stage_rng
+
+#Cell size (m) used to estimate the scanned seafloor area
+AREA_CELL_SIZE = 0.5
+
+def swath_area(xy: np.ndarray, cell_size: float = AREA_CELL_SIZE) -> float:
+    """Estimate the seafloor area covered by a scan from occupied grid cells
+    @param xy: (N,2) array of scanned point coordinates
+    @param cell_size: Side length of grid cells (m)
+    """
+
+    if len(xy) == 0:
+        return 0.0
+
+    cells = np.floor(xy/cell_size).astype(np.int64)
+    return len(np.unique(cells, axis=0))*cell_size**2
+
+def sample_marine_snow(point_cloud: PointCloud, config: load_config.RootConfig, rng: np.random.Generator) -> dict:
+    """Sample marine snow returns in the water column above the scanned seafloor.
+    Returns are placed above randomly chosen scanned points, within the configured depth band.
+    @param point_cloud: Scanned point cloud
+    @param config: Configuration object
+    @param rng: Random generator
+    @return: Dictionary of column arrays for the marine snow points
+    """
+
+    xyz = point_cloud.xyz()
+    depth_min = config.marine_snow.depth_min
+    depth_max = config.marine_snow.depth_max
+
+    #Expected number of returns in water column volume above scanned area
+    volume = swath_area(xyz[:,:2])*(depth_max - depth_min)
+    count = rng.poisson(config.marine_snow.density*volume)
+    if count == 0 or len(xyz) == 0:
+        return {}
+
+    source = rng.integers(0, len(xyz), count)
+    offset = np.column_stack((rng.uniform(-AREA_CELL_SIZE/2, AREA_CELL_SIZE/2, (count, 2)),
+                              rng.uniform(depth_min, depth_max, count)))
+    points = xyz[source] + offset
+
+    columns = {"X": points[:,0], "Y": points[:,1], "Z": points[:,2],
+               "X_noise": points[:,0], "Y_noise": points[:,1], "Z_noise": points[:,2],
+               "categoryID": point_cloud.encode_label("none", "categoryID"),
+               "partID": point_cloud.encode_label("none", "partID")}
+
+    #Approximate range of return as range of source point minus height above seafloor
+    for name in ("distance", "distance_noise"):
+        if name in point_cloud.columns:
+            columns[name] = np.maximum(point_cloud.columns[name][source] - offset[:,2], 0.0)
+
+    return columns
+
+def inject_marine_snow(config: load_config.RootConfig, iteration_seed: int, csv_path: str, variant_idx: int = 0):
+    """Inject marine snow-like noise returns into a scanned point cloud .csv file
+    @param config: Configuration object
+    @param iteration_seed: Seed of the current iteration, for reproducible noise
+    @param csv_path: Path to the scanned sonar .csv file
+    @param variant_idx: Index of the sonar noise variant, each variant gets its own marine snow
+    """
+
+    rng = stage_rng(iteration_seed, "marine_snow", variant_idx)
+
+    if not config.landscape.noise_chance > rng.integers(0, 101):
+        return
+
+    point_cloud = PointCloud.from_csv(csv_path)
+    columns = sample_marine_snow(point_cloud, config, rng)
+    if not columns:
+        return
+
+    point_cloud.append(columns)
+    point_cloud.to_csv(csv_path)
+
+    print(f"     --Injected {len(columns['X'])} marine snow returns--")
@@ -2,10 +2,14 @@ import bpy
 import math
 import os
 import csv
-from random import seed, randint, uniform, choice
+from random import seed, randint, uniform, choice, choices
 from config import load_config
 from classes.Vector import Vector
+from classes.PointCloud import PointCloud, LABELS
+from utils.instance_labels import points_in_boxes
+from utils.mesh_utils import mesh_edges
 import re
+import numpy as np
 
 from mathutils import Vector as BlenderVector
 
@@ -15,6 +19,28 @@ C = bpy.context
 #Initialize random generator
 seed()
 
+def random_point_on_edges(mesh):
+    """Draws a point uniformly by length along the edges of a mesh, independent of the vertex spacing.
+
+    Args:
+        mesh: Mesh datablock, e.g. of the sensor trajectory projection
+
+    Returns:
+        BlenderVector: Random point on the mesh edges
+    """
+    vertices = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
+    vertices = vertices.reshape(-1, 3)
+    edges = mesh_edges(mesh)
+    if len(edges) == 0:
+        return BlenderVector(vertices[randint(0, len(vertices)-1)])
+
+    lengths = np.linalg.norm(vertices[edges[:,1]] - vertices[edges[:,0]], axis=1)
+    edge = choices(range(len(edges)), weights=lengths)[0]
+    t = uniform(0, 1)
+
+    return BlenderVector(vertices[edges[edge,0]] + t*(vertices[edges[edge,1]] - vertices[edges[edge,0]]))
+
 def project_point_to_landscape(point, landscape_obj):
     """Projects a point downwards onto the landscape using raycasting.
 
@@ -84,126 +110,293 @@ def save_munition_info(obj, config: load_config.RootConfig, iteration: int, save
             object_type = re.sub(r'_\d+$', '', obj.name)
 
             # KITTI format: <object_type> <truncation> <occlusion> <alpha> <left> <top> <right> <bottom> <height> <width> <length> <x> <y> <z> <rotation_y>
-            # Setting truncation, occlusion, alpha, left, top, right, bottom to 0
-            line = f"{object_type} 0 0 0 0 0 0 0 {dimensions.z:.8f} {dimensions.x:.8f} {dimensions.y:.8f} {location.x:.8f} {location.y:.8f} {location.z:.8f} {rotation.z:.8f}\n"
+            # Occlusion from pre-scan visibility check (0 = visible, 1 = partly occluded, 2 = occluded), setting truncation, alpha, left, top, right, bottom to 0
+            occlusion = {"visible": 0, "partial": 1, "occluded": 2}.get(obj.get("visibility"), 0)
+            line = f"{object_type} 0 {occlusion} 0 0 0 0 0 {dimensions.z:.8f} {dimensions.x:.8f} {dimensions.y:.8f} {location.x:.8f} {location.y:.8f} {location.z:.8f} {rotation.z:.8f}\n"
             f.write(line)
 
-#Main function to generate munitions
-def gen_munition(config: load_config.RootConfig, iteration: int, save_dir: str = None):
-    """Generates munitions in the scene based on the configuration.
+def munition_boxes():
+    """Get the oriented bounding boxes of all munitions in the scene
+    Returns:
+        tuple: Names, (K,3) box centers, (K,3,3) box axes (columns, world coordinates) and (K,3) half extents
+    """
+
+    names, centers, axes, half_extents = [], [], [], []
+
+    for obj in bpy.data.objects:
+        if obj.get("categoryID") != "munition":
+            continue
+
+        corners = np.array([tuple(corner) for corner in obj.bound_box])
+        matrix = np.array(obj.matrix_world)
+        scaled_axes = matrix[:3,:3]
+        scale = np.linalg.norm(scaled_axes, axis=0)
+
+        names.append(obj.name)
+        centers.append(scaled_axes @ ((corners.min(axis=0) + corners.max(axis=0))/2) + matrix[:3,3])
+        axes.append(scaled_axes/scale)
+        half_extents.append(scale*(corners.max(axis=0) - corners.min(axis=0))/2)
+
+    return names, np.array(centers).reshape(-1, 3), np.array(axes).reshape(-1, 3, 3), np.array(half_extents).reshape(-1, 3)
+
+def save_instance_labels(config: load_config.RootConfig, csv_path: str, save_dir: str):
+    """Saves per-point munition instance IDs of a scanned point cloud.
+    The IDs are saved as .npy array with one entry per .csv row, 0 = no munition, k+1 = k-th munition in the scene.
+    Points are assigned by their noise-free coordinates, and only points labeled as munition get an instance ID.
     Args:
         config: The configuration object containing settings.
-        iteration: The current iteration number for naming.
-        save_dir: The directory where the bounding box information will be saved.
+        csv_path: Path to the scanned sonar .csv file.
+        save_dir: The directory where the instance IDs will be saved.
     """
 
-    landscape_obj = bpy.data.objects.get("Landscape")
+    names, centers, axes, half_extents = munition_boxes()
+    point_cloud = PointCloud.from_csv(csv_path)
+    instance_ids = points_in_boxes(point_cloud.xyz(noisy=False), centers, axes, half_extents, config.munitions.instance_margin)
+    instance_ids[point_cloud.label_indices() != LABELS.index("munition")] = 0
+
+    npy_file = f"{save_dir}/{os.path.splitext(os.path.basename(csv_path))[0]}.npy"
+    np.save(npy_file, instance_ids)
+
+    print(f"    Instance labels saved: {npy_file} ({np.count_nonzero(instance_ids)} munition points)")
+
+#Step of quantized munition material alpha, materials are shared between instances of equal alpha
+ALPHA_STEP = 0.01
+
+def load_munition_assets(config: load_config.RootConfig, munition_names: list) -> dict:
+    """Load munition objects from the munitions library, once per munition type.
+    Args:
+        config: The configuration object containing settings.
+        munition_names: Names of the munition types to load.
+
+    Returns:
+        dict: Munition type name to library object, None if no requested type is available
+    """
 
     directory = config.get_base_path()+"/geometry_node_templates/munitions.blend"
 
     with bpy.data.libraries.load(directory) as (data_from, data_to):
-        data_to.collections.append("MunitionsCollection")
+        available = list(data_from.objects)
+        data_to.objects = [name for name in munition_names if name in available]
 
-    munitions_collection = bpy.data.collections.get("MunitionsCollection")
+    #Check if the munition names exist in library
+    missing = [name for name in munition_names if name not in available]
+    if missing:
+        print(f"Munition {missing} not found in collection")
+        print(f"Available choices are: {available}")
 
-    sensor_proj_obj = bpy.data.objects.get("SensorTrajectoryProjection")
+    assets = {obj.name: obj for obj in data_to.objects if obj is not None}
+    for obj in assets.values():
+        #Instances override materials per object, the shared mesh needs at least one material slot
+        if len(obj.data.materials) == 0:
+            obj.data.materials.append(None)
 
-    munition_name = config.munitions.munition_type
+    return assets if assets else None
 
-    #Check if the munition_name exists in collection
-    if munition_name not in munitions_collection.objects:
-        print(f"Munition {munition_name} not found in collection")
-        print(f"Available choices are: {munitions_collection.objects.keys()}")
-        return
+def get_munition_material(munition_name: str, alpha: float):
+    """Get the material of a munition type with quantized alpha, shared between instances.
+    Args:
+        munition_name: Name of the munition type.
+        alpha: Alpha of the material.
+    """
 
-    x_max = 3.0
-    y_max = 3.0
-    z_max = 0.25
+    alpha = round(alpha/ALPHA_STEP)*ALPHA_STEP
+    name = f"{munition_name}_material_{alpha:.2f}"
 
-    #Number of munitions to create
-    num_munitions = config.munitions.num_munitions
-    munition_points = []
+    mat = bpy.data.materials.get(name)
+    if mat is None:
+        mat = bpy.data.materials.new(name=name)
+        mat.diffuse_color = (0.281, 0.244, 0.263, alpha)
 
-    bpy.ops.object.select_all(action='DESELECT')
+    return mat
 
-    for i in range(num_munitions):
+def sample_munition_location(config: load_config.RootConfig, footprints: list = None):
+    """Samples a munition location on the landscape, inside the sonar swath footprints or near the sensor trajectory projection.
+    Args:
+        config: The configuration object containing settings.
+        footprints: SwathFootprint objects of all survey passes, required for swath placement.
+
+    Returns:
+        tuple: Location on the landscape, and location with random height offset for distance checks
+    """
+
+    landscape_obj = bpy.data.objects.get("Landscape")
+    sensor_proj_obj = bpy.data.objects.get("SensorTrajectoryProjection")
 
-        point_found = False
-        projected_point = None
+    x_max = 3.0
+    y_max = 3.0
+    z_max = 0.25
 
-        while not point_found:
+    swath_placement = config.munitions.placement == "swath" and footprints
+    if swath_placement:
+        footprint_areas = [footprint.area() for footprint in footprints]
+
+    projected_point = None
+    while projected_point is None:
+        if swath_placement:
+            # Sample the location inside the swath footprint of a survey pass, weighted by footprint area
+            footprint = choices(footprints, weights=footprint_areas)[0]
+            point_x, point_y = footprint.sample(config.munitions.across_track, config.munitions.swath_margin)
+            point_z = 0.0
+        else:
             # Set the location of the munition to a random point on the sensor trajectory projection
-            point = sensor_proj_obj.data.vertices[randint(0, len(sensor_proj_obj.data.vertices)-1)].co
+            point = random_point_on_edges(sensor_proj_obj.data)
 
             point_x = point.x + uniform(-x_max, x_max)
             point_y = point.y + uniform(-y_max, y_max)
             point_z = point.z + 10.0 #uniform(-z_max, z_max)
 
-            # Project the point onto the landscape
-            projected_point_test = project_point_to_landscape((point_x, point_y, point_z), landscape_obj)
+        # Project the point onto the landscape
+        projected_point = project_point_to_landscape((point_x, point_y, point_z), landscape_obj)
+
+        if projected_point is None:
+            print(f"Failed to project point onto landscape. Retrying...")
+
+    point_x, point_y, point_z = projected_point.x, projected_point.y, projected_point.z
 
-            if projected_point_test is None:
-                print(f"Failed to project point onto landscape. Skipping munition {i}")
-                continue
-            else:
-                projected_point = projected_point_test
-                point_found = True
+    return (point_x, point_y, point_z), Vector(point_x, point_y, point_z + uniform(-z_max, z_max))
 
-        point_x, point_y, point_z = projected_point.x, projected_point.y, projected_point.z
+def sample_munition_rotation(munition_name: str):
+    """Samples a random rotation of a munition.
+    Args:
+        munition_name: Name of the munition type.
 
-        point_vec = Vector(point_x, point_y, point_z + uniform(-z_max, z_max))
+    Returns:
+        tuple: Euler angles (rad)
+    """
 
-        point_too_close = False
+    x_rad = math.radians(randint(0, 360))
+    y_rad = math.radians(randint(-25,25))
+    z_rad = math.radians(randint(0, 360))
 
-        for occ_point in munition_points:
-            if point_vec.distance(occ_point) < config.munitions.min_distance:
-                print(f"Point too close to existing munition. Skipping...")
-                point_too_close = True
-                break
+    if munition_name == "mine":
+        # Mines are usually flat, so we set the rotation around the X and Y axis to a small random value
+        x_rad = math.radians(randint(-10, 10))
+        y_rad = math.radians(randint(-10, 10))
+        z_rad = math.radians(randint(0, 360))
 
-        if point_too_close:
-            continue
+    return (x_rad, y_rad, z_rad)
 
-        # Copy object from collection and assign instance number
-        obj = munitions_collection.objects.get(munition_name)
-        obj = obj.copy()
-        obj.data = obj.data.copy()
-        obj.name = f"{munition_name}_{i}"
-        bpy.context.collection.objects.link(obj)
+def too_close(config: load_config.RootConfig, point_vec, munition_points: list) -> bool:
+    """Checks whether a munition location is too close to existing munitions.
+    Args:
+        config: The configuration object containing settings.
+        point_vec: Location of the new munition.
+        munition_points: Locations of existing munitions.
+    """
 
-        mat = bpy.data.materials.new(name=f"{munition_name}_{i}_material")
-        mat.diffuse_color = (0.281, 0.244, 0.263, uniform(config.munitions.alpha_min, config.munitions.alpha_max))
-        obj.data.materials.append(mat)
-        obj.active_material = mat
+    for occ_point in munition_points:
+        if point_vec.distance(occ_point) < config.munitions.min_distance:
+            print(f"Point too close to existing munition. Skipping...")
+            return True
 
-        munition_points.append(point_vec)
+    return False
 
-        obj.location = (point_x, point_y, point_z)
+def relocate_munition(config: load_config.RootConfig, obj, footprints: list = None) -> bool:
+    """Moves a munition to a new random location and rotation, keeping the minimum distance to other munitions.
+    Args:
+        config: The configuration object containing settings.
+        obj: The munition object to move.
+        footprints: SwathFootprint objects of all survey passes, required for swath placement.
 
-        # Set random rotation for the munition
-        x_rad = math.radians(randint(0, 360))
-        y_rad = math.radians(randint(-25,25))
-        z_rad = math.radians(randint(0, 360))
+    Returns:
+        bool: Whether the munition was moved
+    """
+
+    munition_points = [Vector(*other.location) for other in bpy.data.objects if other.get("categoryID") == "munition" and other != obj]
+
+    location, point_vec = sample_munition_location(config, footprints)
+    if too_close(config, point_vec, munition_points):
+        return False
+
+    obj.location = location
+    obj.rotation_euler = sample_munition_rotation(obj.get("munition_type", ""))
+
+    return True
+
+def save_munitions_info(config: load_config.RootConfig, iteration: int, save_dir: str = None):
+    """Saves the bounding box information of all munitions in the scene
+    Args:
+        config: The configuration object containing settings.
+        iteration: The current iteration number for naming.
+        save_dir: The directory where the bounding box information will be saved.
+    """
+
+    for obj in bpy.data.objects:
+        if obj.get("categoryID") == "munition":
+            save_munition_info(obj, config, iteration, save_dir)
+
+#Main function to generate munitions
+def create_munition(asset, munition_name: str, name: str, alpha: float):
+    """Creates an instance of a library munition object sharing its mesh, with labels for sonar data generation.
+    Args:
+        asset: Library object of the munition type.
+        munition_name: Name of the munition type.
+        name: Name of the instance, ending with its instance number.
+        alpha: Alpha of the munition material.
 
-        if munition_name == "mine":
-            # Mines are usually flat, so we set the rotation around the X and Y axis to a small random value
-            x_rad = math.radians(randint(-10, 10))
-            y_rad = math.radians(randint(-10, 10))
-            z_rad = math.radians(randint(0, 360))
+    Returns:
+        Object: The munition instance, at the origin
+    """
+
+    obj = asset.copy()
+    obj.name = name
+    bpy.context.collection.objects.link(obj)
+
+    obj["munition_type"] = munition_name
+    obj["alpha"] = alpha
+    obj.color = (0.281, 0.244, 0.263, alpha)
+
+    mat = get_munition_material(munition_name, alpha)
+    for slot in obj.material_slots:
+        slot.link = 'OBJECT'
+        slot.material = mat
+
+    #Apply properties for sonar data label generation
+    obj["categoryID"] = "munition"
+    obj["partID"] = "munition"
+
+    return obj
+
+def gen_munition(config: load_config.RootConfig, footprints: list = None):
+    """Generates munitions in the scene based on the configuration.
+    Munition types are drawn from the configured weights. Instances of a type share the mesh
+    of the library object, and keep their alpha and pose as object attributes.
+    Bounding box information is saved separately with save_munitions_info, after placement is final.
+    Args:
+        config: The configuration object containing settings.
+        footprints: SwathFootprint objects of all survey passes, required for swath placement.
+    """
+
+    assets = load_munition_assets(config, list(config.munitions.munition_weights))
+    if assets is None:
+        return
 
-        obj.rotation_euler = (x_rad, y_rad, z_rad)
+    munition_names = list(assets)
+    munition_weights = [config.munitions.munition_weights[name] for name in munition_names]
 
-        #Apply properties for sonar data label generation
-        obj["categoryID"] = "munition"
-        obj["partID"] = "munition"
-        obj.select_set(True)
+    #Number of munitions to create
+    num_munitions = config.munitions.num_munitions
+    munition_points = []
+
+    bpy.ops.object.select_all(action='DESELECT')
+
+    for i in range(num_munitions):
 
-        save_munition_info(obj, config, iteration, save_dir)
+        munition_name = choices(munition_names, weights=munition_weights)[0]
 
+        location, point_vec = sample_munition_location(config, footprints)
+
+        if too_close(config, point_vec, munition_points):
+            continue
+
+        alpha = uniform(config.munitions.alpha_min, config.munitions.alpha_max)
+        obj = create_munition(assets[munition_name], munition_name, f"{munition_name}_{i}", alpha)
+
+        munition_points.append(point_vec)
+
+        obj.location = location
+        obj.rotation_euler = sample_munition_rotation(munition_name)
 
-    bpy.context.view_layer.objects.active = bpy.data.objects[f"{munition_name}_0"]
-    bpy.ops.object.join()
     bpy.context.view_layer.objects.active = None
 
     return
-
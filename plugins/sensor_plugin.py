@@ -1,10 +1,14 @@
 import bpy
 import math
+import numpy as np
 from random import seed, randint, uniform, choice
 from config import load_config
 from classes.Vector import Vector
 from classes.SensorTrajectory import SensorTrajectory
 from classes.DeviatedCurve import DeviatedCurve
+from classes.SwathFootprint import SwathFootprint
+from classes.ArcLengthTrajectory import ArcLengthTrajectory
+from plugins import environment_plugin
 
 D = bpy.data
 C = bpy.context
@@ -14,7 +18,87 @@ seed()
 
 #Main function to generate sensor trajectory
 def gen_sensor_trajectory(config: load_config.RootConfig):
-    """Generate a sensor trajectory based on configuration parameters
+    """Generate the sensor trajectories of all survey passes based on configuration parameters.
+    The first pass is created as the sensor trajectory, and all passes are projected onto the landscape.
+    @param config: Configuration object
+    @return: List of (N,3) arrays of trajectory points for each survey pass, z is the sensor height
+    """
+
+    passes = gen_survey_passes(config)
+
+    set_sensor_trajectory(passes[0])
+
+    ### Create trajectory projection onto landscape, joined for all passes
+    projection_paths = []
+    for points in passes:
+        bpy.ops.object.select_all(action='DESELECT')
+        projection_path = create_trajectory_curve(points, "SensorTrajectoryProjection")
+        projection_path.data.name = "TrajectoryProjectionCurve"
+        projection_path.location[2] = config.sensor_trajectory.height_max
+        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        bpy.ops.object.convert(target='MESH')
+        projection_paths.append(projection_path)
+
+    bpy.ops.object.select_all(action='DESELECT')
+    for projection_path in projection_paths:
+        projection_path.select_set(True)
+    bpy.context.view_layer.objects.active = projection_paths[0]
+    if len(projection_paths) > 1:
+        bpy.ops.object.join()
+    projection_paths[0].name = "SensorTrajectoryProjection"
+
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.context.view_layer.objects.active = None
+
+    return passes
+
+def gen_survey_passes(config: load_config.RootConfig) -> list:
+    """Generate the trajectory points of all survey passes of a scene
+    @param config: Configuration object
+    @return: List of (N,3) arrays of trajectory points for each survey pass, z is the sensor height
+    """
+
+    num_passes = config.sensor_trajectory.passes
+    pass_mode = config.sensor_trajectory.pass_mode
+    deviation_param = config.sensor_trajectory.trajectory_deviation_param
+
+    match pass_mode:
+
+        case "random": #Independent trajectory draws
+            trajectories = [gen_trajectory(config) for i in range(num_passes)]
+
+        case "deviated": #Deviated variants of one base trajectory
+            base_trajectory = SensorTrajectory()
+            base_trajectory.generate_trajectory(config)
+            trajectories = []
+            for i in range(num_passes):
+                if i == 0 and deviation_param == 0:
+                    trajectories.append(base_trajectory)
+                else:
+                    trajectories.append(DeviatedCurve(base_trajectory, max(deviation_param, 1)))
+
+        case "lawnmower": #Parallel survey lines covering the area
+            trajectories = gen_lawnmower_lines(config, num_passes)
+
+        case _:
+            raise Exception(f"Invalid survey pass mode: {pass_mode}")
+
+    passes = []
+    for trajectory in trajectories:
+        height = uniform(config.sensor_trajectory.height_min, config.sensor_trajectory.height_max)
+        points = np.array([(point.x, point.y, point.z + height) for point in trajectory.points])
+
+        #Curvature adaptive resampling, keeping the fewest points within the chord tolerance
+        if config.sensor_trajectory.chord_tolerance is not None and len(points) > 2:
+            points = ArcLengthTrajectory(points).resample(config.sensor_trajectory.chord_tolerance, config.sensor_trajectory.max_point_spacing).points
+            print(f"     Resampled trajectory: {len(trajectory.points)} -> {len(points)} points")
+
+        passes.append(points)
+
+    return passes
+
+def gen_trajectory(config: load_config.RootConfig):
+    """Generate a random sensor trajectory, deviated if configured
     @param config: Configuration object
     """
 
@@ -24,37 +108,116 @@ def gen_sensor_trajectory(config: load_config.RootConfig):
     if config.sensor_trajectory.trajectory_deviation_param > 0:
         sensor_trajectory = DeviatedCurve(sensor_trajectory, config.sensor_trajectory.trajectory_deviation_param)
 
-    ### Create trajectory object
+    return sensor_trajectory
+
+def gen_lawnmower_lines(config: load_config.RootConfig, num_lines: int) -> list:
+    """Generate parallel straight survey lines in alternating directions, evenly covering the trajectory area
+    @param config: Configuration object
+    @param num_lines: Number of survey lines
+    """
+
+    edge_coordinate = config.sensor_trajectory.size/2
+    along_x = randint(0,1)
+
+    if num_lines > 1:
+        offsets = np.linspace(-edge_coordinate, edge_coordinate, num_lines)
+    else:
+        offsets = [0.0]
+
+    lines = []
+    for i, offset in enumerate(offsets):
+        direction = 1 if i%2 == 0 else -1
+        line = SensorTrajectory()
+        if along_x:
+            line.points.append(Vector(-direction*edge_coordinate, offset, 0))
+            line.current_heading = 0.0 if direction > 0 else math.pi
+        else:
+            line.points.append(Vector(offset, -direction*edge_coordinate, 0))
+            line.current_heading = direction*math.pi/2
+
+        #Slightly extend edge, so the line is only terminated at the far side
+        line.straight_segment(2*edge_coordinate, edge_coordinate + 1e-6)
+        lines.append(line)
+
+    return lines
+
+def create_trajectory_curve(points: np.ndarray, name: str):
+    """Create a NURBS path object from trajectory points
+    @param points: (N,3) array of trajectory points
+    @param name: Name of the created object
+    """
+
     bpy.ops.curve.primitive_nurbs_path_add(radius=1, enter_editmode=False, align='WORLD', location=(0, 0, 0), scale=(1, 1, 1))
     traj_curve_obj = bpy.context.object
-    traj_curve_obj.name = "SensorTrajectory"
+    traj_curve_obj.name = name
     splines = traj_curve_obj.data.splines
     splines.remove(splines[0])
     splines.new("NURBS")
     spline = splines[0]
     spline.use_endpoint_u = True
-    spline.points.add(len(sensor_trajectory.points)-1)
+    spline.points.add(len(points)-1)
 
-    for i, point in enumerate(sensor_trajectory.points):
-        spline.points[i].co = (point.x, point.y, point.z, 1)
+    for i, point in enumerate(points):
+        spline.points[i].co = (point[0], point[1], point[2], 1)
 
-    traj_curve_obj.location[2] = uniform(config.sensor_trajectory.height_min,config.sensor_trajectory.height_max)
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    return traj_curve_obj
 
-    ### Create trajectory projection onto landscape
-    projection_path = traj_curve_obj.copy()
-    projection_path.data = traj_curve_obj.data.copy()
-    projection_path.name = "SensorTrajectoryProjection"
-    projection_path.data.name="TrajectoryProjectionCurve"
-    projection_path.location[2] = config.sensor_trajectory.height_max
-    bpy.context.collection.objects.link(projection_path)
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.context.view_layer.objects.active = projection_path
-    projection_path.select_set(True)
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-    bpy.ops.object.convert(target='MESH')
+def set_sensor_trajectory(points: np.ndarray):
+    """Create the sensor trajectory followed by the sonar, replacing an existing one
+    @param points: (N,3) array of trajectory points, z is the sensor height
+    """
+
+    old_curve_obj = bpy.data.objects.get("SensorTrajectory")
+    if old_curve_obj is not None:
+        old_curve = old_curve_obj.data
+        bpy.data.objects.remove(old_curve_obj)
+        bpy.data.curves.remove(old_curve)
 
+    bpy.ops.object.select_all(action='DESELECT')
+    traj_curve_obj = create_trajectory_curve(points, "SensorTrajectory")
     bpy.context.view_layer.objects.active = None
 
-    return
+    return traj_curve_obj
+
+def get_trajectory_points(name: str = "SensorTrajectory") -> np.ndarray:
+    """Get the control points of a trajectory curve in world coordinates
+    @param name: Name of the trajectory curve object
+    @return: (N,3) array of trajectory points
+    """
+
+    traj_curve_obj = bpy.data.objects[name]
+    spline = traj_curve_obj.data.splines[0]
+    coords = np.empty(len(spline.points)*4, dtype=np.float32)
+    spline.points.foreach_get("co", coords)
+    points = coords.reshape(-1, 4)[:,:3].astype(np.float64)
+
+    return points @ np.array(traj_curve_obj.matrix_world.to_3x3()).T + np.array(traj_curve_obj.matrix_world.translation)
+
+def get_evaluated_trajectory_points(name: str = "SensorTrajectory") -> np.ndarray:
+    """Get points along a trajectory curve as evaluated by Blender, i.e. the smooth NURBS path followed by the sensor,
+    in world coordinates. The curve is sampled at its preview resolution per control point span.
+    @param name: Name of the trajectory curve object
+    @return: (M,3) array of points along the path
+    """
+
+    traj_curve_obj = bpy.data.objects[name]
+    evaluated_obj = traj_curve_obj.evaluated_get(bpy.context.evaluated_depsgraph_get())
+    mesh = evaluated_obj.to_mesh()
+    try:
+        coords = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coords)
+    finally:
+        evaluated_obj.to_mesh_clear()
+    points = coords.reshape(-1, 3).astype(np.float64)
+
+    return points @ np.array(traj_curve_obj.matrix_world.to_3x3()).T + np.array(traj_curve_obj.matrix_world.translation)
+
+def swath_footprints(config: load_config.RootConfig, survey_passes: list) -> list:
+    """Get the sonar swath footprints of survey passes on the landscape
+    @param config: Configuration object
+    @param survey_passes: List of (N,3) arrays of trajectory points
+    @return: List of SwathFootprint objects
+    """
 
+    height_grid = environment_plugin.seafloor_height_grid(bpy.data.objects["Landscape"])
+    return [SwathFootprint(points, environment_plugin.seafloor_heights(points, height_grid), config.sonar.fov) for points in survey_passes]
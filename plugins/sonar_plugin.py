@@ -1,48 +1,119 @@
 import bpy
+import os
+import math
 from config import load_config
+from classes.PointCloud import PointCloud
+from plugins import sensor_plugin
+from utils.seeding import stage_rng
+from utils.sonar_noise import ScanGeometry, noise_variant
 
-def generate_data(config: load_config.RootConfig, iter_num: int, save_dir = ''):
+#Number of frames (pings) along the sensor path, if no ping spacing is configured
+PATH_FRAMES = 600
+
+def scan_name(iter_num: int, pass_idx: int = None, chunk_idx: int = None) -> str:
+    """Get the file name (without extension) of a sonar scan
+    @param iter_num: Iteration number
+    @param pass_idx: Index of the survey pass, None if the scene has a single pass
+    @param chunk_idx: Index of the trajectory piece of a tiled world, None if the pass is scanned at once
+    """
+
+    name = f'{iter_num:05d}'
+    if pass_idx is not None:
+        name += f'_p{pass_idx:02d}'
+    if chunk_idx is not None:
+        name += f'_c{chunk_idx:03d}'
+    return name
+
+def ping_count(config: load_config.RootConfig, path_length: float) -> int:
+    """Get the number of pings (frames) along the sensor path.
+    Pings are spaced by the configured along-track distance, or by vessel speed over ping rate,
+    so that the along-track density is independent of the trajectory length.
+    @param config: Configuration object
+    @param path_length: Length of the sensor path (m)
+    """
+
+    spacing = config.sonar.ping_spacing
+    if spacing is None and config.sonar.vessel_speed is not None and config.sonar.ping_rate is not None:
+        spacing = config.sonar.vessel_speed/config.sonar.ping_rate
+
+    if spacing is None:
+        return PATH_FRAMES
+
+    if spacing <= 0:
+        raise Exception(f"Invalid ping spacing: {spacing}")
+
+    return max(math.ceil(path_length/spacing) + 1, 2)
+
+def remove_sensor():
+    """Remove the sonar sensor of a previous scan from the scene"""
+
+    sensor_obj = bpy.data.objects.get("Camera")
+    if sensor_obj is not None:
+        camera = sensor_obj.data
+        bpy.data.objects.remove(sensor_obj)
+        bpy.data.cameras.remove(camera)
+
+def generate_data(config: load_config.RootConfig, iter_num: int, save_dir = '', iteration_seed: int = 0, pass_idx: int = None, chunk_idx: int = None):
+    """Scan the scene with the sonar sensor following the sensor trajectory
+    @param config: Configuration object
+    @param iter_num: Current iteration number for naming
+    @param save_dir: Directory to save .csv sonar data to
+    @param iteration_seed: Seed of the current iteration, for reproducible noise variants
+    @param pass_idx: Index of the survey pass, None if the scene has a single pass
+    @param chunk_idx: Index of the trajectory piece of a tiled world, None if the pass is scanned at once
+    @return: List of paths of saved .csv files
+    """
+
+    #Noise variants are generated from a noise-free scan in post-processing
+    noise_variants = config.sonar.noise_variants if config.sonar.save_csv else 0
 
     # Create camera as sonar sensor
+    remove_sensor()
     bpy.ops.object.camera_add()
+    sensor_obj = bpy.context.object
+    sensor_obj.name = "Camera"
+    traj_curve = bpy.data.objects["SensorTrajectory"].data
+    path_length = traj_curve.splines[0].calc_length()
+    num_pings = ping_count(config, path_length)
+    print(f"    Sonar pings: {num_pings} over {path_length:.1f} m")
 
     # Set sensor to follow path
     bpy.ops.object.constraint_add(type='FOLLOW_PATH')
     bpy.context.object.constraints["Follow Path"].use_curve_follow = True
     bpy.context.object.constraints["Follow Path"].target = bpy.data.objects["SensorTrajectory"]
     bpy.ops.constraint.followpath_path_animate(constraint="Follow Path", owner='OBJECT')
-    bpy.data.curves["NurbsPath"].use_path_clamp = True
-    bpy.data.curves["NurbsPath"].path_duration = 600
+    traj_curve.use_path_clamp = True
+    traj_curve.path_duration = num_pings
 
     # Set camera to look forward along path (90deg), sonar is emitted from underside
     bpy.context.object.rotation_euler[0] = 1.5708
 
     # Attach Blainder addon and set parameters
-    bpy.context.scene.scannerProperties.scannerObject = bpy.data.objects["Camera"]
+    bpy.context.scene.scannerProperties.scannerObject = sensor_obj
     bpy.context.scene.scannerProperties.scannerCategory = 'sonar'
     bpy.context.scene.scannerProperties.scannerType = 'sideScan'
     bpy.context.scene.scannerProperties.fovSonar = config.sonar.fov
     bpy.context.scene.scannerProperties.sonarStepDegree = config.sonar.resolution
-    bpy.context.scene.scannerProperties.frameEnd = 600
+    bpy.context.scene.scannerProperties.frameEnd = num_pings
     bpy.context.scene.scannerProperties.sonarMode3D = True
     bpy.context.scene.scannerProperties.enableAnimation = True
     
     # Set gaussian noise parameters
     bpy.context.scene.scannerProperties.noiseType = 'gaussian'
-    bpy.context.scene.scannerProperties.addNoise = True
+    bpy.context.scene.scannerProperties.addNoise = noise_variants == 0
     bpy.context.scene.scannerProperties.mu = config.sonar.noise_mean
     bpy.context.scene.scannerProperties.sigma = config.sonar.noise_std
     bpy.context.scene.scannerProperties.addConstantNoise = False
 
     # Set interference noise parameters
-    bpy.context.scene.scannerProperties.interferenceNoise = config.sonar.interference_noise
+    bpy.context.scene.scannerProperties.interferenceNoise = config.sonar.interference_noise and noise_variants == 0
     bpy.context.scene.scannerProperties.interferenceNoiseChancePerPing = config.sonar.interference_noise_chance_per_ping
     bpy.context.scene.scannerProperties.interferenceNoiseMin = config.sonar.interference_noise_min
     bpy.context.scene.scannerProperties.interferenceNoiseMax = config.sonar.interference_noise_max
     bpy.context.scene.scannerProperties.interferenceNoiseChancePerBeam = config.sonar.interference_noise_chance_per_beam
     
     # Set output file name and path    
-    bpy.data.scenes["Scene"].scannerProperties.dataFileName = f'{iter_num:05d}'
+    bpy.data.scenes["Scene"].scannerProperties.dataFileName = scan_name(iter_num, pass_idx, chunk_idx)
     bpy.data.scenes["Scene"].scannerProperties.dataFilePath = save_dir + "/"
     bpy.data.scenes["Scene"].scannerProperties.exportCSV = config.sonar.save_csv
     bpy.data.scenes["Scene"].scannerProperties.receptionThreshold = 0
@@ -50,8 +121,49 @@ def generate_data(config: load_config.RootConfig, iter_num: int, save_dir = ''):
     #Execute sonar scan
     bpy.ops.wm.execute_scan()
 
-    if config.sonar.save_csv: 
-        print(f"    Sonar data saved: {save_dir + '/' + f'{iter_num:05d}' + '.csv'}")
+    if not config.sonar.save_csv:
+        return []
+
+    csv_path = save_dir + '/' + scan_name(iter_num, pass_idx, chunk_idx) + '.csv'
+    print(f"    Sonar data saved: {csv_path}")
+
+    if noise_variants == 0:
+        return [csv_path]
+
+    return generate_noise_variants(config, csv_path, noise_variants, iteration_seed, pass_idx or 0, num_pings, chunk_idx)
+
+def generate_noise_variants(config: load_config.RootConfig, csv_path: str, noise_variants: int, iteration_seed: int, pass_idx: int = 0, num_pings: int = PATH_FRAMES, chunk_idx: int = None):
+    """Generate noisy variants of a noise-free scan
+    @param config: Configuration object
+    @param csv_path: Path to the noise-free sonar .csv file
+    @param noise_variants: Number of noise variants to generate
+    @param iteration_seed: Seed of the current iteration
+    @param pass_idx: Index of the survey pass
+    @param num_pings: Number of pings along the sensor path
+    @param chunk_idx: Index of the trajectory piece of a tiled world, None if the pass is scanned at once
+    @return: List of paths of saved .csv files
+    """
+
+    clean_scan = PointCloud.from_csv(csv_path)
+    geometry = ScanGeometry(clean_scan, sensor_plugin.get_evaluated_trajectory_points(), num_pings)
+
+    csv_paths = [csv_path] if config.sonar.keep_clean_scan else []
+    for variant_idx in range(noise_variants):
+        if chunk_idx is None:
+            rng = stage_rng(iteration_seed, "sonar_noise", pass_idx, variant_idx)
+        else:
+            rng = stage_rng(iteration_seed, "sonar_noise", pass_idx, chunk_idx, variant_idx)
+        variant = noise_variant(clean_scan, geometry, config, rng)
+        variant_path = csv_path[:-len('.csv')] + f'_v{variant_idx:02d}.csv'
+        variant.to_csv(variant_path)
+        csv_paths.append(variant_path)
+
+    if not config.sonar.keep_clean_scan:
+        os.remove(csv_path)
+
+    print(f"    Generated {noise_variants} sonar noise variants")
+
+    return csv_paths
 
 def finish_scene():
     for obj in bpy.data.objects:
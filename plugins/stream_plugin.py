@@ -0,0 +1,74 @@
+import os
+import tempfile
+import numpy as np
+from config import load_config
+from classes.PointCloud import PointCloud, LABELS
+from plugins import munitions_plugin
+from utils.instance_labels import points_in_boxes
+from utils.scene_stream import SceneStreamSender, FRAME_SCAN, FRAME_SCENE
+
+#Directory of the temporary sonar .csv files of streamed scenes, tmpfs so that scans never reach the disk
+SCAN_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def open_stream(config: load_config.RootConfig) -> SceneStreamSender:
+    """Connect to the consumer of the scene stream
+    @param config: Configuration object
+    @return: SceneStreamSender
+    """
+
+    if not (config.sonar.generate and config.sonar.save_csv):
+        raise Exception("Scene streaming requires sonar.generate and sonar.save_csv")
+
+    print(f"Connecting to scene stream consumer at {config.general.stream}")
+    return SceneStreamSender(config.general.stream, config.general.stream_max_in_flight)
+
+def scan_dir() -> str:
+    """Create a temporary directory in shared memory for the sonar .csv files of a streamed scene"""
+
+    return tempfile.mkdtemp(prefix="blendgaenger_stream_", dir=SCAN_ROOT)
+
+def stream_scans(config: load_config.RootConfig, sender: SceneStreamSender, csv_paths: list, scan_info: dict):
+    """Publish sonar scans with per-point labels and the munition boxes of the scene, and delete their .csv files.
+    Instance IDs are assigned by noise-free coordinates, and only to points labeled as munition.
+    @param config: Configuration object
+    @param sender: SceneStreamSender connected to the consumer
+    @param csv_paths: Paths of the temporary sonar .csv files
+    @param scan_info: Metadata sent with every scan, e.g. iteration, pass and piece index
+    """
+
+    names, centers, axes, half_extents = munitions_plugin.munition_boxes()
+
+    for csv_path in csv_paths:
+        point_cloud = PointCloud.from_csv(csv_path)
+        xyz = point_cloud.xyz()
+        labels = point_cloud.label_indices()
+
+        if config.munitions.generate:
+            instance_ids = points_in_boxes(point_cloud.xyz(noisy=False), centers, axes, half_extents, config.munitions.instance_margin)
+            instance_ids[labels != LABELS.index("munition")] = 0
+        else:
+            instance_ids = np.zeros(len(xyz), dtype=np.int32)
+
+        metadata = dict(scan_info)
+        metadata["scan"] = os.path.splitext(os.path.basename(csv_path))[0]
+        metadata["labels"] = LABELS
+        metadata["box_names"] = names
+
+        sender.send(FRAME_SCAN, metadata, {"points": xyz.astype(np.float32),
+                                           "labels": labels.astype(np.uint8),
+                                           "instances": instance_ids,
+                                           "box_centers": centers.astype(np.float32),
+                                           "box_axes": axes.astype(np.float32),
+                                           "box_half_extents": half_extents.astype(np.float32)})
+        os.remove(csv_path)
+
+        print(f"    Scan streamed: {metadata['scan']} ({len(xyz)} points, {len(names)} boxes)")
+
+def stream_scene(sender: SceneStreamSender, scene_info: dict):
+    """Publish the scene information after all scans of the scene
+    @param sender: SceneStreamSender connected to the consumer
+    @param scene_info: Scene information dictionary, as saved to the scene_info directory otherwise
+    """
+
+    sender.send(FRAME_SCENE, scene_info)
+    print(f"    Scene streamed: {sender.frames} frames, {sender.bytes/1024**2:.1f} MB, {sender.blocked_seconds:.1f} s waiting for consumer")
@@ -0,0 +1,207 @@
+import bpy
+import math
+import numpy as np
+from random import randint, uniform, choices
+from config import load_config
+from classes.Vector import Vector
+from classes.TileGrid import TileGrid
+from classes.SwathFootprint import SwathFootprint
+from classes.ArcLengthTrajectory import ArcLengthTrajectory
+from classes.LandscapeCache import LandscapeCache
+from plugins import environment_plugin, munitions_plugin
+from utils.shared_assets import shared_asset_store
+
+#Height above the seafloor reference from which munitions are dropped onto their tile (m)
+DROP_HEIGHT = 10.0
+
+class TiledWorld:
+    """Class to stream the seafloor of a large survey area as square tiles around the sensor trajectory.
+    All tiles are generated from one world seed with matching noise offsets, so they join without seams.
+    Only the tiles intersecting the swath corridor of the trajectory piece being scanned are materialized,
+    and tiles are evicted when the sensor has moved on, so memory and ray casting cost are bounded by the
+    corridor area instead of the survey area. Munitions are planned for the whole survey, and created with
+    the tile containing them.
+    """
+
+    def __init__(self, config: load_config.RootConfig):
+        """Initialize tiled world, drawing the world parameters from the random generator
+        @param config: Configuration object"""
+
+        self.config = config
+        self.grid = TileGrid(config.landscape.tile_size)
+        self.world_seed = randint(0, 99999)
+        self.z_scale = randint(20, 100) / 5.0
+
+        if config.landscape.gsd is not None:
+            self.subdivisions = math.ceil(config.landscape.tile_size/config.landscape.gsd) + 1
+        else:
+            self.subdivisions = config.landscape.subdivisions
+
+        #The material is created with the first tile and removed with the last one, as it would be purged as orphan
+        #between variants of a scene reusing the world
+        self.alpha = uniform(config.landscape.alpha_min, config.landscape.alpha_max) if config.sonar.generate else 1.0
+        self.material = None
+
+        self.cache = None
+        if config.landscape.cache_dir is not None:
+            self.cache = LandscapeCache(config.landscape.cache_dir, config.landscape.cache_size_mb, shared_asset_store(config))
+
+        self.tiles = {}
+        self.munitions = []
+        self.tile_munitions = {}
+        self.assets = None
+        self.max_resident = 0
+        self.created = 0
+
+    def corridor_half_width(self, points: np.ndarray) -> float:
+        """Half width of the tile corridor around a trajectory: sonar swath on the seafloor reference (z = 0) plus margin"""
+
+        swath = SwathFootprint(points, np.zeros(len(points)), self.config.sonar.fov)
+        return float(swath.half_widths.max()) + self.config.landscape.corridor_margin
+
+    def plan_munitions(self, survey_passes: list):
+        """Draw the types, locations and poses of all munitions of the survey, inside the swath of a survey pass
+        or near the sensor trajectory as configured. Munitions are created when their tile is materialized.
+        @param survey_passes: List of (N,3) arrays of trajectory points
+        """
+
+        config = self.config
+        self.munitions = []
+        self.assets = munitions_plugin.load_munition_assets(config, list(config.munitions.munition_weights))
+        if self.assets is None:
+            return
+
+        munition_names = list(self.assets)
+        munition_weights = [config.munitions.munition_weights[name] for name in munition_names]
+
+        footprints = [SwathFootprint(points, np.zeros(len(points)), config.sonar.fov) for points in survey_passes]
+        trajectories = [ArcLengthTrajectory(points) for points in survey_passes]
+        lengths = [trajectory.length for trajectory in trajectories]
+
+        munition_points = []
+        for i in range(config.munitions.num_munitions):
+
+            munition_name = choices(munition_names, weights=munition_weights)[0]
+
+            if config.munitions.placement == "swath":
+                footprint = choices(footprints, weights=[footprint.area() for footprint in footprints])[0]
+                point_x, point_y = footprint.sample(config.munitions.across_track, config.munitions.swath_margin)
+            else:
+                trajectory = choices(trajectories, weights=lengths)[0]
+                point = trajectory.position(uniform(0.0, trajectory.length))
+                point_x = point[0] + uniform(-3.0, 3.0)
+                point_y = point[1] + uniform(-3.0, 3.0)
+
+            point_vec = Vector(point_x, point_y, 0.0)
+            if munitions_plugin.too_close(config, point_vec, munition_points):
+                continue
+            munition_points.append(point_vec)
+
+            self.munitions.append({"name": f"{munition_name}_{i}",
+                                   "type": munition_name,
+                                   "alpha": uniform(config.munitions.alpha_min, config.munitions.alpha_max),
+                                   "location": (point_x, point_y),
+                                   "rotation": munitions_plugin.sample_munition_rotation(munition_name),
+                                   "tile": tuple(self.grid.tiles_of(np.array([[point_x, point_y]]))[0].tolist())})
+
+        print(f"     Planned {len(self.munitions)} munitions over {sum(lengths):.0f} m of survey lines")
+
+    def create_tile(self, tile: tuple):
+        """Materialize a tile, from the landscape cache or with the ANT landscape addon, and create its munitions"""
+
+        config = self.config
+        cache_key = None
+        grid = None
+        if self.cache is not None:
+            cache_key = self.cache.key({"seed": self.world_seed, "tile": list(tile), "tile_size": config.landscape.tile_size,
+                                        "mesh_size": environment_plugin.ANT_MESH_SIZE, "subdivisions": self.subdivisions,
+                                        "height": environment_plugin.ANT_HEIGHT, "z_scale": self.z_scale})
+            grid = self.cache.get(cache_key)
+
+        if grid is not None:
+            tile_obj = environment_plugin.create_landscape_from_grid(*grid)
+        else:
+            tile_obj = environment_plugin.ant_landscape(self.world_seed, config.landscape.tile_size, self.subdivisions, self.z_scale, tile)
+            if self.cache is not None:
+                self.cache.put(cache_key, environment_plugin.landscape_height_grid(tile_obj), environment_plugin.landscape_grid_faces(tile_obj))
+
+        tile_obj.name = f"LandscapeTile_{tile[0]}_{tile[1]}"
+        tile_obj.data.name = tile_obj.name + "Mesh"
+        if self.material is None:
+            self.material = bpy.data.materials.new(name="LandscapeMaterial")
+            self.material.diffuse_color = (0.896, 0.919, 0.653, self.alpha)
+        tile_obj.data.materials.append(self.material)
+        tile_obj["categoryID"] = "ground"
+        tile_obj["partID"] = "ground"
+        self.tiles[tile] = tile_obj.name
+        self.created += 1
+
+        names = []
+        for munition in self.munitions:
+            if munition["tile"] != tile:
+                continue
+            location = munitions_plugin.project_point_to_landscape((*munition["location"], DROP_HEIGHT), tile_obj)
+            if location is None:
+                continue
+            obj = munitions_plugin.create_munition(self.assets[munition["type"]], munition["type"], munition["name"], munition["alpha"])
+            obj.location = location
+            obj.rotation_euler = munition["rotation"]
+            names.append(obj.name)
+        self.tile_munitions[tile] = names
+
+    def remove_tile(self, tile: tuple):
+        """Remove a tile and its munitions from the scene"""
+
+        for name in self.tile_munitions.pop(tile, []):
+            obj = bpy.data.objects.get(name)
+            if obj is not None:
+                bpy.data.objects.remove(obj)
+
+        tile_obj = bpy.data.objects.get(self.tiles.pop(tile))
+        if tile_obj is not None:
+            mesh = tile_obj.data
+            bpy.data.objects.remove(tile_obj)
+            bpy.data.meshes.remove(mesh)
+
+    def update(self, points: np.ndarray) -> list:
+        """Materialize the tiles around a trajectory piece, and evict all other tiles
+        @param points: (N,3) array of trajectory points of the piece to scan
+        @return: Sorted list of resident tiles
+        """
+
+        needed = self.grid.corridor_tiles(points, self.corridor_half_width(points))
+
+        evicted = [tile for tile in self.tiles if tile not in needed]
+        for tile in evicted:
+            self.remove_tile(tile)
+
+        created = [tile for tile in sorted(needed) if tile not in self.tiles]
+        for tile in created:
+            self.create_tile(tile)
+
+        self.max_resident = max(self.max_resident, len(self.tiles))
+        bpy.context.view_layer.objects.active = None
+        print(f"     Tiles: {len(self.tiles)} resident, {len(created)} created, {len(evicted)} evicted")
+
+        return sorted(self.tiles)
+
+    def clear(self):
+        """Remove all tiles, their munitions and the landscape material from the scene"""
+
+        for tile in list(self.tiles):
+            self.remove_tile(tile)
+
+        if self.material is not None:
+            bpy.data.materials.remove(self.material)
+            self.material = None
+
+    def info(self) -> dict:
+        """Description of the world for the scene info"""
+
+        return {"world_seed": self.world_seed,
+                "z_scale": self.z_scale,
+                "tile_size": self.config.landscape.tile_size,
+                "subdivisions": self.subdivisions,
+                "tiles_created": self.created,
+                "max_resident_tiles": self.max_resident,
+                "munitions": [{"name": munition["name"], "type": munition["type"], "location": list(munition["location"])} for munition in self.munitions]}
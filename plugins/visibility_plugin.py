@@ -0,0 +1,125 @@
+import bpy
+import numpy as np
+from mathutils import Vector
+from config import load_config
+from classes.ArcLengthTrajectory import ArcLengthTrajectory
+from plugins import munitions_plugin
+from utils.geometry import project_to_polyline
+
+#Visibility classes in increasing order
+VISIBILITY_LEVELS = ("occluded", "partial", "visible")
+
+#Fraction of the distance to a probe point below which a hit on another object counts as occlusion
+OCCLUSION_TOLERANCE = 0.99
+
+def probe_points(obj) -> np.ndarray:
+    """Sparse probe points of a munition: bounding box corners slightly moved inwards, box center and top face center
+    @param obj: Munition object
+    @return: (10,3) array of probe points in world coordinates
+    """
+
+    corners = np.array([tuple(corner) for corner in obj.bound_box])
+    center = corners.mean(axis=0)
+    top_center = center.copy()
+    top_center[2] = corners[:,2].max()
+    local_points = np.vstack((center + 0.9*(corners - center), center, top_center))
+
+    matrix = np.array(obj.matrix_world)
+
+    return local_points @ matrix[:3,:3].T + matrix[:3,3]
+
+def probe_visibility(obj, points: np.ndarray, survey_passes: list, fov: float, depsgraph) -> np.ndarray:
+    """Test which probe points of a munition are seen by the sonar from any survey pass.
+    A point is covered by the ping whose across-track plane contains it, if it lies within the field of view.
+    It is seen if the ray from the sensor position of that ping reaches the munition (or the point) before any other object.
+    @param obj: Munition object
+    @param points: (P,3) array of probe points
+    @param survey_passes: List of (N,3) arrays of sensor trajectory points
+    @param fov: Downwards field of view of the sonar (deg)
+    @param depsgraph: Evaluated dependency graph of the scene
+    @return: (P,) boolean array
+    """
+
+    scene = bpy.context.scene
+    seen = np.zeros(len(points), dtype=bool)
+
+    for survey_pass in survey_passes:
+        trajectory = ArcLengthTrajectory(survey_pass)
+        _, _, along, _ = project_to_polyline(points[:,:2], survey_pass[:,:2])
+        sensors = trajectory.position(along)
+
+        offset = points - sensors
+        nadir_angle = np.degrees(np.arctan2(np.linalg.norm(offset[:,:2], axis=1), -offset[:,2]))
+        covered = (along > 0.0) & (along < trajectory.length) & (nadir_angle <= fov/2)
+
+        for p in np.flatnonzero(covered & ~seen):
+            distance = float(np.linalg.norm(offset[p]))
+            direction = Vector(offset[p]/max(distance, 1e-9))
+            hit, location, normal, index, hit_obj, matrix = scene.ray_cast(depsgraph, Vector(sensors[p]), direction, distance=distance)
+            if not hit or hit_obj.name == obj.name or (location - Vector(sensors[p])).length >= OCCLUSION_TOLERANCE*distance:
+                seen[p] = True
+
+    return seen
+
+def classify_munition(config: load_config.RootConfig, obj, survey_passes: list) -> dict:
+    """Classify the visibility of a munition to the sonar with a sparse ray probe
+    @param config: Configuration object
+    @param obj: Munition object
+    @param survey_passes: List of (N,3) arrays of sensor trajectory points
+    @return: Dictionary of visibility class and fraction of visible probe points
+    """
+
+    bpy.context.view_layer.update()
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    seen = probe_visibility(obj, probe_points(obj), survey_passes, config.sonar.fov, depsgraph)
+    fraction = float(np.mean(seen))
+
+    if fraction >= config.munitions.visibility_threshold:
+        status = "visible"
+    elif fraction > 0.0:
+        status = "partial"
+    else:
+        status = "occluded"
+
+    return {"status": status, "visible_fraction": fraction}
+
+def check_munition_visibility(config: load_config.RootConfig, survey_passes: list, footprints: list = None):
+    """Check the visibility of all munitions before scanning, and apply the configured policy to munitions below
+    the required visibility: "report" only records the visibility, "replace" moves them to new random positions,
+    "reject" rejects the scene.
+    @param config: Configuration object
+    @param survey_passes: List of (N,3) arrays of sensor trajectory points
+    @param footprints: List of SwathFootprint objects of all survey passes, for relocation inside the swath
+    @return: Tuple of dictionary of munition name to visibility, and whether the scene is rejected
+    """
+
+    policy = config.munitions.visibility_policy
+    required = VISIBILITY_LEVELS.index(config.munitions.visibility_required)
+
+    visibility = {}
+    for obj in [obj for obj in bpy.data.objects if obj.get("categoryID") == "munition"]:
+        result = classify_munition(config, obj, survey_passes)
+
+        if policy == "replace":
+            attempts = 0
+            while VISIBILITY_LEVELS.index(result["status"]) < required and attempts < config.munitions.visibility_attempts:
+                attempts += 1
+                if munitions_plugin.relocate_munition(config, obj, footprints):
+                    result = classify_munition(config, obj, survey_passes)
+            result["relocations"] = attempts
+
+            if VISIBILITY_LEVELS.index(result["status"]) < required:
+                print(f"     Removing {obj.name}: {result['status']} after {attempts} relocations")
+                bpy.data.objects.remove(obj)
+                continue
+
+        obj["visibility"] = result["status"]
+        visibility[obj.name] = result
+        print(f"     {obj.name}: {result['status']} ({100*result['visible_fraction']:.0f}% of probe points)")
+
+    rejected = policy == "reject" and any(VISIBILITY_LEVELS.index(result["status"]) < required for result in visibility.values())
+    if rejected:
+        print("     --Scene rejected, munitions are not visible to the sonar--")
+
+    return visibility, rejected
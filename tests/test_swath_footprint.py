@@ -0,0 +1,25 @@
+import numpy as np
+from classes.SwathFootprint import SwathFootprint
+
+def straight_footprint():
+    #Swath of 10 m half width along the x axis from 0 to 100 m
+    trajectory = np.array([(x, 0.0, 10.0) for x in np.linspace(0, 100, 11)])
+    return SwathFootprint(trajectory, np.zeros(len(trajectory)), 90.0)
+
+def test_face_larger_than_swath_is_kept():
+    footprint = straight_footprint()
+    #Triangle crossing the whole swath, all vertices 60 m away from the trajectory
+    vertices = np.array([(50.0, -60.0), (-100.0, 60.0), (200.0, 60.0)])
+
+    keep = footprint.overlaps_polygons(vertices, np.array([0, 1, 2]), np.array([0]))
+
+    assert keep.tolist() == [True]
+    assert not footprint.contains(vertices).any()
+
+def test_faces_outside_swath_are_culled():
+    footprint = straight_footprint()
+    vertices = np.array([(50.0, 5.0), (51.0, 5.0), (50.0, 6.0), (50.0, 30.0), (51.0, 30.0), (51.0, 31.0), (50.0, 31.0)])
+
+    keep = footprint.overlaps_polygons(vertices, np.array([0, 1, 2, 3, 4, 5, 6]), np.array([0, 3]), margin=1.0)
+
+    assert keep.tolist() == [True, False]
@@ -0,0 +1,73 @@
+import numpy as np
+
+def grid_cell_faces(cols: int, cell_rows: np.ndarray, cell_cols: np.ndarray) -> np.ndarray:
+    """Triangulate cells of a regular vertex grid
+    @param cols: Number of vertex columns of the grid
+    @param cell_rows: (K,) array of row indices of cells
+    @param cell_cols: (K,) array of column indices of cells
+    @return: (2K,3) array of triangle vertex indices
+    """
+
+    v00 = cell_rows*cols + cell_cols
+    v01 = v00 + 1
+    v10 = v00 + cols
+    v11 = v10 + 1
+
+    return np.concatenate((np.stack((v00, v01, v11), axis=1), np.stack((v00, v11, v10), axis=1)))
+
+def block_boundary(block_size: int, fine_neighbors: tuple) -> np.ndarray:
+    """Counter-clockwise boundary loop of a coarse block as (row, col) offsets.
+    Edges shared with a fine block include all fine vertices, others only their end points.
+    @param block_size: Number of fine cells along a block edge
+    @param fine_neighbors: Whether the (bottom, right, top, left) neighbor is a fine block
+    """
+
+    steps = np.arange(block_size)
+    ends = np.array([0])
+    bottom, right, top, left = [steps if fine else ends for fine in fine_neighbors]
+    b = block_size
+
+    return np.concatenate((np.stack((np.zeros_like(bottom), bottom), axis=1),
+                           np.stack((right, np.full_like(right, b)), axis=1),
+                           np.stack((np.full_like(top, b), b - top), axis=1),
+                           np.stack((b - left, np.zeros_like(left)), axis=1)))
+
+def adaptive_grid_faces(rows: int, cols: int, block_size: int, fine_blocks: np.ndarray) -> np.ndarray:
+    """Triangulate a regular vertex grid adaptively. Blocks of block_size x block_size cells are either
+    triangulated at full resolution, or as a fan around their center vertex. Coarse blocks include all
+    vertices along edges shared with fine blocks, so the mesh has no cracks or T-junctions.
+    @param rows: Number of vertex rows, (rows - 1) must be a multiple of block_size
+    @param cols: Number of vertex columns, (cols - 1) must be a multiple of block_size
+    @param block_size: Number of cells along a block edge, 1 or an even number
+    @param fine_blocks: (block rows, block cols) boolean array of blocks to triangulate at full resolution
+    @return: (F,3) array of triangle vertex indices into the grid vertices (row major)
+    """
+
+    if block_size == 1:
+        fine_blocks = np.ones_like(fine_blocks, dtype=bool)
+    elif block_size%2:
+        raise ValueError("Block size of adaptive grid must be 1 or even")
+
+    #Fine blocks, all cells triangulated
+    fine_cells = np.kron(fine_blocks, np.ones((block_size, block_size), dtype=bool))
+    cell_rows, cell_cols = np.nonzero(fine_cells)
+    faces = [grid_cell_faces(cols, cell_rows, cell_cols)]
+
+    #Coarse blocks, grouped by which of their neighbors are fine
+    padded = np.pad(fine_blocks, 1, constant_values=False)
+    neighbors = (padded[:-2,1:-1], padded[1:-1,2:], padded[2:,1:-1], padded[1:-1,:-2])
+    codes = sum(neighbor.astype(np.int64) << bit for bit, neighbor in enumerate(neighbors))
+
+    half = block_size//2
+    for code in np.unique(codes[~fine_blocks]):
+        block_rows, block_cols = np.nonzero(~fine_blocks & (codes == code))
+        boundary = block_boundary(block_size, tuple(bool(code >> bit & 1) for bit in range(4)))
+
+        base_rows = block_rows[:,None]*block_size
+        base_cols = block_cols[:,None]*block_size
+        loop = (base_rows + boundary[None,:,0])*cols + base_cols + boundary[None,:,1]
+        center = np.repeat((base_rows + half)*cols + base_cols + half, loop.shape[1], axis=1)
+
+        faces.append(np.stack((center, loop, np.roll(loop, -1, axis=1)), axis=2).reshape(-1, 3))
+
+    return np.concatenate(faces)
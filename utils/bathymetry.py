@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from classes.PointCloud import PointCloud, LABELS
+
+#Number of points read and binned at once, bounds memory use
+CHUNK_POINTS = 1 << 20
+
+class BathymetryGrid:
+    """Class to bin scanned points into a regular north-up grid, one chunk of points at a time.
+    Per cell, the sum, minimum and maximum height, the point count and the count of each label are accumulated,
+    so the memory use depends on the grid size only, not on the number of points.
+    """
+
+    def __init__(self, x_min: float, y_max: float, resolution: float, width: int, height: int, num_labels: int = len(LABELS)):
+        """Initialize empty grid
+        @param x_min: x coordinate of the left grid edge
+        @param y_max: y coordinate of the top grid edge
+        @param resolution: Cell size (m)
+        @param width: Number of grid columns
+        @param height: Number of grid rows
+        @param num_labels: Number of label indices"""
+
+        self.x_min = x_min
+        self.y_max = y_max
+        self.resolution = resolution
+        self.width = width
+        self.height = height
+        self.num_labels = num_labels
+
+        cells = width*height
+        self.sum = np.zeros(cells, dtype=np.float64)
+        self.min = np.full(cells, np.inf, dtype=np.float64)
+        self.max = np.full(cells, -np.inf, dtype=np.float64)
+        self.count = np.zeros(cells, dtype=np.int64)
+        self.label_count = np.zeros(cells*num_labels, dtype=np.int64)
+
+    def add(self, xyz: np.ndarray, labels: np.ndarray):
+        """Add points to the grid, points outside the grid are ignored
+        @param xyz: (N,3) array of point coordinates
+        @param labels: (N,) array of label indices
+        """
+
+        cols = np.floor((xyz[:,0] - self.x_min)/self.resolution).astype(np.int64)
+        rows = np.floor((self.y_max - xyz[:,1])/self.resolution).astype(np.int64)
+        inside = (cols >= 0) & (cols < self.width) & (rows >= 0) & (rows < self.height) & np.isfinite(xyz[:,2])
+        if not np.any(inside):
+            return
+
+        cell = rows[inside]*self.width + cols[inside]
+        z = xyz[inside,2]
+        labels = np.clip(labels[inside], 0, self.num_labels - 1)
+        cells = self.width*self.height
+
+        self.sum += np.bincount(cell, weights=z, minlength=cells)
+        self.count += np.bincount(cell, minlength=cells)
+        self.label_count += np.bincount(cell*self.num_labels + labels, minlength=cells*self.num_labels)
+
+        #Minimum and maximum per occupied cell of the chunk
+        order = np.argsort(cell, kind='stable')
+        cell = cell[order]
+        z = z[order]
+        starts = np.flatnonzero(np.concatenate(([True], cell[1:] != cell[:-1])))
+        occupied = cell[starts]
+        self.min[occupied] = np.minimum(self.min[occupied], np.minimum.reduceat(z, starts))
+        self.max[occupied] = np.maximum(self.max[occupied], np.maximum.reduceat(z, starts))
+
+    def bands(self) -> dict:
+        """Get the grid bands
+        @return: Dictionary of band name to (height, width) array: mean, min and max height (float32, NaN where empty),
+        point count (uint32) and majority label index (uint8, 0 where empty)
+        """
+
+        shape = (self.height, self.width)
+        occupied = self.count > 0
+
+        mean = np.full(len(self.count), np.nan, dtype=np.float32)
+        mean[occupied] = self.sum[occupied]/self.count[occupied]
+        low = np.where(occupied, self.min, np.nan).astype(np.float32)
+        high = np.where(occupied, self.max, np.nan).astype(np.float32)
+
+        #Ties are resolved towards the lower label index
+        majority = self.label_count.reshape(-1, self.num_labels).argmax(axis=1).astype(np.uint8)
+        majority[~occupied] = 0
+
+        return {"mean": mean.reshape(shape),
+                "min": low.reshape(shape),
+                "max": high.reshape(shape),
+                "count": self.count.astype(np.uint32).reshape(shape),
+                "label": majority.reshape(shape)}
+
+def grid_csv(grid: BathymetryGrid, csv_path: str, chunk_points: int = CHUNK_POINTS):
+    """Add the points of a BlAInder .csv file to a grid, reading the file in chunks
+    @param grid: BathymetryGrid to add points to
+    @param csv_path: Path of the sonar .csv file
+    @param chunk_points: Number of points per chunk
+    """
+
+    with open(csv_path, "r") as f:
+        header = f.readline().strip()
+    delimiter = ';' if ';' in header else ','
+    names = header.split(delimiter)
+
+    coordinates = ["X_noise", "Y_noise", "Z_noise"] if "X_noise" in names else ["X", "Y", "Z"]
+    columns = coordinates + (["categoryID"] if "categoryID" in names else [])
+
+    for chunk in pd.read_csv(csv_path, sep=delimiter, usecols=columns, chunksize=chunk_points):
+        points = PointCloud({name: chunk[name].to_numpy() for name in columns}, delimiter)
+        labels = points.label_indices() if "categoryID" in columns else np.zeros(len(points), dtype=np.int64)
+        grid.add(points.xyz(), labels)
@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+import numpy as np
+import pandas as pd
+from classes.PointCloud import LABELS
+
+#Rows read at once from sonar .csv files
+CHUNK_ROWS = 1_000_000
+
+def iteration_files(dataset_dir: str) -> dict:
+    """Group the files of a generate.py output directory by iteration
+    @param dataset_dir: Output directory of a generate.py run
+    @return: Dictionary of iteration number to dictionary of output type to list of file paths
+    """
+
+    patterns = {"sonar": r"^(\d{5})(_p\d{2})?(_c\d{3})?(_v\d{2})?\.csv$",
+                "munitions_bb_info": r"^(\d{5})\.txt$",
+                "dae": r"^(\d{5})_blender_world\.dae$",
+                "scene_info": r"^(\d{5})\.json$",
+                "dem": r"^(\d{5})\.npz$",
+                "bathymetry": r"^(\d{5})\.npz$",
+                "instances": r"^(\d{5})(_p\d{2})?(_c\d{3})?(_v\d{2})?\.npy$"}
+
+    files = defaultdict(lambda: defaultdict(list))
+    for output_type, pattern in patterns.items():
+        output_dir = os.path.join(dataset_dir, output_type)
+        if not os.path.isdir(output_dir):
+            continue
+        with os.scandir(output_dir) as entries:
+            for entry in entries:
+                match = re.match(pattern, entry.name)
+                if match:
+                    files[int(match.group(1))][output_type].append(entry.path)
+
+    return {iteration: dict(output_files) for iteration, output_files in sorted(files.items())}
+
+def expected_iterations(dataset_dir: str, files: dict) -> tuple:
+    """Iterations a generate.py run should have produced: from the configuration file copied into the output
+    directory, else from the jobs of the work queue the directory belongs to, else up to the last iteration found
+    @param dataset_dir: Output directory of a generate.py run
+    @param files: Dictionary of iteration number to output files, from iteration_files
+    @return: Tuple of sorted list of iteration numbers and description of their source
+    """
+
+    for name in sorted(os.listdir(dataset_dir)):
+        if not name.endswith((".yaml", ".yml")):
+            continue
+        try:
+            with open(os.path.join(dataset_dir, name), "r") as f:
+                iterations = yaml.safe_load(f)["general"]["iterations"]
+            return list(range(int(iterations))), name
+        except (OSError, yaml.YAMLError, KeyError, TypeError, ValueError):
+            continue
+
+    jobs_dir = os.path.join(os.path.dirname(os.path.abspath(dataset_dir)), "jobs")
+    if os.path.isdir(jobs_dir):
+        iterations = []
+        for name in os.listdir(jobs_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(jobs_dir, name), "r") as f:
+                    iterations.append(int(json.load(f)["iteration"]))
+        return sorted(iterations), "work queue jobs"
+
+    return list(range(max(files) + 1 if files else 0)), "found iterations"
+
+def inspect_sonar_file(path: str) -> dict:
+    """Stream a sonar .csv file and collect point count, label histogram and invalid coordinates
+    @param path: Path to sonar .csv file
+    """
+
+    with open(path, "r") as f:
+        header = f.readline()
+    delimiter = ';' if ';' in header else ','
+
+    points = 0
+    invalid_points = 0
+    labels = Counter()
+    for chunk in pd.read_csv(path, sep=delimiter, usecols=["categoryID", "X", "Y", "Z"], chunksize=CHUNK_ROWS):
+        points += len(chunk)
+        invalid_points += int(np.count_nonzero(~np.isfinite(chunk[["X", "Y", "Z"]].to_numpy(dtype=np.float64)).any(axis=1)))
+        values, counts = np.unique(chunk["categoryID"].to_numpy(), return_counts=True)
+        for value, count in zip(values, counts):
+            labels[LABELS[int(value)] if isinstance(value, (int, np.integer)) and 0 <= value < len(LABELS) else str(value)] += int(count)
+
+    return {"points": points, "invalid_points": invalid_points, "labels": dict(labels)}
+
+def inspect_iteration(iteration: int, output_files: dict, expected_outputs: list) -> dict:
+    """Inspect all files of one iteration
+    @param iteration: Iteration number
+    @param output_files: Dictionary of output type to list of file paths
+    @param expected_outputs: Output types every iteration should have
+    """
+
+    result = {"iteration": iteration, "points": 0, "labels": Counter(), "boxes": Counter(), "errors": [], "rejected": False}
+
+    #Scenes rejected before scanning only have scene information
+    for path in output_files.get("scene_info", []):
+        try:
+            with open(path, "r") as f:
+                result["rejected"] = "rejected" in json.load(f)
+        except (OSError, ValueError) as exc:
+            result["errors"].append(f"unreadable {os.path.basename(path)}: {exc}")
+
+    for output_type in expected_outputs:
+        if output_type not in output_files and not result["rejected"]:
+            result["errors"].append(f"missing {output_type}")
+
+    scan_points = {}
+    for path in sorted(output_files.get("sonar", [])):
+        try:
+            sonar_stats = inspect_sonar_file(path)
+        except (ValueError, KeyError, pd.errors.ParserError) as exc:
+            result["errors"].append(f"unreadable {os.path.basename(path)}: {exc}")
+            continue
+        scan_points[os.path.splitext(os.path.basename(path))[0]] = sonar_stats["points"]
+        result["points"] += sonar_stats["points"]
+        result["labels"].update(sonar_stats["labels"])
+        if sonar_stats["points"] == 0:
+            result["errors"].append(f"empty scan {os.path.basename(path)}")
+        if sonar_stats["invalid_points"] > 0:
+            result["errors"].append(f"{sonar_stats['invalid_points']} non-finite points in {os.path.basename(path)}")
+
+    for path in output_files.get("munitions_bb_info", []):
+        with open(path, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 15:
+                    result["errors"].append(f"malformed box in {os.path.basename(path)}")
+                    continue
+                result["boxes"][fields[0]] += 1
+
+    for path in output_files.get("instances", []):
+        name = os.path.splitext(os.path.basename(path))[0]
+        instance_count = len(np.load(path, mmap_mode='r'))
+        if name in scan_points and instance_count != scan_points[name]:
+            result["errors"].append(f"instance labels of {name} do not match point count")
+
+    for path in output_files.get("dae", []):
+        if os.path.getsize(path) == 0:
+            result["errors"].append(f"empty {os.path.basename(path)}")
+
+    result["empty"] = result["points"] == 0 and "sonar" in expected_outputs and not result["rejected"]
+    result["labels"] = dict(result["labels"])
+    result["boxes"] = dict(result["boxes"])
+
+    return result
+
+def inspect_dataset(dataset_dir: str, workers: int = None) -> dict:
+    """Inspect a generate.py output directory with a process pool
+    @param dataset_dir: Output directory of a generate.py run
+    @param workers: Number of worker processes, None = number of CPUs
+    @return: Summary dictionary
+    """
+
+    files = iteration_files(dataset_dir)
+    expected, expected_source = expected_iterations(dataset_dir, files)
+
+    #Outputs other than munition boxes are written for every iteration, boxes only if munitions were placed
+    expected_outputs = sorted({output_type for output_files in files.values() for output_type in output_files} - {"munitions_bb_info"})
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(inspect_iteration, files.keys(), files.values(), [expected_outputs]*len(files), chunksize=8))
+
+    labels = Counter()
+    boxes = Counter()
+    for result in results:
+        labels.update(result["labels"])
+        boxes.update(result["boxes"])
+
+    point_counts = [result["points"] for result in results]
+
+    return {"dataset_dir": os.path.abspath(dataset_dir),
+            "iterations": len(results),
+            "expected_iterations": len(expected),
+            "expected_iterations_source": expected_source,
+            "missing_iterations": [iteration for iteration in expected if iteration not in files],
+            "outputs": expected_outputs,
+            "points": int(sum(point_counts)),
+            "points_per_iteration": {"min": int(min(point_counts, default=0)), "mean": float(np.mean(point_counts)) if point_counts else 0.0, "max": int(max(point_counts, default=0))},
+            "labels": dict(labels),
+            "boxes": dict(boxes),
+            "empty_iterations": [result["iteration"] for result in results if result["empty"]],
+            "rejected_iterations": [result["iteration"] for result in results if result["rejected"]],
+            "invalid_iterations": {result["iteration"]: result["errors"] for result in results if result["errors"]}}
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Collect statistics and check integrity of a generated dataset')
+    parser.add_argument("dataset_dir", type=str, help='Output directory of a generate.py run')
+    parser.add_argument("-j","--workers", type=int, default=None, help='Number of worker processes')
+    parser.add_argument("-o","--output", type=str, default=None, help='Path of summary .json file (default: <dataset_dir>/summary.json)')
+    args = parser.parse_args()
+
+    summary = inspect_dataset(args.dataset_dir, args.workers)
+
+    summary_file = args.output if args.output else os.path.join(args.dataset_dir, "summary.json")
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    invalid_file = os.path.join(os.path.dirname(os.path.abspath(summary_file)), "invalid_iterations.txt")
+    with open(invalid_file, "w") as f:
+        for iteration in summary["missing_iterations"]:
+            f.write(f"{iteration:05d} missing all outputs\n")
+        for iteration, errors in summary["invalid_iterations"].items():
+            f.write(f"{iteration:05d} {'; '.join(errors)}\n")
+
+    print(f"Iterations: {summary['iterations']} of {summary['expected_iterations']} ({summary['expected_iterations_source']}), missing: {len(summary['missing_iterations'])}, points: {summary['points']}")
+    print(f"Labels: {summary['labels']}")
+    print(f"Boxes: {summary['boxes']}")
+    print(f"Empty iterations: {len(summary['empty_iterations'])}, rejected iterations: {len(summary['rejected_iterations'])}, invalid iterations: {len(summary['invalid_iterations'])}")
+    print(f"Summary saved: {summary_file}")
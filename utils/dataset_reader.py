@@ -0,0 +1,371 @@
+import os
+import re
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from classes.PointCloud import PointCloud
+from utils.dataset_inspector import iteration_files
+from utils.geometry import project_to_polyline
+from utils.seeding import stage_rng
+
+#Samples loaded ahead of the consumer per worker thread
+PREFETCH_PER_WORKER = 2
+
+#Number of KITTI box fields kept per box: x, y, z, height, width, length, rotation
+BOX_FIELDS = 7
+
+def sample_files(dataset_dir: str) -> list:
+    """List the samples of a generate.py output directory, one sample per sonar scan
+    @param dataset_dir: Output directory of a generate.py run
+    @return: List of sample dictionaries with name, iteration, pass and chunk index and the paths of the sonar,
+             instance label, munition box and scene info files (None if not present)
+    """
+
+    samples = []
+    for iteration, output_files in iteration_files(dataset_dir).items():
+        instances = {os.path.splitext(os.path.basename(path))[0]: path for path in output_files.get("instances", [])}
+        boxes = output_files.get("munitions_bb_info", [None])[0]
+        scene_info = output_files.get("scene_info", [None])[0]
+
+        for csv_path in sorted(output_files.get("sonar", [])):
+            name = os.path.splitext(os.path.basename(csv_path))[0]
+            pass_match = re.search(r"_p(\d{2})", name)
+            chunk_match = re.search(r"_c(\d{3})", name)
+            samples.append({"name": name,
+                            "iteration": iteration,
+                            "pass": int(pass_match.group(1)) if pass_match else 0,
+                            "chunk": int(chunk_match.group(1)) if chunk_match else None,
+                            "sonar": csv_path,
+                            "instances": instances.get(name),
+                            "boxes": boxes,
+                            "scene_info": scene_info})
+
+    return samples
+
+def read_kitti_boxes(path: str) -> tuple:
+    """Read the munition boxes of a KITTI format .txt file
+    @param path: Path of the .txt file, None for no boxes
+    @return: Tuple of list of object types and (K,7) float32 array of x, y, z, height, width, length and rotation
+    """
+
+    types = []
+    boxes = []
+    if path is not None:
+        with open(path, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 15:
+                    continue
+                types.append(fields[0])
+                boxes.append([float(field) for field in fields[11:14] + fields[8:11] + fields[14:15]])
+
+    return types, np.array(boxes, dtype=np.float32).reshape(-1, BOX_FIELDS)
+
+def read_sonar_points(csv_path: str, noisy: bool = True) -> tuple:
+    """Read point coordinates and labels of a sonar .csv file, skipping all other columns
+    @param csv_path: Path of the sonar .csv file
+    @param noisy: Use noisy coordinates if present, else noise-free coordinates
+    @return: Tuple of (N,3) float32 array of points and (N,) int64 array of label indices
+    """
+
+    with open(csv_path, "r") as f:
+        header = f.readline().strip()
+    delimiter = ';' if ';' in header else ','
+    names = header.split(delimiter)
+
+    coordinates = ["X_noise", "Y_noise", "Z_noise"] if noisy and "X_noise" in names else ["X", "Y", "Z"]
+    columns = coordinates + (["categoryID"] if "categoryID" in names else [])
+
+    frame = pd.read_csv(csv_path, sep=delimiter, usecols=columns)
+    points = frame[coordinates].to_numpy(dtype=np.float32)
+    if "categoryID" in columns:
+        labels = PointCloud({"categoryID": frame["categoryID"].to_numpy()}, delimiter).label_indices()
+    else:
+        labels = np.zeros(len(points), dtype=np.int64)
+
+    return points, labels
+
+def pass_trajectory(scene_info_path: str, pass_idx: int):
+    """Get the 2D trajectory of a survey pass from a scene info file
+    @return: (M,2) array of trajectory points, None if not recorded
+    """
+
+    if scene_info_path is None:
+        return None
+    with open(scene_info_path, "r") as f:
+        passes = json.load(f).get("passes", [])
+    if pass_idx >= len(passes) or len(passes[pass_idx].get("trajectory", [])) < 2:
+        return None
+    return np.array(passes[pass_idx]["trajectory"], dtype=np.float64)
+
+def crop_along_trajectory(sample: dict, trajectory: np.ndarray, crop_length: float, rng: np.random.Generator) -> dict:
+    """Crop a sample to a random window along the sensor trajectory.
+    Points are projected onto the trajectory and kept if their along-track position lies in the window,
+    boxes are kept if their center does. Samples shorter than the window are kept whole.
+    @param sample: Loaded sample dictionary
+    @param trajectory: (M,2) array of trajectory points, None to use the principal axis of the points
+    @param crop_length: Along-track length of the window (m)
+    @param rng: Random generator for the window position
+    @return: Cropped sample dictionary
+    """
+
+    points = sample["points"]
+    if len(points) == 0:
+        return sample
+
+    #Without a recorded trajectory, points are cropped along their principal horizontal axis
+    if trajectory is None:
+        center = points[:,:2].mean(axis=0)
+        _, _, vt = np.linalg.svd(points[::max(len(points)//4096, 1),:2] - center, full_matrices=False)
+        extent = np.abs((points[:,:2] - center) @ vt[0]).max()
+        trajectory = np.vstack((center - extent*vt[0], center + extent*vt[0]))
+
+    _, _, along, _ = project_to_polyline(points[:,:2], trajectory)
+    along_min = along.min()
+    along_max = along.max()
+    if along_max - along_min <= crop_length:
+        return sample
+
+    start = rng.uniform(along_min, along_max - crop_length)
+    keep = (along >= start) & (along < start + crop_length)
+
+    cropped = dict(sample)
+    for name in ("points", "labels", "instances"):
+        if sample.get(name) is not None:
+            cropped[name] = sample[name][keep]
+
+    if len(sample["boxes"]) > 0:
+        _, _, box_along, _ = project_to_polyline(sample["boxes"][:,:2], trajectory)
+        keep_boxes = (box_along >= start) & (box_along < start + crop_length)
+        cropped["boxes"] = sample["boxes"][keep_boxes]
+        cropped["box_types"] = [box_type for box_type, kept in zip(sample["box_types"], keep_boxes) if kept]
+
+    cropped["crop"] = (float(start), float(start + crop_length))
+    return cropped
+
+def load_sample(files: dict, noisy: bool = True, crop_length: float = None, rng: np.random.Generator = None) -> dict:
+    """Load one sample of a generated dataset
+    @param files: Sample dictionary from sample_files
+    @param noisy: Use noisy coordinates if present
+    @param crop_length: Along-track length of a random crop (m), None = no crop
+    @param rng: Random generator for the crop position
+    @return: Dictionary with name, (N,3) float32 points, (N,) int64 labels, (N,) int32 instance IDs (None if not saved),
+             (K,7) float32 boxes and list of box types
+    """
+
+    points, labels = read_sonar_points(files["sonar"], noisy)
+    instances = np.load(files["instances"]) if files["instances"] is not None else None
+    if instances is not None and len(instances) != len(points):
+        raise Exception(f"Instance labels of {files['name']} do not match point count")
+    box_types, boxes = read_kitti_boxes(files["boxes"])
+
+    sample = {"name": files["name"],
+              "iteration": files["iteration"],
+              "points": points,
+              "labels": labels,
+              "instances": instances,
+              "boxes": boxes,
+              "box_types": box_types}
+
+    if crop_length is not None:
+        sample = crop_along_trajectory(sample, pass_trajectory(files["scene_info"], files["pass"]), crop_length, rng)
+
+    return sample
+
+def collate(samples: list, num_points: int = None, num_boxes: int = None) -> dict:
+    """Stack samples into padded batch arrays
+    @param samples: List of loaded sample dictionaries
+    @param num_points: Padded number of points per sample, None = largest sample
+    @param num_boxes: Padded number of boxes per sample, None = largest sample
+    @return: Dictionary of names, (B,P,3) points (0 padded), (B,P) labels and instance IDs (-1 padded), (B,P) point mask,
+             (B,) point counts, (B,K,7) boxes (0 padded), (B,K) box mask and lists of box types
+    """
+
+    counts = np.array([len(sample["points"]) for sample in samples], dtype=np.int64)
+    box_counts = np.array([len(sample["boxes"]) for sample in samples], dtype=np.int64)
+    num_points = int(counts.max(initial=0)) if num_points is None else num_points
+    num_boxes = int(box_counts.max(initial=0)) if num_boxes is None else num_boxes
+
+    batch = {"names": [sample["name"] for sample in samples],
+             "points": np.zeros((len(samples), num_points, 3), dtype=np.float32),
+             "labels": np.full((len(samples), num_points), -1, dtype=np.int64),
+             "instances": np.full((len(samples), num_points), -1, dtype=np.int32),
+             "mask": np.arange(num_points)[None,:] < counts[:,None],
+             "num_points": counts,
+             "boxes": np.zeros((len(samples), num_boxes, BOX_FIELDS), dtype=np.float32),
+             "box_mask": np.arange(num_boxes)[None,:] < box_counts[:,None],
+             "box_types": [sample["box_types"] for sample in samples]}
+
+    for b, sample in enumerate(samples):
+        count = min(counts[b], num_points)
+        batch["points"][b,:count] = sample["points"][:count]
+        batch["labels"][b,:count] = sample["labels"][:count]
+        if sample["instances"] is not None:
+            batch["instances"][b,:count] = sample["instances"][:count]
+        batch["boxes"][b,:box_counts[b]] = sample["boxes"]
+
+    return batch
+
+class DatasetReader:
+    """Class to read a generated dataset as batches for training, with samples loaded by a thread pool ahead of
+    the consumer. Reading the .csv files is dominated by file I/O and the pandas C parser, which release the GIL,
+    so threads load samples in parallel without copying them between processes. Samples are returned in a
+    reproducible order, independent of which thread finished first.
+    Batches are padded to the largest sample, rounded up to pad_multiple, or, with bucket_boundaries, samples
+    are grouped by point count and padded to the boundary of their bucket, which bounds padding and the number of
+    distinct batch shapes. Samples larger than the last boundary are truncated to it.
+    """
+
+    def __init__(self, dataset_dir: str, batch_size: int = 8, workers: int = 4, shuffle: bool = False, seed: int = 0,
+                 crop_length: float = None, bucket_boundaries: list = None, pad_multiple: int = 1, drop_last: bool = False,
+                 noisy: bool = True):
+        """Initialize dataset reader
+        @param dataset_dir: Output directory of a generate.py run
+        @param batch_size: Number of samples per batch
+        @param workers: Number of loading threads, 0 = load in the consumer thread
+        @param shuffle: Shuffle samples every epoch
+        @param seed: Seed of shuffling and crops, epoch and sample index are mixed in
+        @param crop_length: Along-track length of random crops (m), None = whole scans
+        @param bucket_boundaries: Ascending point counts of buckets, None = no bucketing
+        @param pad_multiple: Round the padded number of points up to a multiple of this, without bucketing
+        @param drop_last: Drop incomplete batches at the end of an epoch
+        @param noisy: Use noisy coordinates if present"""
+
+        self.files = sample_files(dataset_dir)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.shuffle = shuffle
+        self.seed = seed
+        self.crop_length = crop_length
+        self.bucket_boundaries = sorted(bucket_boundaries) if bucket_boundaries else None
+        self.pad_multiple = pad_multiple
+        self.drop_last = drop_last
+        self.noisy = noisy
+        self.epoch = 0
+
+    def __len__(self):
+        return len(self.files)
+
+    def order(self, epoch: int) -> list:
+        """Sample indices in the order of an epoch"""
+
+        if not self.shuffle:
+            return list(range(len(self.files)))
+        return stage_rng(self.seed, "dataset_order", epoch).permutation(len(self.files)).tolist()
+
+    def _load(self, epoch: int, index: int) -> dict:
+        rng = stage_rng(self.seed, "dataset_crop", epoch, index) if self.crop_length is not None else None
+        return load_sample(self.files[index], self.noisy, self.crop_length, rng)
+
+    def samples(self, epoch: int = None):
+        """Iterate over the loaded samples of one epoch, keeping up to PREFETCH_PER_WORKER samples per thread in flight
+        @param epoch: Epoch number for shuffling and crops, None = next epoch
+        """
+
+        if epoch is None:
+            epoch = self.epoch
+            self.epoch += 1
+        order = self.order(epoch)
+
+        if self.workers == 0:
+            for index in order:
+                yield self._load(epoch, index)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dataset_reader") as executor:
+            pending = deque()
+            try:
+                for index in order:
+                    pending.append(executor.submit(self._load, epoch, index))
+                    if len(pending) >= self.workers*PREFETCH_PER_WORKER:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                #Consumer stopped early, do not load the remaining samples
+                for future in pending:
+                    future.cancel()
+
+    def _padded_size(self, count: int) -> int:
+        return -(-max(count, 1)//self.pad_multiple)*self.pad_multiple
+
+    def __iter__(self):
+        """Iterate over the batches of the next epoch"""
+
+        if self.bucket_boundaries is None:
+            samples = []
+            for sample in self.samples():
+                samples.append(sample)
+                if len(samples) == self.batch_size:
+                    yield collate(samples, self._padded_size(max(len(batch_sample["points"]) for batch_sample in samples)))
+                    samples = []
+            if samples and not self.drop_last:
+                yield collate(samples, self._padded_size(max(len(batch_sample["points"]) for batch_sample in samples)))
+            return
+
+        buckets = [[] for _ in self.bucket_boundaries]
+        for sample in self.samples():
+            bucket = min(int(np.searchsorted(self.bucket_boundaries, len(sample["points"]))), len(buckets) - 1)
+            buckets[bucket].append(sample)
+            if len(buckets[bucket]) == self.batch_size:
+                yield collate(buckets[bucket], self.bucket_boundaries[bucket])
+                buckets[bucket] = []
+
+        if not self.drop_last:
+            for bucket, samples in enumerate(buckets):
+                if samples:
+                    yield collate(samples, self.bucket_boundaries[bucket])
+
+def benchmark(reader: DatasetReader, epochs: int = 1) -> dict:
+    """Measure the throughput of a dataset reader, consuming batches as fast as they are produced
+    @param reader: DatasetReader to measure
+    @param epochs: Number of epochs to read
+    @return: Dictionary of samples, batches, points, seconds and samples and points per second
+    """
+
+    samples = 0
+    batches = 0
+    points = 0
+    padded = 0
+    start = time.perf_counter()
+    for _ in range(epochs):
+        for batch in reader:
+            batches += 1
+            samples += len(batch["names"])
+            points += int(batch["num_points"].sum())
+            padded += batch["mask"].size
+    seconds = time.perf_counter() - start
+
+    return {"samples": samples,
+            "batches": batches,
+            "points": points,
+            "padding": 1.0 - points/padded if padded else 0.0,
+            "seconds": seconds,
+            "samples_per_second": samples/seconds if seconds > 0 else 0.0,
+            "points_per_second": points/seconds if seconds > 0 else 0.0}
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Measure the throughput of reading a generated dataset as training batches')
+    parser.add_argument("dataset_dir", type=str, help='Output directory of a generate.py run')
+    parser.add_argument("-b","--batch_size", type=int, default=8, help='Samples per batch')
+    parser.add_argument("-j","--workers", type=int, nargs="+", default=[0, 4], help='Numbers of loading threads to compare, 0 = no prefetching')
+    parser.add_argument("-e","--epochs", type=int, default=1, help='Epochs read per measurement')
+    parser.add_argument("--crop", type=float, default=None, help='Along-track length of random crops (m)')
+    parser.add_argument("--buckets", type=str, default=None, help='Comma separated point count boundaries of buckets')
+    parser.add_argument("--pad_multiple", type=int, default=1, help='Round padded point count up to a multiple of this')
+    parser.add_argument("--shuffle", action="store_true", help='Shuffle samples')
+    args = parser.parse_args()
+
+    buckets = [int(boundary) for boundary in args.buckets.split(",")] if args.buckets else None
+
+    for workers in args.workers:
+        reader = DatasetReader(args.dataset_dir, args.batch_size, workers, args.shuffle, crop_length=args.crop,
+                               bucket_boundaries=buckets, pad_multiple=args.pad_multiple)
+        result = benchmark(reader, args.epochs)
+        print(f"workers {workers:2d}: {result['samples_per_second']:8.2f} samples/s, {result['points_per_second']/1e6:7.2f} M points/s, "
+              f"{result['samples']} samples in {result['batches']} batches, {result['seconds']:.2f} s, padding {100*result['padding']:.1f} %")
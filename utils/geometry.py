@@ -0,0 +1,105 @@
+import numpy as np
+
+#Number of points processed at once when comparing points against all polyline segments
+CHUNK_SIZE = 4096
+
+def polyline_arc_length(polyline: np.ndarray) -> np.ndarray:
+    """Cumulative arc length at each vertex of a polyline
+    @param polyline: (M,D) array of polyline vertices
+    @return: (M,) array of arc lengths, starting at 0
+    """
+
+    segment_lengths = np.linalg.norm(np.diff(polyline, axis=0), axis=1)
+    return np.concatenate(([0.0], np.cumsum(segment_lengths)))
+
+def project_to_polyline(points: np.ndarray, polyline: np.ndarray, chunk_size: int = CHUNK_SIZE):
+    """Project points onto the closest location of a 2D polyline
+    @param points: (N,2) array of points
+    @param polyline: (M,2) array of polyline vertices, M >= 2
+    @param chunk_size: Number of points processed at once, bounds memory use
+    @return: Tuple of (N,) arrays: segment index, parameter along segment [0,1],
+             arc length of closest location, signed across-track offset (positive = left of travel direction)
+    """
+
+    points = np.asarray(points, dtype=np.float64)[:,:2]
+    polyline = np.asarray(polyline, dtype=np.float64)[:,:2]
+
+    starts = polyline[:-1]
+    deltas = np.diff(polyline, axis=0)
+    lengths_sq = np.maximum(np.einsum('ij,ij->i', deltas, deltas), 1e-12)
+    arc_length = polyline_arc_length(polyline)
+
+    segment = np.empty(len(points), dtype=np.int64)
+    t = np.empty(len(points))
+    for begin in range(0, len(points), chunk_size):
+        chunk = points[begin:begin+chunk_size]
+
+        #Parameter of closest location on every segment, clamped to segment
+        rel = chunk[:,None,:] - starts[None,:,:]
+        chunk_t = np.clip(np.einsum('nmj,mj->nm', rel, deltas)/lengths_sq, 0.0, 1.0)
+        offset = rel - chunk_t[:,:,None]*deltas[None,:,:]
+        closest = np.argmin(np.einsum('nmj,nmj->nm', offset, offset), axis=1)
+
+        segment[begin:begin+chunk_size] = closest
+        t[begin:begin+chunk_size] = chunk_t[np.arange(len(chunk)), closest]
+
+    along = arc_length[segment] + t*np.sqrt(lengths_sq[segment])
+    rel = points - starts[segment]
+    across = (deltas[segment,0]*rel[:,1] - deltas[segment,1]*rel[:,0])/np.sqrt(lengths_sq[segment])
+
+    return segment, t, along, across
+
+def distance_to_segments(points: np.ndarray, starts: np.ndarray, ends: np.ndarray, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """Distance of points to the closest of a set of 2D line segments
+    @param points: (N,2) array of points
+    @param starts: (M,2) array of segment start points
+    @param ends: (M,2) array of segment end points
+    @param chunk_size: Number of points processed at once, bounds memory use
+    @return: (N,) array of distances
+    """
+
+    points = np.asarray(points, dtype=np.float64)[:,:2]
+    deltas = ends - starts
+    lengths_sq = np.maximum(np.einsum('ij,ij->i', deltas, deltas), 1e-12)
+
+    distance = np.empty(len(points))
+    for begin in range(0, len(points), chunk_size):
+        rel = points[begin:begin+chunk_size,None,:] - starts[None,:,:]
+        t = np.clip(np.einsum('nmj,mj->nm', rel, deltas)/lengths_sq, 0.0, 1.0)
+        offset = rel - t[:,:,None]*deltas[None,:,:]
+        distance[begin:begin+chunk_size] = np.sqrt(np.einsum('nmj,nmj->nm', offset, offset).min(axis=1))
+
+    return distance
+
+def interpolate_polyline(polyline: np.ndarray, segment: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Interpolate positions on a polyline
+    @param polyline: (M,D) array of polyline vertices
+    @param segment: (N,) array of segment indices
+    @param t: (N,) array of parameters along segments [0,1]
+    @return: (N,D) array of positions
+    """
+
+    return polyline[segment] + t[:,None]*(polyline[segment+1] - polyline[segment])
+
+def interpolate_grid(x: np.ndarray, y: np.ndarray, z: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Bilinear interpolation of a regular height grid
+    @param x: (cols,) array of increasing x coordinates of grid columns
+    @param y: (rows,) array of increasing y coordinates of grid rows
+    @param z: (rows, cols) array of heights
+    @param points: (N,2) array of points
+    @return: (N,) array of heights, NaN outside the grid
+    """
+
+    points = np.asarray(points, dtype=np.float64)[:,:2]
+    col = np.clip(np.searchsorted(x, points[:,0], side='right') - 1, 0, len(x) - 2)
+    row = np.clip(np.searchsorted(y, points[:,1], side='right') - 1, 0, len(y) - 2)
+    tx = (points[:,0] - x[col])/(x[col+1] - x[col])
+    ty = (points[:,1] - y[row])/(y[row+1] - y[row])
+
+    heights = (z[row,col]*(1 - tx)*(1 - ty) + z[row,col+1]*tx*(1 - ty) +
+               z[row+1,col]*(1 - tx)*ty + z[row+1,col+1]*tx*ty)
+
+    outside = (points[:,0] < x[0]) | (points[:,0] > x[-1]) | (points[:,1] < y[0]) | (points[:,1] > y[-1])
+    heights[outside] = np.nan
+
+    return heights
@@ -0,0 +1,62 @@
+import numpy as np
+
+#Number of grid cells per axis used to prefilter points
+GRID_CELLS = 128
+
+def points_in_boxes(points: np.ndarray, centers: np.ndarray, axes: np.ndarray, half_extents: np.ndarray, margin: float = 0.0) -> np.ndarray:
+    """Assign points to oriented bounding boxes.
+    Points are bucketed into a horizontal grid once (radix sort of cell indices), so that each box only
+    tests the points in the grid cells covered by its axis-aligned extent.
+    @param points: (N,3) array of points
+    @param centers: (K,3) array of box centers
+    @param axes: (K,3,3) array of box orientations, columns are the unit box axes in world coordinates
+    @param half_extents: (K,3) array of box half extents along the box axes
+    @param margin: Distance added to the box half extents (m)
+    @return: (N,) int32 array of instance IDs, 0 = no box, k+1 = box k
+    """
+
+    instance_ids = np.zeros(len(points), dtype=np.int32)
+    if len(points) == 0 or len(centers) == 0:
+        return instance_ids
+
+    #Grid cells, small integer cell indices are sorted with radix sort
+    x = np.ascontiguousarray(points[:,0])
+    y = np.ascontiguousarray(points[:,1])
+    grid_min = np.array((x.min(), y.min()))
+    cell_size = np.maximum((np.array((x.max(), y.max())) - grid_min)/GRID_CELLS, 1e-6)
+    cell_x = np.minimum((x - grid_min[0])/cell_size[0], GRID_CELLS - 1).astype(np.int16)
+    cell_y = np.minimum((y - grid_min[1])/cell_size[1], GRID_CELLS - 1).astype(np.int16)
+    cells = cell_x*np.int16(GRID_CELLS) + cell_y
+    order = np.argsort(cells, kind='stable')
+    sorted_cells = cells[order]
+
+    for k in range(len(centers)):
+        half = half_extents[k] + margin
+
+        #Axis-aligned extent of oriented box as prefilter
+        reach = np.abs(axes[k]) @ half
+        lower = centers[k] - reach
+        upper = centers[k] + reach
+
+        cell_lower = np.clip(np.floor((lower[:2] - grid_min)/cell_size), 0, GRID_CELLS - 1).astype(np.int64)
+        cell_upper = np.clip(np.floor((upper[:2] - grid_min)/cell_size), 0, GRID_CELLS - 1).astype(np.int64)
+        if np.any(upper[:2] < grid_min) or np.any(lower[:2] > grid_min + GRID_CELLS*cell_size):
+            continue
+
+        #Each grid column covered by the box is one contiguous range of sorted points
+        columns = np.arange(cell_lower[0], cell_upper[0] + 1)*GRID_CELLS
+        begins = np.searchsorted(sorted_cells, columns + cell_lower[1], side='left')
+        ends = np.searchsorted(sorted_cells, columns + cell_upper[1], side='right')
+        candidates = np.concatenate([order[begin:end] for begin, end in zip(begins, ends)])
+
+        candidate_points = points[candidates]
+        in_extent = np.all((candidate_points >= lower) & (candidate_points <= upper), axis=1)
+        candidates = candidates[in_extent]
+
+        #Exact test in box coordinates
+        local = (points[candidates] - centers[k]) @ axes[k]
+        inside = np.all(np.abs(local) <= half, axis=1)
+        hits = candidates[inside]
+        instance_ids[hits[instance_ids[hits] == 0]] = k + 1
+
+    return instance_ids
@@ -0,0 +1,127 @@
+import numpy as np
+
+def mesh_arrays(mesh):
+    """Get vertices and triangle faces of a Blender mesh as numpy arrays
+    @param mesh: Blender mesh datablock, with triangulated faces
+    @return: Tuple of (N,3) float vertex array and (F,3) int face array
+    """
+
+    vertices = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
+
+    faces = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", faces)
+
+    return vertices.reshape(-1, 3).astype(np.float64), faces.reshape(-1, 3).astype(np.int64)
+
+def mesh_loop_triangles(mesh):
+    """Get vertices and triangulation of a Blender mesh with arbitrary polygons as numpy arrays
+    @param mesh: Blender mesh datablock
+    @return: Tuple of (N,3) float vertex array and (T,3) int triangle array
+    """
+
+    mesh.calc_loop_triangles()
+
+    vertices = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
+
+    triangles = np.empty(len(mesh.loop_triangles)*3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", triangles)
+
+    return vertices.reshape(-1, 3).astype(np.float64), triangles.reshape(-1, 3).astype(np.int64)
+
+def mesh_edges(mesh) -> np.ndarray:
+    """Get edges of a Blender mesh as numpy array
+    @param mesh: Blender mesh datablock
+    @return: (E,2) int array of edge vertex indices
+    """
+
+    edges = np.empty(len(mesh.edges)*2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+
+    return edges.reshape(-1, 2).astype(np.int64)
+
+def set_mesh_geometry(mesh, vertices: np.ndarray, faces: np.ndarray, smooth: bool = True):
+    """Replace the geometry of a Blender mesh with triangles, keeping its materials
+    @param mesh: Blender mesh datablock
+    @param vertices: (N,3) array of vertex coordinates
+    @param faces: (F,3) array of triangle vertex indices
+    @param smooth: Use smooth shading
+    """
+
+    mesh.clear_geometry()
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(vertices, dtype=np.float32).ravel())
+
+    mesh.loops.add(3*len(faces))
+    mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(faces, dtype=np.int32).ravel())
+
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, 3*len(faces), 3, dtype=np.int32))
+    mesh.polygons.foreach_set("use_smooth", np.full(len(faces), smooth))
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+def mesh_polygons(mesh):
+    """Get vertices and polygons of a Blender mesh as numpy arrays
+    @param mesh: Blender mesh datablock
+    @return: Tuple of (N,3) vertex array, (L,) loop vertex indices, (F,) loop starts and (F,) loop totals of polygons
+    """
+
+    vertices = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
+
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
+
+    loop_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+
+    return vertices.reshape(-1, 3).astype(np.float64), loops, loop_starts, loop_totals
+
+def keep_mesh_polygons(mesh, keep: np.ndarray):
+    """Remove polygons from a Blender mesh, keeping materials and shading of the remaining polygons
+    @param mesh: Blender mesh datablock
+    @param keep: (F,) boolean array of polygons to keep
+    """
+
+    vertices, loops, loop_starts, loop_totals = mesh_polygons(mesh)
+
+    material_indices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", material_indices)
+    smooth = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+
+    kept_loops = loops[np.repeat(keep, loop_totals)]
+    used, kept_loops = np.unique(kept_loops, return_inverse=True)
+    kept_totals = loop_totals[keep]
+
+    mesh.clear_geometry()
+
+    mesh.vertices.add(len(used))
+    mesh.vertices.foreach_set("co", vertices[used].astype(np.float32).ravel())
+
+    mesh.loops.add(len(kept_loops))
+    mesh.loops.foreach_set("vertex_index", kept_loops.astype(np.int32))
+
+    mesh.polygons.add(len(kept_totals))
+    mesh.polygons.foreach_set("loop_start", (np.cumsum(kept_totals) - kept_totals).astype(np.int32))
+    mesh.polygons.foreach_set("material_index", material_indices[keep])
+    mesh.polygons.foreach_set("use_smooth", smooth[keep])
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+def compact_mesh(vertices: np.ndarray, faces: np.ndarray):
+    """Remove vertices that are not used by any face
+    @param vertices: (N,3) array of vertex coordinates
+    @param faces: (F,3) array of triangle vertex indices
+    @return: Tuple of compacted vertices and re-indexed faces
+    """
+
+    used, faces = np.unique(faces, return_inverse=True)
+    return vertices[used], faces.reshape(-1, 3)
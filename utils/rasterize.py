@@ -0,0 +1,79 @@
+import numpy as np
+
+#Number of candidate pixels evaluated at once, bounds memory use
+CHUNK_PIXELS = 1 << 22
+
+def rasterize_triangles(vertices: np.ndarray, faces: np.ndarray, x_min: float, y_max: float, resolution: float, width: int, height: int) -> np.ndarray:
+    """Rasterize the highest surface of a triangle mesh onto a regular north-up grid.
+    Triangles are grouped by the size of their pixel bounding box, and each group tests all candidate pixels of
+    its bounding boxes at once with barycentric coordinates. Heights are interpolated at pixel centers.
+    @param vertices: (N,3) array of vertex coordinates
+    @param faces: (F,3) array of triangle vertex indices
+    @param x_min: x coordinate of the left grid edge
+    @param y_max: y coordinate of the top grid edge
+    @param resolution: Pixel size (m)
+    @param width: Number of grid columns
+    @param height: Number of grid rows
+    @return: (height, width) float32 array of heights, row 0 at y_max, NaN where no triangle covers a pixel center
+    """
+
+    grid = np.full(height*width, np.nan, dtype=np.float32)
+    if len(faces) == 0:
+        return grid.reshape(height, width)
+
+    #Triangle corners in continuous pixel coordinates (column, row), pixel centers at integer + 0.5
+    tri = vertices[faces]
+    px = (tri[:,:,0] - x_min)/resolution
+    py = (y_max - tri[:,:,1])/resolution
+    pz = tri[:,:,2]
+
+    col_min = np.clip(np.floor(px.min(axis=1) - 0.5).astype(np.int64) + 1, 0, width)
+    col_max = np.clip(np.floor(px.max(axis=1) - 0.5).astype(np.int64), -1, width - 1)
+    row_min = np.clip(np.floor(py.min(axis=1) - 0.5).astype(np.int64) + 1, 0, height)
+    row_max = np.clip(np.floor(py.max(axis=1) - 0.5).astype(np.int64), -1, height - 1)
+
+    #Triangles covering at least one pixel center, grouped by power of two bounding box size
+    box_size = np.maximum(col_max - col_min, row_max - row_min) + 1
+    covering = (col_max >= col_min) & (row_max >= row_min)
+    box_bucket = np.zeros(len(faces), dtype=np.int64)
+    box_bucket[covering] = np.ceil(np.log2(box_size[covering])).astype(np.int64)
+
+    for bucket in np.unique(box_bucket[covering]):
+        size = 1 << int(bucket)
+        offset_rows, offset_cols = np.divmod(np.arange(size*size), size)
+        bucket_faces = np.flatnonzero(covering & (box_bucket == bucket))
+
+        for begin in range(0, len(bucket_faces), max(CHUNK_PIXELS//(size*size), 1)):
+            f = bucket_faces[begin:begin + max(CHUNK_PIXELS//(size*size), 1)]
+            cols = col_min[f,None] + offset_cols[None,:]
+            rows = row_min[f,None] + offset_rows[None,:]
+            cx = cols + 0.5
+            cy = rows + 0.5
+
+            #Barycentric coordinates of pixel centers
+            x0, x1, x2 = px[f,0,None], px[f,1,None], px[f,2,None]
+            y0, y1, y2 = py[f,0,None], py[f,1,None], py[f,2,None]
+            area = (x1 - x0)*(y2 - y0) - (x2 - x0)*(y1 - y0)
+            valid_area = np.abs(area) > 1e-12
+            area = np.where(valid_area, area, 1.0)
+            w1 = ((cx - x0)*(y2 - y0) - (x2 - x0)*(cy - y0))/area
+            w2 = ((x1 - x0)*(cy - y0) - (cx - x0)*(y1 - y0))/area
+            w0 = 1.0 - w1 - w2
+
+            eps = -1e-9
+            inside = (w0 >= eps) & (w1 >= eps) & (w2 >= eps) & valid_area & (cols <= col_max[f,None]) & (rows <= row_max[f,None])
+            z = w0*pz[f,0,None] + w1*pz[f,1,None] + w2*pz[f,2,None]
+
+            pixel = (rows*width + cols)[inside]
+            z = z[inside]
+            if len(pixel) == 0:
+                continue
+
+            #Highest surface per pixel
+            order = np.argsort(pixel, kind='stable')
+            pixel = pixel[order]
+            starts = np.flatnonzero(np.concatenate(([True], pixel[1:] != pixel[:-1])))
+            highest = np.maximum.reduceat(z[order], starts)
+            grid[pixel[starts]] = np.fmax(grid[pixel[starts]], highest)
+
+    return grid.reshape(height, width)
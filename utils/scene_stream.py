@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import numpy as np
+
+#Frame header: magic, protocol version, frame type, metadata length, payload length
+MAGIC = b"BGSS"
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("<4sBBxxIQ")
+
+#Frame types, producer to consumer: scan (points of one sonar scan), scene (scene information), end (producer done),
+#consumer to producer: ack (one frame consumed)
+FRAME_SCAN = 1
+FRAME_SCENE = 2
+FRAME_END = 3
+FRAME_ACK = 4
+FRAME_NAMES = {FRAME_SCAN: "scan", FRAME_SCENE: "scene", FRAME_END: "end", FRAME_ACK: "ack"}
+
+#Default socket of the consumer
+DEFAULT_ADDRESS = "/tmp/blendgaenger_stream.sock"
+
+#Seconds between attempts to connect to a consumer that is not yet listening
+CONNECT_INTERVAL = 1.0
+
+def recv_exactly(sock: socket.socket, buffer: memoryview):
+    """Fill a buffer from a socket
+    @param sock: Connected socket
+    @param buffer: Writable byte memoryview to fill
+    """
+
+    received = 0
+    while received < len(buffer):
+        count = sock.recv_into(buffer[received:])
+        if count == 0:
+            raise ConnectionError("Stream closed inside a frame")
+        received += count
+
+def send_frame(sock: socket.socket, frame_type: int, metadata: dict = None, arrays: dict = None):
+    """Send a frame: fixed size header, JSON metadata and the raw bytes of contiguous arrays.
+    Name, dtype and shape of the arrays are part of the metadata, so the payload needs no further framing.
+    @param sock: Connected socket
+    @param frame_type: Frame type
+    @param metadata: JSON serializable dictionary
+    @param arrays: Dictionary of array name to numpy array
+    """
+
+    arrays = {name: np.ascontiguousarray(values) for name, values in (arrays or {}).items()}
+    metadata = dict(metadata or {})
+    metadata["arrays"] = [{"name": name, "dtype": values.dtype.str, "shape": list(values.shape)} for name, values in arrays.items()]
+    encoded = json.dumps(metadata).encode()
+
+    payload_size = sum(values.nbytes for values in arrays.values())
+    sock.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, frame_type, len(encoded), payload_size) + encoded)
+    for values in arrays.values():
+        if values.nbytes > 0:
+            sock.sendall(memoryview(values).cast("B"))
+
+def recv_frame(sock: socket.socket):
+    """Receive a frame sent by send_frame. Arrays are received directly into their own buffers.
+    @param sock: Connected socket
+    @return: Tuple of frame type, metadata dictionary and dictionary of array name to numpy array, None if the stream was closed between frames
+    """
+
+    header = bytearray(HEADER.size)
+    count = sock.recv_into(header)
+    if count == 0:
+        return None
+    recv_exactly(sock, memoryview(header)[count:])
+
+    magic, version, frame_type, metadata_size, payload_size = HEADER.unpack(header)
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise Exception(f"Unsupported stream frame (magic {magic}, version {version})")
+
+    encoded = bytearray(metadata_size)
+    recv_exactly(sock, memoryview(encoded))
+    metadata = json.loads(encoded)
+
+    arrays = {}
+    for description in metadata.pop("arrays"):
+        values = np.empty(description["shape"], dtype=np.dtype(description["dtype"]))
+        if values.nbytes > 0:
+            recv_exactly(sock, memoryview(values).cast("B"))
+        arrays[description["name"]] = values
+        payload_size -= values.nbytes
+    if payload_size != 0:
+        raise Exception("Stream frame payload does not match its array descriptions")
+
+    return frame_type, metadata, arrays
+
+class SceneStreamSender:
+    """Class to publish generated scenes to a consumer process through a local (Unix domain) socket.
+    The consumer acknowledges every frame once it has consumed it. At most max_in_flight frames are
+    unacknowledged, further sends block until the consumer catches up, so a slow consumer throttles the
+    generator instead of frames piling up in memory.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, max_in_flight: int = 2, connect_timeout: float = 60.0):
+        """Connect to a consumer, waiting for it to listen
+        @param address: Path of the consumer socket
+        @param max_in_flight: Maximum number of unacknowledged frames
+        @param connect_timeout: Seconds to wait for the consumer"""
+
+        self.address = address
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.frames = 0
+        self.bytes = 0
+        self.blocked_seconds = 0.0
+
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(address)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                self.sock.close()
+                if time.monotonic() > deadline:
+                    raise Exception(f"No scene stream consumer listening on {address}")
+                time.sleep(CONNECT_INTERVAL)
+
+    def _wait_ack(self):
+        frame = recv_frame(self.sock)
+        if frame is None or frame[0] != FRAME_ACK:
+            raise ConnectionError("Scene stream consumer disconnected")
+        self.in_flight -= 1
+
+    def send(self, frame_type: int, metadata: dict, arrays: dict = None):
+        """Send a frame, blocking while max_in_flight frames are unacknowledged
+        @param frame_type: FRAME_SCAN or FRAME_SCENE
+        @param metadata: JSON serializable dictionary
+        @param arrays: Dictionary of array name to numpy array
+        """
+
+        start = time.perf_counter()
+        while self.in_flight >= self.max_in_flight:
+            self._wait_ack()
+        self.blocked_seconds += time.perf_counter() - start
+
+        send_frame(self.sock, frame_type, metadata, arrays)
+        self.in_flight += 1
+        self.frames += 1
+        self.bytes += sum(np.asarray(values).nbytes for values in (arrays or {}).values())
+
+    def close(self):
+        """Wait until the consumer has consumed all frames, and close the connection, the producer is finished"""
+
+        while self.in_flight > 0:
+            self._wait_ack()
+        send_frame(self.sock, FRAME_END)
+        self.sock.close()
+
+    def detach(self):
+        """Wait until the consumer has consumed all frames, and close the connection without finishing the producer,
+        e.g. before a worker restart that reconnects"""
+
+        while self.in_flight > 0:
+            self._wait_ack()
+        self.sock.close()
+
+class SceneStreamReceiver:
+    """Class to consume the scenes published by one or more generator processes.
+    Every producer connection is read by its own thread, and a frame is acknowledged when the consumer asks for
+    the next one, so the producers' in-flight limit bounds the number of frames held by the receiver.
+    A producer is finished when it sends an end frame. Connections closed without one, e.g. by a restarting
+    worker that reconnects, do not count as finished producers.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, producers: int = None):
+        """Listen on a socket, replacing a stale socket file
+        @param address: Path of the socket
+        @param producers: Number of producers to wait for until iteration ends, None = until closed"""
+
+        self.address = address
+        self.expected_producers = producers
+        self.finished_producers = 0
+        if os.path.exists(address):
+            os.remove(address)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(address)
+        self.server.listen()
+        self.frames = queue.Queue()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def _read(self, conn: socket.socket):
+        finished = False
+        try:
+            while True:
+                frame = recv_frame(conn)
+                if frame is None:
+                    break
+                if frame[0] == FRAME_END:
+                    finished = True
+                    break
+                self.frames.put((conn, frame))
+        except (ConnectionError, OSError):
+            pass
+        self.frames.put((conn, finished))
+
+    def __iter__(self):
+        """Iterate over received frames as tuples of frame type name, metadata and arrays, until the expected
+        number of producers has finished. The previous frame is acknowledged when the next one is requested."""
+
+        while self.expected_producers is None or self.finished_producers < self.expected_producers:
+            conn, frame = self.frames.get()
+            if isinstance(frame, bool):
+                conn.close()
+                self.finished_producers += frame
+                continue
+
+            frame_type, metadata, arrays = frame
+            yield FRAME_NAMES[frame_type], metadata, arrays
+            try:
+                send_frame(conn, FRAME_ACK)
+            except OSError:
+                pass
+
+    def close(self):
+        self.server.close()
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Test consumer of a scene stream, prints a line per received frame')
+    parser.add_argument("address", type=str, nargs="?", default=DEFAULT_ADDRESS, help='Path of the socket to listen on')
+    parser.add_argument("--delay", type=float, default=0.0, help='Seconds spent per scan, to simulate a slow consumer')
+    parser.add_argument("--scenes", type=int, default=None, help='Stop after this many scenes')
+    parser.add_argument("--producers", type=int, default=1, help='Stop when this many generator processes have finished, 0 = run until interrupted')
+    args = parser.parse_args()
+
+    receiver = SceneStreamReceiver(args.address, args.producers or None)
+    print(f"Listening on {args.address}")
+
+    scenes = 0
+    scans = 0
+    points = 0
+    received_bytes = 0
+    start = None
+    try:
+        for frame_type, metadata, arrays in receiver:
+            start = time.perf_counter() if start is None else start
+            received_bytes += sum(values.nbytes for values in arrays.values())
+
+            if frame_type == "scan":
+                scans += 1
+                points += len(arrays["points"])
+                labels = np.bincount(arrays["labels"], minlength=len(metadata["labels"])) if len(arrays["labels"]) else []
+                print(f"scan  {metadata['scan']}: {len(arrays['points'])} points, labels {dict(zip(metadata['labels'], np.asarray(labels).tolist()))}, "
+                      f"{len(arrays['box_centers'])} boxes, {int(np.count_nonzero(arrays['instances']))} munition points")
+                time.sleep(args.delay)
+            else:
+                scenes += 1
+                print(f"scene {metadata['iteration']:05d}: {len(metadata.get('passes', []))} passes{', rejected' if 'rejected' in metadata else ''}")
+                if args.scenes is not None and scenes >= args.scenes:
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+
+    seconds = time.perf_counter() - start if start is not None else 0.0
+    print(f"Received {scenes} scenes, {scans} scans, {points} points, {received_bytes/1024**2:.1f} MB in {seconds:.1f} s")
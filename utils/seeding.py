@@ -0,0 +1,22 @@
+import zlib
+import numpy as np
+
+def stage_seed(iteration_seed: int, stage: str, *extra: int) -> int:
+    """Derive a seed for a single generation stage from the iteration seed.
+    Different stages get independent, but reproducible, random streams.
+    @param iteration_seed: Seed of the current iteration
+    @param stage: Name of the stage
+    @param extra: Additional integers to mix in (e.g. variant index)
+    """
+
+    sequence = np.random.SeedSequence([iteration_seed, zlib.crc32(stage.encode()), *extra])
+    return int(sequence.generate_state(1)[0])
+
+def stage_rng(iteration_seed: int, stage: str, *extra: int) -> np.random.Generator:
+    """Get a numpy random generator for a single generation stage
+    @param iteration_seed: Seed of the current iteration
+    @param stage: Name of the stage
+    @param extra: Additional integers to mix in (e.g. variant index)
+    """
+
+    return np.random.default_rng(stage_seed(iteration_seed, stage, *extra))
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import argparse
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+#Default store location, tmpfs so that entries are read from memory
+DEFAULT_ROOT = "/dev/shm/blendgaenger" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "blendgaenger_assets")
+
+#Version of the entry layout, part of every key
+STORE_VERSION = 1
+
+#Seconds after its last use during which an entry is never evicted, so that a worker can map the entry it has
+#just published or found before another worker's eviction removes it
+EVICT_GRACE_SECONDS = 60
+
+class SharedAssetStore:
+    """Class to cache read-only arrays for the worker processes of one machine, e.g. decompressed assets.
+    Each entry is a directory of .npy files and a metadata file, written once by the first worker that needs it
+    and renamed into place, so readers never see partial entries. Readers map the files read-only instead of
+    decoding the source again. Workers that build Blender datablocks from an entry still copy its arrays, so the
+    store saves loading time, not per-worker memory. Building an entry is serialized between processes with a
+    lock file per key, and the least recently used entries are evicted when the store exceeds its size limit.
+    Evicted entries stay valid for processes that have already mapped them.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT, max_size_mb: float = 512):
+        """Initialize shared asset store
+        @param root: Directory of store entries, shared by all workers of the machine
+        @param max_size_mb: Maximum total size of store entries (MB)"""
+
+        self.root = root
+        self.max_size_mb = max_size_mb
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Key of an entry from the values it is derived from, e.g. asset type, source file and modification time"""
+
+        serialized = json.dumps([STORE_VERSION, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode()).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def _lock(self, name: str):
+        with open(os.path.join(self.root, f".{name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str):
+        """Map the arrays of an entry read-only
+        @param key: Entry key
+        @return: Tuple of dictionary of array name to read-only memory-mapped array, and metadata dictionary, None if not stored
+        """
+
+        path = self.path(key)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                entry = json.load(f)
+            arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in entry["arrays"]}
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            #Missing, evicted by another worker, or unreadable
+            return None
+
+        return arrays, entry["meta"]
+
+    def publish(self, key: str, arrays: dict, meta: dict = None):
+        """Store arrays as an entry, unless another worker has published it first, and evict least recently used entries
+        @param key: Entry key
+        @param arrays: Dictionary of array name to array
+        @param meta: JSON-serializable metadata of the entry
+        @return: Tuple of read-only memory-mapped arrays and metadata of the stored entry
+        """
+
+        tmp_path = tempfile.mkdtemp(dir=self.root, prefix=".tmp_")
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, name + ".npy"), np.ascontiguousarray(array))
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump({"arrays": list(arrays), "meta": meta if meta is not None else {}}, f)
+            os.rename(tmp_path, self.path(key))
+        except OSError:
+            #Entry already published by another worker
+            if not os.path.isdir(self.path(key)):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.evict(keep=key)
+
+        #Fall back to the arrays just built if the entry is gone anyway, e.g. removed with clear()
+        entry = self.get(key)
+        if entry is None:
+            entry = ({name: np.asarray(array) for name, array in arrays.items()}, meta if meta is not None else {})
+
+        return entry
+
+    def get_or_publish(self, key: str, build):
+        """Map an entry, building and publishing it if no worker has done so yet
+        @param key: Entry key
+        @param build: Function returning a tuple of dictionary of arrays and metadata dictionary, called at most once per machine
+        @return: Tuple of read-only memory-mapped arrays and metadata
+        """
+
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock(key):
+            entry = self.get(key)
+            if entry is None:
+                arrays, meta = build()
+                entry = self.publish(key, arrays, meta)
+
+        return entry
+
+    def entries(self) -> list:
+        """List stored entries
+        @return: List of (key, size in bytes, last use time) tuples"""
+
+        entries = []
+        with os.scandir(self.root) as scan:
+            for entry in scan:
+                if entry.name.startswith(".") or not entry.is_dir():
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.name, size, entry.stat().st_mtime))
+                except FileNotFoundError:
+                    continue
+
+        return entries
+
+    def remove(self, key: str):
+        """Remove an entry, processes that have mapped it keep their mapping"""
+
+        #Rename away first, so that readers never see a partially removed entry
+        tmp_path = tempfile.mkdtemp(dir=self.root, prefix=".tmp_")
+        try:
+            os.rename(self.path(key), os.path.join(tmp_path, key))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def evict(self, keep: str = None):
+        """Remove least recently used entries until the store is within its size limit.
+        Entries used within the last EVICT_GRACE_SECONDS are kept by every worker, the store can exceed its limit
+        until they age.
+        @param keep: Key of an entry that is never evicted, e.g. the entry just published"""
+
+        with self._lock("evict"):
+            entries = self.entries()
+            total_size = sum(size for _, size, _ in entries)
+            grace_start = time.time() - EVICT_GRACE_SECONDS
+            for key, size, last_use in sorted(entries, key=lambda entry: entry[2]):
+                if total_size <= self.max_size_mb*1024**2:
+                    break
+                if key == keep or last_use > grace_start:
+                    continue
+                self.remove(key)
+                total_size -= size
+
+    def clear(self):
+        for key, _, _ in self.entries():
+            self.remove(key)
+
+def shared_asset_store(config):
+    """Get the shared asset store of a configuration
+    @param config: Configuration object
+    @return: SharedAssetStore, None if sharing is disabled
+    """
+
+    if not config.general.shared_assets:
+        return None
+
+    root = DEFAULT_ROOT if config.general.shared_assets is True else config.general.shared_assets
+    return SharedAssetStore(root, config.general.shared_assets_size_mb)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Read cache of decompressed assets for parallel workers of one machine')
+    parser.add_argument("command", choices=["list", "clear"], help='List or remove all entries')
+    parser.add_argument("root", type=str, nargs="?", default=DEFAULT_ROOT, help='Store directory')
+    args = parser.parse_args()
+
+    store = SharedAssetStore(args.root)
+
+    match args.command:
+        case "list":
+            entries = store.entries()
+            for key, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                print(f"{key}  {size/1024**2:8.2f} MB")
+            print(f"{len(entries)} entries, {sum(size for _, size, _ in entries)/1024**2:.2f} MB in {args.root}")
+        case "clear":
+            store.clear()
+            print(f"Cleared {args.root}")
@@ -0,0 +1,73 @@
+import numpy as np
+from config import load_config
+from classes.PointCloud import PointCloud
+from classes.ArcLengthTrajectory import ArcLengthTrajectory
+from utils.geometry import project_to_polyline, interpolate_polyline
+
+class ScanGeometry:
+    """Ray geometry of a noise-free scan, recovered from the sensor path.
+    Beams of a ping are emitted perpendicular to the path, so the sensor position of a hit
+    is the closest location on the path, and pings are spaced evenly along its arc length.
+    The path must be sampled from the evaluated curve the sensor follows, not its control points,
+    which lie off the smooth path on curved passes.
+    """
+
+    def __init__(self, point_cloud: PointCloud, trajectory: np.ndarray, num_pings: int):
+        """Recover ray origins, directions, ranges and ping indices of scanned points
+        @param point_cloud: Noise-free scanned point cloud
+        @param trajectory: (M,3) array of points sampled along the evaluated sensor path
+        @param num_pings: Number of pings along the trajectory"""
+
+        self.points = point_cloud.xyz(noisy=False)
+
+        path = ArcLengthTrajectory(trajectory)
+        segment, t, along, _ = project_to_polyline(self.points[:,:2], path.points[:,:2])
+        origins = interpolate_polyline(path.points, segment, t)
+
+        rays = self.points - origins
+        self.ranges = np.linalg.norm(rays, axis=1)
+        self.directions = rays/np.maximum(self.ranges, 1e-9)[:,None]
+        self.origins = origins
+
+        total_length = max(path.length, 1e-9)
+        self.pings = np.rint(along/total_length*(num_pings - 1)).astype(np.int64)
+        self.num_pings = num_pings
+
+def noisy_ranges(geometry: ScanGeometry, config: load_config.RootConfig, rng: np.random.Generator) -> np.ndarray:
+    """Draw one noise realization of the ranges of a scan, following the BlAInder sonar noise model:
+    gaussian range noise on every beam, and interference noise on a random subset of pings,
+    where each beam of an affected ping is replaced by a return at a random range.
+    @param geometry: Recovered scan geometry
+    @param config: Configuration object
+    @param rng: Random generator
+    @return: (N,) array of noisy ranges
+    """
+
+    ranges = geometry.ranges + rng.normal(config.sonar.noise_mean, config.sonar.noise_std, len(geometry.ranges))
+
+    if config.sonar.interference_noise:
+        ping_affected = rng.random(geometry.num_pings) < config.sonar.interference_noise_chance_per_ping
+        beam_affected = ping_affected[geometry.pings] & (rng.random(len(ranges)) < config.sonar.interference_noise_chance_per_beam)
+        ranges[beam_affected] = rng.uniform(config.sonar.interference_noise_min, config.sonar.interference_noise_max,
+                                            np.count_nonzero(beam_affected))
+
+    return np.maximum(ranges, 0.0)
+
+def noise_variant(point_cloud: PointCloud, geometry: ScanGeometry, config: load_config.RootConfig, rng: np.random.Generator) -> PointCloud:
+    """Create a noisy copy of a noise-free scan
+    @param point_cloud: Noise-free scanned point cloud
+    @param geometry: Recovered scan geometry of point_cloud
+    @param config: Configuration object
+    @param rng: Random generator
+    @return: Point cloud with noisy coordinates and ranges
+    """
+
+    ranges = noisy_ranges(geometry, config, rng)
+    points = geometry.origins + geometry.directions*ranges[:,None]
+
+    variant = point_cloud.take(slice(None))
+    for axis, name in enumerate(("X_noise", "Y_noise", "Z_noise")):
+        variant.columns[name] = points[:,axis]
+    variant.columns["distance_noise"] = ranges
+
+    return variant
@@ -0,0 +1,373 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import argparse
+import threading
+import tempfile
+
+#Seconds after the last heartbeat when a lease is considered abandoned
+LEASE_TIMEOUT = 600
+#Seconds between heartbeats of a claimed job
+HEARTBEAT_INTERVAL = 30
+#Seconds to wait before looking for claimable jobs again, while other workers hold leases
+POLL_INTERVAL = 10
+
+def write_atomic(path: str, data: dict):
+    """Write a .json file to a temporary file and rename it into place"""
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def commit_results(staging_dir: str, output_dir: str):
+    """Move all files of a staging directory into the output tree by atomic renames, keeping relative paths.
+    Staging and output directory must be on the same file system.
+    @param staging_dir: Directory with results of one job
+    @param output_dir: Shared output directory
+    """
+
+    for root, _, files in os.walk(staging_dir):
+        target_root = os.path.join(output_dir, os.path.relpath(root, staging_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(target_root, name))
+
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+class WorkQueue:
+    """Class to distribute jobs between workers on several nodes over a shared file system, without a broker.
+    Each job is a file in <queue_dir>/jobs. Workers claim a job by exclusively creating its lease file in
+    <queue_dir>/leases, and keep the lease alive with heartbeats (modification time). Leases without heartbeat
+    for lease_timeout seconds are reclaimed by other workers, after renaming them away so that only one worker
+    wins. Every claim has its own token, so a worker notices when its lease was replaced, even by a restarted
+    process with the same worker ID. Results are written to a staging directory and committed by atomic rename into the output tree,
+    followed by a completion marker in <queue_dir>/done.
+    """
+
+    def __init__(self, queue_dir: str, worker_id: str = None, lease_timeout: float = LEASE_TIMEOUT, heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        """Initialize work queue
+        @param queue_dir: Shared queue directory
+        @param worker_id: Unique name of this worker, default: <hostname>-<pid>
+        @param lease_timeout: Seconds after the last heartbeat when a lease is reclaimed
+        @param heartbeat_interval: Seconds between heartbeats"""
+
+        self.queue_dir = queue_dir
+        self.worker_id = worker_id if worker_id else f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self._heartbeat_stop = None
+        self._heartbeat_thread = None
+        self._tokens = {}
+
+        for name in ("jobs", "leases", "done", "staging"):
+            os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+
+    def _path(self, kind: str, job_id: str) -> str:
+        extension = {"jobs": ".json", "leases": ".lease", "done": ".json"}[kind]
+        return os.path.join(self.queue_dir, kind, job_id + extension)
+
+    def create(self, jobs: dict):
+        """Add jobs to the queue, existing jobs are kept
+        @param jobs: Dictionary of job ID to job description
+        """
+
+        for job_id, job in jobs.items():
+            if not os.path.exists(self._path("jobs", job_id)):
+                write_atomic(self._path("jobs", job_id), job)
+
+    def job(self, job_id: str) -> dict:
+        with open(self._path("jobs", job_id), "r") as f:
+            return json.load(f)
+
+    def job_ids(self) -> list:
+        return sorted(name[:-len(".json")] for name in os.listdir(os.path.join(self.queue_dir, "jobs")) if name.endswith(".json"))
+
+    def is_done(self, job_id: str) -> bool:
+        return os.path.exists(self._path("done", job_id))
+
+    def _read_lease(self, path: str):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def lease_owner(self, job_id: str):
+        """Worker ID holding the lease of a job, None if not leased"""
+
+        lease = self._read_lease(self._path("leases", job_id))
+        return lease.get("worker") if lease is not None else None
+
+    def holds_lease(self, job_id: str) -> bool:
+        """Whether the lease of a job is the one claimed by this worker"""
+
+        lease = self._read_lease(self._path("leases", job_id))
+        return lease is not None and job_id in self._tokens and lease.get("token") == self._tokens[job_id]
+
+    def _reclaim_stale(self, job_id: str):
+        """Remove the lease of a job if its heartbeat expired"""
+
+        lease_path = self._path("leases", job_id)
+        try:
+            if time.time() - os.path.getmtime(lease_path) < self.lease_timeout:
+                return
+        except FileNotFoundError:
+            return
+        stale_lease = self._read_lease(lease_path)
+        if stale_lease is None:
+            return
+
+        #Only one worker can rename the stale lease away
+        stale_path = lease_path + f".stale-{self.worker_id}"
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return
+
+        #Another worker may have reclaimed and claimed the job between the check and the rename,
+        #then the renamed lease is live, and is put back unless yet another lease exists
+        renamed_lease = self._read_lease(stale_path)
+        try:
+            still_stale = time.time() - os.path.getmtime(stale_path) >= self.lease_timeout
+        except FileNotFoundError:
+            return
+        if not still_stale or renamed_lease != stale_lease:
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            os.remove(stale_path)
+            return
+
+        #Remove partial results of the failed worker
+        shutil.rmtree(self._staging_path(job_id, stale_lease.get("worker"), stale_lease.get("token")), ignore_errors=True)
+
+        print(f"Reclaimed expired lease of job {job_id}")
+        os.remove(stale_path)
+
+    def try_claim(self, job_id: str) -> bool:
+        """Try to claim a job by exclusively creating its lease file
+        @param job_id: Job ID
+        @return: Whether the job was claimed
+        """
+
+        if self.is_done(job_id):
+            return False
+
+        self._reclaim_stale(job_id)
+
+        token = uuid.uuid4().hex
+        lease = {"worker": self.worker_id, "token": token, "host": socket.gethostname(), "pid": os.getpid(), "claimed": time.time()}
+        try:
+            fd = os.open(self._path("leases", job_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump(lease, f)
+        self._tokens[job_id] = token
+
+        #Job may have been completed between the check and the claim
+        if self.is_done(job_id):
+            self.release(job_id)
+            return False
+
+        self._start_heartbeat(job_id)
+        return True
+
+    def _start_heartbeat(self, job_id: str):
+        self._heartbeat_stop = threading.Event()
+
+        def heartbeat(stop):
+            while not stop.wait(self.heartbeat_interval):
+                if not self.holds_lease(job_id):
+                    print(f"Lost lease of job {job_id}")
+                    return
+                try:
+                    os.utime(self._path("leases", job_id))
+                except FileNotFoundError:
+                    print(f"Lost lease of job {job_id}")
+                    return
+
+        self._heartbeat_thread = threading.Thread(target=heartbeat, args=(self._heartbeat_stop,), daemon=True)
+        self._heartbeat_thread.start()
+
+    def _stop_heartbeat(self):
+        if self._heartbeat_stop is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat_thread.join()
+            self._heartbeat_stop = None
+            self._heartbeat_thread = None
+
+    def claim(self):
+        """Claim the next unfinished job
+        @return: Job ID, None if no job can be claimed right now
+        """
+
+        for job_id in self.job_ids():
+            if self.try_claim(job_id):
+                return job_id
+        return None
+
+    def jobs(self, poll_interval: float = POLL_INTERVAL):
+        """Claim jobs until all jobs of the queue are done. Waits while other workers hold the remaining leases,
+        so that their jobs are reclaimed if they fail.
+        @param poll_interval: Seconds between attempts to claim leased jobs
+        """
+
+        while True:
+            job_id = self.claim()
+            if job_id is not None:
+                yield job_id
+            elif all(self.is_done(job_id) for job_id in self.job_ids()):
+                return
+            else:
+                time.sleep(poll_interval)
+
+    def _staging_path(self, job_id: str, worker_id: str, token: str) -> str:
+        return os.path.join(self.queue_dir, "staging", f"{job_id}.{worker_id}.{token}")
+
+    def staging_dir(self, job_id: str) -> str:
+        """Directory for the results of a claimed job, before they are committed"""
+
+        path = self._staging_path(job_id, self.worker_id, self._tokens.get(job_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def complete(self, job_id: str, output_dir: str = None) -> bool:
+        """Commit the results of a claimed job into the output tree and mark it as done.
+        Results are discarded if the lease was lost to another worker in the meantime.
+        @param job_id: Job ID
+        @param output_dir: Shared output directory, None if the job has no results
+        @return: Whether the results were committed
+        """
+
+        self._stop_heartbeat()
+        staging_dir = self._staging_path(job_id, self.worker_id, self._tokens.get(job_id))
+
+        if not self.holds_lease(job_id) or self.is_done(job_id):
+            print(f"Lease of job {job_id} lost, discarding results")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            self._tokens.pop(job_id, None)
+            return False
+
+        if output_dir is not None and os.path.isdir(staging_dir):
+            commit_results(staging_dir, output_dir)
+        else:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        write_atomic(self._path("done", job_id), {"worker": self.worker_id, "completed": time.time()})
+        self.release(job_id)
+        return True
+
+    def release(self, job_id: str):
+        """Give up the lease of a job, if held by this worker"""
+
+        self._stop_heartbeat()
+        if self.holds_lease(job_id):
+            try:
+                os.remove(self._path("leases", job_id))
+            except FileNotFoundError:
+                pass
+        self._tokens.pop(job_id, None)
+
+    def abandon(self, job_id: str):
+        """Give up a claimed job without results, e.g. when its generation is cancelled, so that another worker claims it
+        @param job_id: Job ID
+        """
+
+        self._stop_heartbeat()
+        shutil.rmtree(self._staging_path(job_id, self.worker_id, self._tokens.get(job_id)), ignore_errors=True)
+        self.release(job_id)
+
+    def status(self) -> dict:
+        """Number of done, leased and pending jobs"""
+
+        job_ids = self.job_ids()
+        done = sum(self.is_done(job_id) for job_id in job_ids)
+        leased = sum(not self.is_done(job_id) and os.path.exists(self._path("leases", job_id)) for job_id in job_ids)
+
+        return {"jobs": len(job_ids), "done": done, "leased": leased, "pending": len(job_ids) - done - leased}
+
+def simulated_worker(queue_dir: str, output_dir: str, worker_idx: int, job_duration: float, crash_after: int, lease_timeout: float, heartbeat_interval: float):
+    """Local process standing in for a node: writes one result file per job, and optionally crashes while holding a lease"""
+
+    queue = WorkQueue(queue_dir, f"sim{worker_idx}-{os.getpid()}", lease_timeout, heartbeat_interval)
+    completed = 0
+    for job_id in queue.jobs(poll_interval=heartbeat_interval):
+        staging_dir = queue.staging_dir(job_id)
+        time.sleep(job_duration)
+        if crash_after is not None and completed == crash_after:
+            print(f"Worker {queue.worker_id} crashing during job {job_id}")
+            os._exit(1)
+        with open(os.path.join(staging_dir, f"{job_id}.txt"), "w") as f:
+            f.write(queue.worker_id + "\n")
+        if queue.complete(job_id, output_dir):
+            completed += 1
+
+def simulate(queue_dir: str, num_jobs: int, num_workers: int, job_duration: float, crashes: int):
+    """Run a job set with local processes standing in for nodes, and verify that every job is committed exactly once
+    @param queue_dir: Queue directory, must not exist
+    @param num_jobs: Number of jobs
+    @param num_workers: Number of worker processes
+    @param job_duration: Seconds per job
+    @param crashes: Number of workers that crash during their second job
+    """
+
+    import multiprocessing
+
+    lease_timeout = 4*job_duration
+    heartbeat_interval = job_duration/4
+    output_dir = os.path.join(queue_dir, "output")
+    os.makedirs(output_dir)
+
+    WorkQueue(queue_dir).create({f"{i:05d}": {"iteration": i} for i in range(num_jobs)})
+
+    workers = [multiprocessing.Process(target=simulated_worker, args=(queue_dir, output_dir, i, job_duration, 1 if i < crashes else None, lease_timeout, heartbeat_interval))
+               for i in range(num_workers)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    results = sorted(os.listdir(output_dir))
+    missing = [f"{i:05d}" for i in range(num_jobs) if f"{i:05d}.txt" not in results]
+    print(f"Simulated {num_jobs} jobs on {num_workers} workers ({crashes} crashed) in {time.time() - start:.1f} s")
+    print(f"Status: {WorkQueue(queue_dir).status()}, missing results: {missing}")
+
+    return not missing
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Shared file system work queue for generation jobs')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    init_parser = subparsers.add_parser("init", help='Create a queue with one job per iteration')
+    init_parser.add_argument("queue_dir", type=str, help='Shared queue directory')
+    init_parser.add_argument("--iterations", type=int, required=True, help='Number of iterations')
+
+    status_parser = subparsers.add_parser("status", help='Print number of done, leased and pending jobs')
+    status_parser.add_argument("queue_dir", type=str, help='Shared queue directory')
+
+    simulate_parser = subparsers.add_parser("simulate", help='Test the queue with local processes standing in for nodes')
+    simulate_parser.add_argument("queue_dir", type=str, help='Queue directory to create')
+    simulate_parser.add_argument("--jobs", type=int, default=40, help='Number of jobs')
+    simulate_parser.add_argument("--workers", type=int, default=4, help='Number of worker processes')
+    simulate_parser.add_argument("--job-duration", type=float, default=0.2, help='Seconds per job')
+    simulate_parser.add_argument("--crashes", type=int, default=1, help='Number of workers crashing while holding a lease')
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "init":
+            WorkQueue(args.queue_dir).create({f"{i:05d}": {"iteration": i} for i in range(args.iterations)})
+            print(WorkQueue(args.queue_dir).status())
+        case "status":
+            print(WorkQueue(args.queue_dir).status())
+        case "simulate":
+            if not simulate(args.queue_dir, args.jobs, args.workers, args.job_duration, args.crashes):
+                raise SystemExit(1)